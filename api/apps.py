@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # branche les signaux (compteurs dénormalisés, etc.)
+        from . import signals  # noqa: F401
+        # compteur de requêtes SQL pour les requêtes profilées (voir metrics.py)
+        from django.db.backends.signals import connection_created
+        from .metrics import install_sql_wrapper
+        connection_created.connect(install_sql_wrapper, dispatch_uid='api.metrics.sql')
@@ -0,0 +1,136 @@
+"""
+Lectures du catalogue en vues Django async (servies nativement sous ASGI / uvicorn).
+
+Mêmes données, même pagination par curseur et mêmes validateurs ETag que les vues
+DRF de views.py, mais l'attente de la base ne bloque pas de thread : l'ORM est lu
+par aget / async for, seule l'authentification JWT (synchrone dans simplejwt) et la
+recherche passent par sync_to_async.
+Pas de cache de réponses ici (cache.py est synchrone) : le 304 couvre les relectures.
+"""
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import renderers, rows, search
+from .cache import aupdated_at_of, conditional_response, set_validators
+from .models import Actor, Comment, Movie
+from .pagination import CommentFeedPagination, KeysetCursorPagination
+from .serializers import (ActorDetailSerializer, ActorSerializer, CommentSerializer, MovieDetailSerializer,
+                          MovieListSerializer)
+
+
+def json_response(data, status=200):
+    return HttpResponse(renderers.dumps(data), status=status, content_type='application/json')
+
+
+async def drf_request(request):
+    """Request DRF (query_params, URLs absolues des images) avec l'utilisateur JWT résolu."""
+    wrapped = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    # sans claims dans le jeton, l'utilisateur peut être lu en base (ORM synchrone, voir auth.py)
+    await sync_to_async(lambda: wrapped.user)()
+    return wrapped
+
+
+def catalogue_view(view):
+    """GET seulement ; les erreurs DRF (404, curseur ou jeton invalide) rendues en JSON comme sous DRF."""
+    @require_GET
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(await drf_request(request), *args, **kwargs)
+        except APIException as exc:
+            return json_response({'detail': exc.detail}, status=exc.status_code)
+    wrapper.__name__ = view.__name__
+    wrapper.__doc__ = view.__doc__
+    return wrapper
+
+
+async def page_data(request, queryset, serializer_class, row_serializer_class, view=None,
+                    pagination_class=KeysetCursorPagination):
+    """Page sérialisée, par rows.py (lignes .values()) sauf si API_ROW_SERIALIZERS est à False."""
+    paginator = pagination_class()
+    context = {'request': request}
+    if rows.rows_enabled():
+        serializer = row_serializer_class(context=context)
+        page = await paginator.apaginate_queryset(serializer.prepare(queryset, paginator, view), request, view)
+        return paginator.get_paginated_data(serializer.many(page))
+    page = await paginator.apaginate_queryset(queryset, request, view)
+    return paginator.get_paginated_data(serializer_class(page, many=True, context=context).data)
+
+
+async def paginated(request, queryset, serializer_class, row_serializer_class, cursor_ordering=None):
+    """Page keyset + ETag (ids de la page et max(updated_at), comme page_validators)."""
+    paginator = KeysetCursorPagination()
+    view = SimpleNamespace(cursor_ordering=cursor_ordering)
+    values = await paginator.apage_values(queryset, request, view, 'pk', 'updated_at')
+    validators = [[pk for pk, _ in values], max((u for _, u in values if u), default=None)]
+    etag, timestamp, response = conditional_response(request._request, validators, None)
+    if response is None:
+        response = json_response(await page_data(request, queryset, serializer_class, row_serializer_class, view))
+    return set_validators(response, etag, timestamp)
+
+
+async def detail(request, queryset, pk, serializer_class, validators):
+    etag, timestamp, response = conditional_response(request._request, *validators)
+    if response is None:
+        try:
+            instance = await queryset.aget(pk=pk)
+        except queryset.model.DoesNotExist:
+            raise NotFound
+        response = json_response(serializer_class(instance, context={'request': request}).data)
+    return set_validators(response, etag, timestamp)
+
+
+@catalogue_view
+async def movie_list(request):
+    queryset = Movie.objects.all()
+    q = request.query_params.get('q')
+    if q and q.strip():
+        # l'index en mémoire (SQLite) se construit en lisant la base : hors boucle d'événements
+        queryset = await sync_to_async(search.search_movies)(queryset, q.strip())
+    return await paginated(request, queryset, MovieListSerializer, rows.MovieListRows)
+
+
+@catalogue_view
+async def movie_detail(request, pk):
+    updated_at = await aupdated_at_of(Movie.objects.filter(pk=pk))
+    if updated_at is None:
+        raise NotFound
+    user = request.user
+    validators = [updated_at, user.pk if user.is_authenticated else None], updated_at
+    queryset = Movie.objects.with_detail().with_user_state(user)
+    return await detail(request, queryset, pk, MovieDetailSerializer, validators)
+
+
+@catalogue_view
+async def actor_list(request):
+    queryset = Actor.objects.all()
+    q = request.query_params.get('q')
+    if q and q.strip():
+        queryset = await sync_to_async(search.search_actors)(queryset, q.strip())
+    return await paginated(request, queryset, ActorSerializer, rows.ActorRows, cursor_ordering=['full_name'])
+
+
+@catalogue_view
+async def actor_detail(request, pk):
+    updated_at = await aupdated_at_of(Actor.objects.filter(pk=pk))
+    if updated_at is None:
+        raise NotFound
+    return await detail(request, Actor.objects.with_detail(), pk, ActorDetailSerializer, ([updated_at], updated_at))
+
+
+@catalogue_view
+async def movie_comments(request, movie_id):
+    updated_at = await aupdated_at_of(Movie.objects.filter(pk=movie_id))
+    if updated_at is None:
+        raise NotFound
+    etag, timestamp, response = conditional_response(request._request, [updated_at], None)
+    if response is None:
+        queryset = Comment.objects.filter(movie_id=movie_id).select_related('author', 'rating')
+        response = json_response(await page_data(request, queryset, CommentSerializer, rows.CommentRows,
+                                                 pagination_class=CommentFeedPagination))
+    return set_validators(response, etag, timestamp)
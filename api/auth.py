@@ -0,0 +1,186 @@
+"""
+Authentification JWT sans requête auth_user à chaque appel.
+
+JWTAuthentication de simplejwt relit la ligne User à chaque requête authentifiée
+(like, note, commentaires, /user/me/...). ClaimsJWTAuthentication résout l'utilisateur,
+dans l'ordre :
+1. depuis les claims du jeton (username, is_staff, is_superuser, ajoutés à l'émission
+   et au rafraîchissement, voir ClaimsTokenObtainPairSerializer) : une instance User
+   légère, sans requête ; les autres champs sont différés (chargés si on y accède) ;
+2. sinon depuis le cache LRU du processus (API_AUTH_USER_CACHE_SIZE entrées,
+   API_AUTH_USER_CACHE_TTL secondes) ;
+3. sinon depuis la base, comme simplejwt, et le résultat entre dans le cache.
+
+Modification d'un utilisateur (post_save / post_delete, voir signals.py) : l'entrée est
+retirée du cache et, dans ce processus, les jetons émis avant la modification repassent
+par la base (utilisateur désactivé, renommé, retiré du staff). Dans les autres
+processus, des claims périmés vivent au plus ACCESS_TOKEN_LIFETIME et une entrée de
+cache au plus API_AUTH_USER_CACHE_TTL. Un update() en masse sur User n'émet pas de
+signal : appeler user_changed() pour chaque utilisateur touché.
+API_AUTH_TRUST_CLAIMS à False : étapes 2 et 3 seulement.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+# claims recopiés dans le jeton -> champs de User reconstruits sans requête
+CLAIM_FIELDS = ('username', 'is_staff', 'is_superuser')
+
+
+def trust_claims():
+    return getattr(settings, 'API_AUTH_TRUST_CLAIMS', True)
+
+
+# --- cache des utilisateurs ---
+class UserCache:
+    """LRU (id -> (User, expiration)) protégé par un verrou ; + dates de modification récentes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.changed = OrderedDict()
+
+    @staticmethod
+    def size():
+        return getattr(settings, 'API_AUTH_USER_CACHE_SIZE', 10000)
+
+    def get(self, pk):
+        with self.lock:
+            entry = self.entries.get(pk)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.entries[pk]
+                return None
+            self.entries.move_to_end(pk)
+        # copie : une vue qui modifierait request.user ne touche pas l'entrée partagée
+        return copy.copy(user)
+
+    def put(self, pk, user):
+        size = self.size()
+        if size <= 0:
+            return
+        ttl = getattr(settings, 'API_AUTH_USER_CACHE_TTL', 300)
+        with self.lock:
+            self.entries[pk] = (copy.copy(user), time.monotonic() + ttl)
+            self.entries.move_to_end(pk)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def changed_since(self, pk, timestamp):
+        """L'utilisateur a-t-il été modifié (dans ce processus) après `timestamp` (epoch) ?"""
+        with self.lock:
+            changed = self.changed.get(pk)
+        return changed is not None and changed >= timestamp
+
+    def evict(self, pk):
+        with self.lock:
+            self.entries.pop(pk, None)
+            self.changed[pk] = time.time()
+            self.changed.move_to_end(pk)
+            while len(self.changed) > max(self.size(), 1000):
+                self.changed.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.changed.clear()
+
+
+user_cache = UserCache()
+
+
+def user_id_field():
+    return get_user_model()._meta.get_field(jwt_settings.USER_ID_FIELD)
+
+
+def user_changed(user):
+    """À appeler quand un utilisateur change (les signaux de User le font, voir signals.py)."""
+    user_cache.evict(getattr(user, user_id_field().attname))
+
+
+# --- jetons ---
+def add_user_claims(token, user):
+    for name in CLAIM_FIELDS:
+        token[name] = getattr(user, name)
+    return token
+
+
+def access_token_for(user):
+    """AccessToken.for_user() + claims : reconnu sans requête par ClaimsJWTAuthentication."""
+    return add_user_claims(AccessToken.for_user(user), user)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """POST /api/token/ : le jeton de rafraîchissement (et donc l'accès) porte les claims."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    POST /api/token/refresh/ : claims relus en base (une requête par rafraîchissement,
+    pas par appel) pour qu'un renommage ou un retrait du staff se propage ; un
+    utilisateur supprimé ou désactivé n'obtient plus de jeton.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = (get_user_model().objects.filter(**{jwt_settings.USER_ID_FIELD: access[jwt_settings.USER_ID_CLAIM]})
+                .first())
+        if user is None or not jwt_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed("Utilisateur inconnu ou inactif.", code='user_inactive')
+        data['access'] = str(add_user_claims(access, user))
+        if 'refresh' in data:
+            data['refresh'] = str(add_user_claims(RefreshToken(data['refresh']), user))
+        return data
+
+
+# --- authentification ---
+def user_from_claims(token):
+    """Instance User (sans requête) depuis les claims du jeton, ou None s'ils manquent."""
+    if any(name not in token for name in CLAIM_FIELDS):
+        return None
+    model = get_user_model()
+    id_field = user_id_field()
+    known = {id_field.attname: id_field.to_python(token[jwt_settings.USER_ID_CLAIM]), 'is_active': True,
+             **{name: token[name] for name in CLAIM_FIELDS}}
+    # from_db : instance « chargée » (utilisable en filtre et en clé étrangère), autres champs différés
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in known]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [known[name] for name in names])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication dont get_user() évite la base (claims, puis cache ; voir l'en-tête du module)."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = user_id_field().to_python(validated_token[jwt_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            return super().get_user(validated_token)  # même erreur que simplejwt
+
+        if trust_claims() and not user_cache.changed_since(user_id, validated_token.get('iat', 0)):
+            user = user_from_claims(validated_token)
+            if user is not None:
+                return user
+
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)  # lève si inconnu ou inactif
+            user_cache.put(user_id, user)
+        return user
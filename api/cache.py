@@ -0,0 +1,214 @@
+"""
+Cache de réponses pour les lectures publiques du catalogue.
+
+- clé : hôte + chemin + paramètres triés + état d'authentification (anon / auth)
+- invalidation par tags versionnés ('movie:<id>', 'movies', 'actor:<id>') : un signal
+  d'écriture change la version du tag, seules les entrées qui en dépendent deviennent périmées
+- stale-while-revalidate : une entrée périmée reste servie tant qu'une seule requête
+  (qui a pris le verrou) la recalcule ; pas de ruée sur la base à la sortie d'un film
+- backend : l'alias API_CACHE_ALIAS de CACHES (locmem par défaut, Redis si REDIS_URL)
+
+ConditionalGetMixin ajoute ETag / Last-Modified et répond 304 avant toute sérialisation.
+Une entrée garde les validateurs calculés avec son corps : une réponse servie depuis le
+cache (HIT / STALE) porte ceux-là, jamais ceux de la base plus récente qu'elle.
+"""
+import hashlib
+import time
+from calendar import timegm
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+KEY_PREFIX = 'api:resp'
+TAG_PREFIX = 'api:tag'
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def cache_enabled():
+    return getattr(settings, 'API_CACHE_ENABLED', True)
+
+
+# --- tags ---
+def tag_versions(tags):
+    """Version courante de chaque tag ; un tag inconnu (ou évincé) reçoit une version neuve."""
+    if not tags:
+        return ()
+    cache = get_cache()
+    keys = [f'{TAG_PREFIX}:{tag}' for tag in tags]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), timeout=None)
+            version = cache.get(key)
+        versions.append(version)
+    return tuple(versions)
+
+
+def invalidate(*tags):
+    """Marque comme périmées les réponses qui dépendent de ces tags."""
+    if not tags or not cache_enabled():
+        return
+    version = time.time_ns()
+    get_cache().set_many({f'{TAG_PREFIX}:{tag}': version for tag in tags}, timeout=None)
+
+
+# --- réponses ---
+def response_key(request, authenticated):
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    raw = f'{request.get_host()}{request.path}?{params}'
+    digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return f"{KEY_PREFIX}:{digest}:{'auth' if authenticated else 'anon'}"
+
+
+def cached_response(request, tags, compute, validators=None):
+    """
+    Sert la réponse depuis le cache ou via `compute()`.
+    Seules les réponses 200 sont stockées (données DRF, rendues à chaque sortie).
+    validators : (etag, timestamp) du corps calculé, rendus avec l'entrée (voir
+    ConditionalGetMixin) ; `response.cached_validators` les porte en cas de HIT / STALE.
+    """
+    cache = get_cache()
+    fresh_for = getattr(settings, 'API_CACHE_TIMEOUT', 30)
+    stale_for = getattr(settings, 'API_CACHE_STALE_TIMEOUT', 300)
+    lock_for = getattr(settings, 'API_CACHE_LOCK_TIMEOUT', 10)
+
+    key = response_key(request, request.user.is_authenticated)
+    versions = tag_versions(tags)
+    entry = cache.get(key)
+    now = time.time()
+
+    locked = False
+    if entry is not None:
+        if entry['versions'] == versions and now < entry['fresh_until']:
+            return _from_entry(entry, 'HIT')
+        # périmée : une seule requête recalcule, les autres reçoivent l'ancienne version
+        locked = cache.add(f'{key}:lock', 1, timeout=lock_for)
+        if not locked:
+            return _from_entry(entry, 'STALE')
+
+    try:
+        response = compute()
+        if response.status_code == 200 and isinstance(response, Response):
+            cache.set(key, {
+                'versions': versions,
+                'fresh_until': now + fresh_for,
+                'status': response.status_code,
+                'data': response.data,
+                'validators': validators,
+            }, timeout=fresh_for + stale_for)
+        response['X-Cache'] = 'MISS'
+        return response
+    finally:
+        if locked:
+            cache.delete(f'{key}:lock')
+
+
+def _from_entry(entry, state):
+    response = Response(entry['data'], status=entry['status'])
+    response['X-Cache'] = state
+    response.cached_validators = entry.get('validators')
+    return response
+
+
+class CachedResponseMixin:
+    """
+    À placer avant la vue générique DRF : met en cache les GET.
+    - get_cache_tags() : tags dont dépend la réponse
+    - cache_authenticated : False si la réponse contient de l'état utilisateur
+      (les requêtes authentifiées contournent alors le cache)
+    - is_cacheable(request) : à surcharger si cela dépend de la requête
+    """
+    cache_authenticated = False
+
+    def get_cache_tags(self):
+        return []
+
+    def is_cacheable(self, request):
+        return not request.user.is_authenticated or self.cache_authenticated
+
+    def get(self, request, *args, **kwargs):
+        compute = lambda: super(CachedResponseMixin, self).get(request, *args, **kwargs)  # noqa: E731
+        if not cache_enabled() or not self.is_cacheable(request):
+            return compute()
+        return cached_response(request, self.get_cache_tags(), compute,
+                               getattr(self, 'computed_validators', None))
+
+
+# --- requêtes conditionnelles (ETag / Last-Modified) ---
+def make_etag(*parts):
+    digest = hashlib.md5(repr(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def updated_at_of(queryset):
+    """updated_at d'une ligne (lookup par clé primaire, sans ORDER BY), ou None."""
+    rows = list(queryset.order_by().values_list('updated_at', flat=True)[:1])
+    return rows[0] if rows else None
+
+
+async def aupdated_at_of(queryset):
+    """Version async de updated_at_of() (vues ASGI, voir async_views.py)."""
+    rows = [u async for u in queryset.order_by().values_list('updated_at', flat=True)[:1]]
+    return rows[0] if rows else None
+
+
+def conditional_response(request, parts, last_modified):
+    """
+    -> (etag, timestamp, réponse 304/412 ou None).
+    parts None = pas d'ETag ; last_modified None = pas de Last-Modified.
+    """
+    etag = make_etag(*parts) if parts is not None else None
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        if etag:
+            response['ETag'] = etag
+        if timestamp:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    À placer en tête des mixins : calcule les validateurs avec une requête légère
+    (updated_at, ids de la page) et renvoie 304 sans sérialiser si le client est à jour.
+    get_validators() -> (etag_parts, last_modified) ; etag_parts None = pas d'ETag.
+    """
+
+    def get_validators(self):
+        return None, None
+
+    def page_validators(self, queryset):
+        """Pour une liste paginée : ids de la page + max(updated_at) de ces lignes."""
+        rows = self.paginator.page_values(queryset, self.request, self, 'pk', 'updated_at')
+        last_modified = max((u for _, u in rows if u), default=None)
+        # pas de Last-Modified sur une liste : il ne verrait pas les suppressions
+        return [[pk for pk, _ in rows], last_modified], None
+
+    def get(self, request, *args, **kwargs):
+        etag, timestamp, response = conditional_response(request, *self.get_validators())
+        if response is None:
+            self.computed_validators = (etag, timestamp)
+            response = super().get(request, *args, **kwargs)
+            cached = getattr(response, 'cached_validators', None)
+            if cached is not None and cached != (etag, timestamp):
+                # corps en cache antérieur à la base (compteurs, voir signals.py) :
+                # ses propres validateurs, pour qu'un 304 ne fige pas l'ancienne version
+                etag, timestamp = cached
+                not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+                if not_modified is not None:
+                    response = not_modified
+        return set_validators(response, etag, timestamp)
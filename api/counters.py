@@ -0,0 +1,213 @@
+"""
+Compteurs dénormalisés de Movie : likes_count, rating_sum, rating_count, avg_rating,
+comments_count.
+
+Chaque écriture de Like / Rating / Comment applique un delta atomique (UPDATE ... SET x = x + n)
+au lieu de recompter toute la table : O(1) par vote, sans verrou applicatif.
+updated_at est avancé dans le même UPDATE (il sert de validateur HTTP, voir cache.py).
+top_score (moyenne bayésienne, voir leaderboards.py) suit avg_rating dans le même UPDATE.
+`reconcile()` reconstruit les valeurs (commande reconcile_counters).
+"""
+import threading
+
+from django.db import connection, transaction
+from django.dispatch import Signal
+from django.db.models import Avg, Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from . import leaderboards
+from .models import Comment, Like, Movie, Rating
+
+
+def apply_like_delta(movie_id, delta):
+    """Ajoute `delta` (+1 / -1) à likes_count."""
+    if not delta:
+        return 0
+    return Movie.objects.filter(pk=movie_id).update(
+        likes_count=F('likes_count') + delta, updated_at=timezone.now(),
+    )
+
+
+def apply_comment_delta(movie_id, delta):
+    """Ajoute `delta` (+1 / -1) à comments_count."""
+    if not delta:
+        return 0
+    return Movie.objects.filter(pk=movie_id).update(
+        comments_count=F('comments_count') + delta, updated_at=timezone.now(),
+    )
+
+
+def apply_rating_delta(movie_id, score_delta, count_delta):
+    """
+    Ajoute les deltas à rating_sum / rating_count et recalcule avg_rating
+    dans le même UPDATE (les F() lisent les valeurs d'avant la mise à jour).
+    """
+    if not score_delta and not count_delta:
+        return 0
+    new_sum = F('rating_sum') + score_delta
+    new_count = F('rating_count') + count_delta
+    return Movie.objects.filter(pk=movie_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        updated_at=timezone.now(),
+        avg_rating=Case(
+            # rating_count + count_delta > 0
+            When(rating_count__gt=-count_delta, then=Cast(new_sum, FloatField()) / new_count),
+            default=None,
+            output_field=FloatField(),
+        ),
+        top_score=Case(
+            When(rating_count__gt=-count_delta, then=leaderboards.bayesian_score(new_sum, new_count)),
+            default=None,
+            output_field=FloatField(),
+        ),
+    )
+
+
+def recount_ratings(movie_ids):
+    """
+    rating_sum / rating_count / avg_rating / top_score recalculés depuis Rating pour
+    quelques films, en un UPDATE (sous-requêtes sur l'index movie_id). Idempotent : sert
+    au vidage des notes regroupées (voir ratings.py), qui ne connaît pas les deltas.
+    """
+    ratings = Rating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    total = Coalesce(Subquery(ratings.annotate(s=Sum('score')).values('s'), output_field=IntegerField()), 0)
+    count = Coalesce(Subquery(ratings.annotate(n=Count('pk')).values('n'), output_field=IntegerField()), 0)
+    return Movie.objects.filter(pk__in=movie_ids).update(
+        rating_sum=total,
+        rating_count=count,
+        avg_rating=Subquery(ratings.annotate(a=Avg('score')).values('a'), output_field=FloatField()),
+        top_score=Case(
+            When(GreaterThan(count, 0), then=leaderboards.bayesian_score(total, count)),
+            default=None,
+            output_field=FloatField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+# émis après counters.toggle_like() (le SQL brut ne déclenche pas post_save de Like)
+# kwargs : movie_id, user_id, liked, likes_count
+like_toggled = Signal()
+
+# SQLite n'a qu'un écrivain : on sérialise les deux requêtes du toggle dans le process
+_sqlite_toggle_lock = threading.Lock()
+
+_TOGGLE_LIKE_POSTGRES = """
+WITH toggled AS (
+    INSERT INTO {like} (user_id, movie_id, liked, created_at, updated_at)
+    SELECT %(user_id)s, m.id, TRUE, %(now)s, %(now)s FROM {movie} m WHERE m.id = %(movie_id)s
+    ON CONFLICT (user_id, movie_id)
+    DO UPDATE SET liked = NOT {like}.liked, updated_at = EXCLUDED.updated_at
+    RETURNING movie_id, liked, created_at = updated_at AS inserted
+), counted AS (
+    UPDATE {movie}
+    SET likes_count = {movie}.likes_count + CASE WHEN toggled.liked THEN 1 ELSE -1 END,
+        trending_score = CASE WHEN NOT toggled.inserted THEN {movie}.trending_score
+            WHEN {movie}.trending_score IS NULL THEN %(term)s
+            ELSE GREATEST({movie}.trending_score, %(term)s)
+                 + LN(1 + EXP(-ABS({movie}.trending_score - %(term)s))) END,
+        updated_at = %(now)s
+    FROM toggled WHERE {movie}.id = toggled.movie_id
+    RETURNING {movie}.likes_count
+)
+SELECT toggled.liked, counted.likes_count FROM toggled CROSS JOIN counted
+"""
+
+_TOGGLE_LIKE_SQLITE = """
+INSERT INTO {like} (user_id, movie_id, liked, created_at, updated_at)
+SELECT %s, m.id, 1, %s, %s FROM {movie} m WHERE m.id = %s
+ON CONFLICT (user_id, movie_id)
+DO UPDATE SET liked = NOT liked, updated_at = excluded.updated_at
+RETURNING liked, created_at = updated_at
+"""
+
+_BUMP_LIKES_SQLITE = """
+UPDATE {movie} SET likes_count = likes_count + %s,
+    trending_score = CASE WHEN NOT %s THEN trending_score
+        WHEN trending_score IS NULL THEN %s
+        ELSE MAX(trending_score, %s) + LN(1 + EXP(-ABS(trending_score - %s))) END,
+    updated_at = %s
+WHERE id = %s RETURNING likes_count
+"""
+
+
+def toggle_like(user_id, movie_id):
+    """
+    Inverse le like (user, movie) et met à jour likes_count sans aller-retour Python.
+    - PostgreSQL : un seul statement (upsert + UPDATE du compteur et de trending_score dans un CTE).
+    - SQLite : upsert RETURNING puis UPDATE RETURNING dans une même transaction.
+    Retourne (liked, likes_count), ou None si le film n'existe pas.
+    Passe par du SQL brut : post_save de Like n'est pas émis, `like_toggled` le remplace.
+    """
+    qn = connection.ops.quote_name
+    tables = {'like': qn(Like._meta.db_table), 'movie': qn(Movie._meta.db_table)}
+    at = timezone.now()
+    now = connection.ops.adapt_datetimefield_value(at)
+    params = [user_id, now, now, movie_id]
+    # seul le premier like (ligne insérée) compte pour la tendance : ni unlike ni re-like
+    # (created_at = updated_at après l'upsert : la ligne vient d'être créée, voir leaderboards.py)
+    term = leaderboards.trending_term(leaderboards.like_weight(), at)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(_TOGGLE_LIKE_POSTGRES.format(**tables),
+                           {'user_id': user_id, 'movie_id': movie_id, 'now': now, 'term': term})
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        result = bool(row[0]), row[1]
+    else:
+        with _sqlite_toggle_lock, transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(_TOGGLE_LIKE_SQLITE.format(**tables), params)
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            liked, inserted = bool(row[0]), bool(row[1])
+            delta = 1 if liked else -1
+            cursor.execute(_BUMP_LIKES_SQLITE.format(**tables), [delta, inserted, term, term, term, now, movie_id])
+            result = liked, cursor.fetchone()[0]
+
+    like_toggled.send(sender=Like, movie_id=movie_id, user_id=user_id,
+                      liked=result[0], likes_count=result[1])
+    return result
+
+
+def reconcile(movie_ids=None):
+    """
+    Reconstruit tous les compteurs à partir de Like / Rating / Comment en un UPDATE
+    (sous-requêtes corrélées), puis top_score. Retourne le nombre de films mis à jour.
+    """
+    likes = (
+        Like.objects.filter(movie=OuterRef('pk'), liked=True)
+        .order_by().values('movie').annotate(n=Count('pk')).values('n')
+    )
+    ratings = Rating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    comments = (
+        Comment.objects.filter(movie=OuterRef('pk'))
+        .order_by().values('movie').annotate(n=Count('pk')).values('n')
+    )
+
+    queryset = Movie.objects.all()
+    if movie_ids is not None:
+        queryset = queryset.filter(pk__in=movie_ids)
+
+    with transaction.atomic():
+        updated = queryset.update(
+            likes_count=Coalesce(Subquery(likes, output_field=IntegerField()), 0),
+            rating_sum=Coalesce(Subquery(ratings.annotate(s=Sum('score')).values('s'),
+                                         output_field=IntegerField()), 0),
+            rating_count=Coalesce(Subquery(ratings.annotate(n=Count('pk')).values('n'),
+                                           output_field=IntegerField()), 0),
+            avg_rating=Subquery(ratings.annotate(a=Avg('score')).values('a'), output_field=FloatField()),
+            comments_count=Coalesce(Subquery(comments, output_field=IntegerField()), 0),
+        )
+        # top_score dépend des valeurs qu'on vient d'écrire : second passage sur les compteurs
+        queryset.update(top_score=Case(
+            When(rating_count__gt=0, then=leaderboards.bayesian_score(F('rating_sum'), F('rating_count'))),
+            default=None,
+            output_field=FloatField(),
+        ))
+    return updated
@@ -0,0 +1,106 @@
+"""
+Export NDJSON du catalogue complet (GET /api/movies/export/).
+
+Un film par ligne, avec son casting et ses compteurs. Lecture par curseur serveur
+(.iterator(chunk_size)) dans l'ordre de la clé primaire, casting chargé en une requête
+par lot de films : mémoire constante et premier octet envoyé dès le premier lot.
+
+Sous ASGI (uvicorn), Django lit un itérateur synchrone d'un bloc (sync_to_async(list))
+avant d'envoyer quoi que ce soit : la vue y sert aiter_catalogue(), même contenu lu
+par .aiterator() et casting en `async for`, envoyé lot par lot.
+"""
+import json
+
+from .models import Casting, Movie
+
+CHUNK_SIZE = 500
+
+MOVIE_COLUMNS = (
+    'pk', 'title_fr', 'title_original', 'origin_country', 'duration_minutes', 'director',
+    'description', 'release_date', 'likes_count', 'rating_count', 'avg_rating', 'updated_at',
+)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _cast_rows(movie_ids):
+    return (Casting.objects.filter(movie_id__in=movie_ids)
+            .order_by('movie_id', 'order', 'pk')
+            .values_list('movie_id', 'actor_id', 'actor__full_name', 'role_name', 'order'))
+
+
+def _add_cast(cast, row):
+    movie_id, actor_id, full_name, role_name, order = row
+    cast[movie_id].append({'actor_id': actor_id, 'full_name': full_name,
+                           'role_name': role_name, 'order': order})
+
+
+def _cast_by_movie(movie_ids):
+    cast = {pk: [] for pk in movie_ids}
+    for row in _cast_rows(movie_ids):
+        _add_cast(cast, row)
+    return cast
+
+
+async def _acast_by_movie(movie_ids):
+    cast = {pk: [] for pk in movie_ids}
+    async for row in _cast_rows(movie_ids):
+        _add_cast(cast, row)
+    return cast
+
+
+def _lines(chunk, cast):
+    out = []
+    for (pk, title_fr, title_original, origin_country, duration_minutes, director, description,
+         release_date, likes_count, rating_count, avg_rating, updated_at) in chunk:
+        out.append(json.dumps({
+            'id': pk,
+            'title_fr': title_fr,
+            'title_original': title_original,
+            'origin_country': origin_country,
+            'duration_minutes': duration_minutes,
+            'director': director,
+            'description': description,
+            'release_date': _iso(release_date),
+            'likes_count': likes_count,
+            'rating_count': rating_count,
+            'avg_rating': avg_rating,
+            'updated_at': _iso(updated_at),
+            'cast': cast[pk],
+        }, ensure_ascii=False, separators=(',', ':')))
+    # un seul morceau écrit par lot plutôt qu'un par film
+    return '\n'.join(out) + '\n'
+
+
+def iter_catalogue(queryset=None, chunk_size=CHUNK_SIZE):
+    """Générateur de blocs NDJSON (str), un bloc par lot de `chunk_size` films."""
+    if queryset is None:
+        queryset = Movie.objects.all()
+    rows = queryset.order_by('pk').values_list(*MOVIE_COLUMNS).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _lines(chunk, _cast_by_movie([row[0] for row in chunk]))
+            chunk = []
+    if chunk:
+        yield _lines(chunk, _cast_by_movie([row[0] for row in chunk]))
+
+
+async def aiter_catalogue(queryset=None, chunk_size=CHUNK_SIZE):
+    """Version async de iter_catalogue() (réponse servie sous ASGI)."""
+    if queryset is None:
+        queryset = Movie.objects.all()
+    # .values() : sous Django 5.2, values_list().aiterator() exécute la requête hors thread
+    # (SynchronousOnlyOperation) ; les tuples sont reconstruits dans l'ordre de MOVIE_COLUMNS
+    rows = queryset.order_by('pk').values(*MOVIE_COLUMNS).aiterator(chunk_size=chunk_size)
+    chunk = []
+    async for row in rows:
+        chunk.append(tuple(row[column] for column in MOVIE_COLUMNS))
+        if len(chunk) >= chunk_size:
+            yield _lines(chunk, await _acast_by_movie([row[0] for row in chunk]))
+            chunk = []
+    if chunk:
+        yield _lines(chunk, await _acast_by_movie([row[0] for row in chunk]))
@@ -0,0 +1,184 @@
+"""
+Projections lues sans jointure : filmographie des acteurs (Credit) et graphe des
+partenaires (CoStar).
+
+- Credit : copie de Casting + titre / date du film. Reconstruite film par film
+  (refresh_movies) : quelques lignes, un DELETE + un bulk_create.
+- CoStar : arêtes (acteur, partenaire, films en commun), dans les deux sens. Quand le
+  casting d'un acteur change, ses arêtes sont recalculées depuis Casting
+  (refresh_actors) : une agrégation bornée à ses films, puis upsert / suppression
+  des arêtes qui le touchent, symétriques comprises.
+- la mise à jour est incrémentale (signaux de Casting, sync_cast) ; un import en masse
+  rafraîchit par lots les seuls films et acteurs touchés (refresh_batched) ; rebuild()
+  reconstruit tout par INSERT ... SELECT côté base (commande rebuild_filmography).
+
+Les acteurs dont la filmographie ou les partenaires changent voient leur updated_at avancer
+(ETag) et leur tag de cache invalidé.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import cache
+from .models import Actor, Casting, CoStar, Credit, Movie
+
+_REBUILD_CREDITS = """
+INSERT INTO {credit} (actor_id, movie_id, role_name, {order}, title_fr, release_date)
+SELECT c.actor_id, c.movie_id, c.role_name, c.{order}, m.title_fr, m.release_date
+FROM {casting} c JOIN {movie} m ON m.id = c.movie_id
+"""
+
+# arêtes dans les deux sens : (a, b) et (b, a) sortent toutes deux de l'auto-jointure
+_REBUILD_COSTARS = """
+INSERT INTO {costar} (actor_id, costar_id, name, movies_count)
+SELECT a.actor_id, b.actor_id, p.full_name, COUNT(DISTINCT a.movie_id)
+FROM {casting} a
+JOIN {casting} b ON b.movie_id = a.movie_id AND b.actor_id <> a.actor_id
+JOIN {actor} p ON p.id = b.actor_id
+GROUP BY a.actor_id, b.actor_id, p.full_name
+"""
+
+
+def _credits(castings):
+    return [
+        Credit(actor_id=actor_id, movie_id=movie_id, role_name=role_name, order=order,
+               title_fr=title_fr, release_date=release_date)
+        for actor_id, movie_id, role_name, order, title_fr, release_date in castings.values_list(
+            'actor_id', 'movie_id', 'role_name', 'order', 'movie__title_fr', 'movie__release_date')
+    ]
+
+
+def _edges(castings):
+    """(acteur, partenaire) -> films en commun, pour les castings donnés."""
+    pairs = (castings.annotate(other=F('movie__movie_casts__actor_id'))
+             .exclude(other=F('actor_id'))
+             .values('actor_id', 'other').order_by()
+             .annotate(n=Count('movie_id', distinct=True)))
+    return {(row['actor_id'], row['other']): row['n'] for row in pairs}
+
+
+def _names(actor_ids):
+    return dict(Actor.objects.filter(pk__in=actor_ids).values_list('pk', 'full_name'))
+
+
+def _touch(actor_ids):
+    actor_ids = set(actor_ids)
+    if actor_ids:
+        Actor.objects.filter(pk__in=actor_ids).update(updated_at=timezone.now())
+        cache.invalidate(*[f'actor:{pk}' for pk in actor_ids])
+
+
+def _refresh_movies(movie_ids):
+    before = set(Credit.objects.filter(movie_id__in=movie_ids).order_by().values_list('actor_id', flat=True))
+    Credit.objects.filter(movie_id__in=movie_ids).delete()
+    credits = _credits(Casting.objects.filter(movie_id__in=movie_ids))
+    Credit.objects.bulk_create(credits)
+    return before | {credit.actor_id for credit in credits}
+
+
+def _refresh_actors(actor_ids):
+    counts = _edges(Casting.objects.filter(actor_id__in=actor_ids))
+    # arêtes symétriques : (a, b) et (b, a) ont le même nombre de films
+    counts.update({(b, a): n for (a, b), n in list(counts.items())})
+    touching = Q(actor_id__in=actor_ids) | Q(costar_id__in=actor_ids)
+    old = set(CoStar.objects.filter(touching).values_list('actor_id', 'costar_id'))
+    gone = old - counts.keys()
+    if gone:
+        stale = Q()
+        for a, b in gone:
+            stale |= Q(actor_id=a, costar_id=b)
+        CoStar.objects.filter(stale).delete()
+    if counts:
+        names = _names({b for _, b in counts})
+        CoStar.objects.bulk_create(
+            [CoStar(actor_id=a, costar_id=b, name=names.get(b, ''), movies_count=n) for (a, b), n in counts.items()],
+            update_conflicts=True, unique_fields=['actor', 'costar'], update_fields=['name', 'movies_count'],
+        )
+    return actor_ids | {a for a, _ in old | counts.keys()}
+
+
+def refresh_movies(movie_ids):
+    """Reconstruit les lignes Credit des films donnés. Retourne les acteurs concernés."""
+    movie_ids = set(movie_ids)
+    if not movie_ids:
+        return set()
+    with transaction.atomic():
+        return _refresh_movies(movie_ids)
+
+
+def refresh_actors(actor_ids):
+    """Recalcule les arêtes CoStar qui touchent ces acteurs. Retourne les acteurs concernés."""
+    actor_ids = set(actor_ids)
+    if not actor_ids:
+        return set()
+    with transaction.atomic():
+        return _refresh_actors(actor_ids)
+
+
+def refresh(movie_ids=(), actor_ids=()):
+    """Point d'entrée des écritures de casting : films et acteurs dont le casting a changé."""
+    movie_ids, actor_ids = set(movie_ids), set(actor_ids)
+    if not (movie_ids or actor_ids):
+        return
+    touched = set()
+    with transaction.atomic():
+        if movie_ids:
+            touched |= _refresh_movies(movie_ids)
+        if actor_ids:
+            touched |= _refresh_actors(actor_ids)
+    _touch(touched)
+
+
+def refresh_batched(movie_ids=(), actor_ids=(), batch_size=1000):
+    """
+    refresh() par lots de `batch_size` films puis acteurs (import en masse) : mémoire et
+    requêtes bornées par le lot, seuls les acteurs concernés sont touchés et invalidés.
+    """
+    movie_ids, actor_ids = sorted(set(movie_ids)), sorted(set(actor_ids))
+    for start in range(0, len(movie_ids), batch_size):
+        refresh(movie_ids=movie_ids[start:start + batch_size])
+    for start in range(0, len(actor_ids), batch_size):
+        refresh(actor_ids=actor_ids[start:start + batch_size])
+
+
+def movie_changed(movie):
+    """Titre / date d'un film modifiés : recopiés dans Credit (un UPDATE, rien si inchangés)."""
+    stale = Credit.objects.filter(movie_id=movie.pk).exclude(title_fr=movie.title_fr, release_date=movie.release_date)
+    actor_ids = set(stale.values_list('actor_id', flat=True))
+    if actor_ids:
+        Credit.objects.filter(movie_id=movie.pk).update(title_fr=movie.title_fr, release_date=movie.release_date)
+        _touch(actor_ids)
+
+
+def actor_renamed(actor):
+    """full_name recopié dans les arêtes qui pointent vers l'acteur."""
+    renamed = CoStar.objects.filter(costar_id=actor.pk).exclude(name=actor.full_name)
+    actor_ids = set(renamed.values_list('actor_id', flat=True))
+    if actor_ids:
+        CoStar.objects.filter(costar_id=actor.pk).update(name=actor.full_name)
+        _touch(actor_ids)
+
+
+def rebuild():
+    """
+    Reconstruit les deux projections depuis Casting, entièrement côté base (deux
+    INSERT ... SELECT, agrégation GROUP BY pour les partenaires). Seuls les acteurs
+    présents dans l'une des projections, avant ou après, sont touchés et invalidés.
+    """
+    qn = connection.ops.quote_name
+    tables = {'credit': qn(Credit._meta.db_table), 'costar': qn(CoStar._meta.db_table),
+              'casting': qn(Casting._meta.db_table), 'movie': qn(Movie._meta.db_table),
+              'actor': qn(Actor._meta.db_table), 'order': qn('order')}
+    with transaction.atomic():
+        before = set(Credit.objects.order_by().values_list('actor_id', flat=True).distinct())
+        Credit.objects.all().delete()
+        CoStar.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(_REBUILD_CREDITS.format(**tables))
+            credits = cursor.rowcount
+            cursor.execute(_REBUILD_COSTARS.format(**tables))
+            edges = cursor.rowcount
+        after = set(Credit.objects.order_by().values_list('actor_id', flat=True).distinct())
+    # un acteur a des partenaires seulement s'il a au moins un rôle : Credit suffit
+    _touch(before | after)
+    return credits, edges
@@ -0,0 +1,145 @@
+"""
+Déclinaisons des images (affiches, illustrations, photos d'acteurs).
+
+À l'enregistrement d'une nouvelle image, une tâche de fond (tasks.py) génère des versions
+de largeur fixe en WebP et en JPEG, stockées à côté de l'original ('x.jpg' -> 'x__w342.webp',
+'x__w342.jpg') sur le même storage (S3 en production, système de fichiers en dev / tests).
+Les noms et dimensions sont gardés dans <champ>_renditions (JSON) :
+    {"w342": {"width": 342, "height": 513, "webp": "<nom>", "jpeg": "<nom>"}, ...}
+Les serializers de liste renvoient la déclinaison adaptée au lieu de l'original.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# (modèle, champ) -> largeurs générées ; la première sert aux listes
+RENDITIONS = {
+    ('movie', 'poster'): [342, 185, 780],
+    ('movie', 'illustration'): [780, 1280],
+    ('actor', 'photo'): [185, 342],
+}
+
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def widths_for(model, field_name):
+    return RENDITIONS.get((model._meta.model_name, field_name), [])
+
+
+def image_fields(model):
+    return [field for (model_name, field) in RENDITIONS if model_name == model._meta.model_name]
+
+
+def rendition_name(name, width, extension):
+    base, _ = os.path.splitext(name)
+    return f'{base}__w{width}.{extension}'
+
+
+def _encode(image, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # pas d'alpha en JPEG : fond blanc
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate(fieldfile, widths):
+    """Crée les déclinaisons de `fieldfile` et retourne leur description (voir en tête)."""
+    storage, name = fieldfile.storage, fieldfile.name
+    formats = getattr(settings, 'API_IMAGE_FORMATS', ('webp', 'jpeg'))
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        # JPEG : décodage directement à une échelle réduite quand c'est possible
+        image.draft('RGB', (max(widths), max(widths) * 4))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+
+    renditions = {}
+    for width in widths:
+        # pas d'agrandissement : une image plus petite est reprise à sa taille
+        w = min(width, image.width)
+        h = max(1, round(image.height * w / image.width))
+        resized = image if w == image.width else image.resize((w, h), Image.LANCZOS)
+        entry = {'width': w, 'height': h}
+        for fmt in formats:
+            target = rendition_name(name, width, FORMATS[fmt][1])
+            entry[fmt] = storage.save(target, ContentFile(_encode(resized, fmt)))
+        renditions[f'w{width}'] = entry
+    return renditions
+
+
+def delete_renditions(storage, renditions):
+    for entry in (renditions or {}).values():
+        for fmt in FORMATS:
+            if entry.get(fmt):
+                try:
+                    storage.delete(entry[fmt])
+                except Exception:
+                    logger.warning("suppression impossible : %s", entry[fmt], exc_info=True)
+
+
+def refresh(instance, field_name):
+    """
+    (Re)génère les déclinaisons d'un champ image et les enregistre par un UPDATE ciblé
+    (pas de save() : pas de signaux en boucle ; updated_at avance pour les ETag).
+    Une image illisible est ignorée.
+    """
+    fieldfile = getattr(instance, field_name)
+    attname = f'{field_name}_renditions'
+    old = getattr(instance, attname) or {}
+    renditions = {}
+    if fieldfile:
+        try:
+            renditions = generate(fieldfile, widths_for(type(instance), field_name))
+        except (UnidentifiedImageError, OSError, ValueError):
+            logger.warning("déclinaisons impossibles pour %s", fieldfile.name, exc_info=True)
+    delete_renditions(fieldfile.storage, old)
+    type(instance).objects.filter(pk=instance.pk).update(**{attname: renditions}, updated_at=timezone.now())
+    setattr(instance, attname, renditions)
+    return renditions
+
+
+# --- lecture (serializers) ---
+def _absolute(url, request):
+    if request is not None and url.startswith('/'):
+        return request.build_absolute_uri(url)
+    return url
+
+
+def list_width(model, field_name):
+    return widths_for(model, field_name)[0]
+
+
+def pick(fieldfile, renditions, width, request=None):
+    """
+    Déclinaison de largeur `width` : {"url": jpeg, "webp": webp, "width", "height"},
+    ou None si elle n'a pas (encore) été générée.
+    """
+    if not fieldfile or not renditions:
+        return None
+    entry = renditions.get(f'w{width}')
+    if entry is None:
+        return None
+    storage = fieldfile.storage
+    return {
+        'url': _absolute(storage.url(entry['jpeg']), request) if entry.get('jpeg') else None,
+        'webp': _absolute(storage.url(entry['webp']), request) if entry.get('webp') else None,
+        'width': entry['width'],
+        'height': entry['height'],
+    }
@@ -0,0 +1,259 @@
+"""
+Import en masse du catalogue (commande import_catalogue).
+
+- lecture en flux de fichiers JSONL (un objet par ligne) ou CSV (en-tête = noms des champs)
+- films identifiés par (title_fr, release_date), acteurs par full_name : les deux
+  correspondances sont chargées une fois en mémoire, puis complétées au fil de l'import
+- écriture par lots : bulk_create / bulk_update, une transaction par lot
+- bulk_* ne déclenche pas les signaux : search_document et updated_at sont calculés ici,
+  puis l'index de recherche en mémoire, les filmographies et les caches (réponses,
+  objets) sont reconstruits / invalidés
+"""
+import csv
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import cache, filmography, objcache, search
+from .models import Actor, Casting, Movie
+
+MOVIE_FIELDS = ['title_fr', 'title_original', 'origin_country', 'duration_minutes',
+                'director', 'description', 'release_date']
+ACTOR_FIELDS = ['first_name', 'last_name', 'full_name', 'birth_date', 'biography']
+
+
+def read_rows(path):
+    """Générateur de dicts : .csv -> csv.DictReader, sinon JSON lines."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _int_or_none(value):
+    if value in (None, ''):
+        return None
+    return int(value)
+
+
+def _date_or_none(value):
+    if not value:
+        return None
+    return parse_date(str(value))
+
+
+def movie_key(title_fr, release_date):
+    return (title_fr or '').strip(), release_date
+
+
+def actor_full_name(first_name, last_name):
+    # même règle que Actor.save()
+    return f"{first_name} {last_name}" if first_name else last_name
+
+
+class CatalogueImporter:
+    def __init__(self, batch_size=1000, log=None):
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.stats = Counter()
+        self._movie_ids = None
+        self._actor_ids = None
+        # castings écrits hors signaux : projections (filmography.py) rafraîchies dans finish()
+        self.cast_movie_ids, self.cast_actor_ids = set(), set()
+
+    # --- correspondances en mémoire ---
+    @property
+    def movie_ids(self):
+        if self._movie_ids is None:
+            rows = Movie.objects.order_by().values_list('title_fr', 'release_date', 'pk')
+            self._movie_ids = {movie_key(t, d): pk for t, d, pk in rows.iterator(chunk_size=5000)}
+        return self._movie_ids
+
+    @property
+    def actor_ids(self):
+        if self._actor_ids is None:
+            rows = Actor.objects.order_by().values_list('full_name', 'pk')
+            self._actor_ids = {name: pk for name, pk in rows.iterator(chunk_size=5000)}
+        return self._actor_ids
+
+    # --- suivi ---
+    def _progress(self, kind, count, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.log(f"{kind}: {count} lignes ({count / elapsed:.0f} lignes/s)")
+
+    # --- acteurs ---
+    def _build_actor(self, row):
+        first_name = (row.get('first_name') or '').strip()
+        last_name = (row.get('last_name') or '').strip()
+        full_name = (row.get('full_name') or '').strip()
+        if full_name and not last_name:
+            first_name, _, last_name = full_name.rpartition(' ')
+        actor = Actor(
+            first_name=first_name, last_name=last_name,
+            full_name=full_name or actor_full_name(first_name, last_name),
+            birth_date=_date_or_none(row.get('birth_date')),
+            biography=row.get('biography') or '',
+        )
+        actor.search_document = search.build_actor_document(actor)
+        return actor
+
+    def _save_actors(self, actors):
+        now = timezone.now()
+        new, existing = [], {}
+        for actor in actors:
+            actor.updated_at = now
+            pk = self.actor_ids.get(actor.full_name)
+            if pk is None:
+                new.append(actor)
+            else:
+                actor.pk = pk
+                existing[pk] = actor  # la dernière ligne l'emporte
+        Actor.objects.bulk_create(new)
+        Actor.objects.bulk_update(list(existing.values()),
+                                  ACTOR_FIELDS + ['search_document', 'updated_at'])
+        for actor in new:
+            self.actor_ids[actor.full_name] = actor.pk
+        self.stats['actors_created'] += len(new)
+        self.stats['actors_updated'] += len(existing)
+        return list(existing)
+
+    def import_actors(self, rows):
+        started, count = time.monotonic(), 0
+        for chunk in chunked(rows, self.batch_size):
+            actors = {}
+            for row in chunk:
+                actor = self._build_actor(row)
+                actors[actor.full_name] = actor
+            with transaction.atomic():
+                updated = self._save_actors(actors.values())
+            cache.invalidate(*[f'actor:{pk}' for pk in updated])
+            objcache.actors.evict(*updated)
+            count += len(chunk)
+            self._progress('acteurs', count, started)
+        return count
+
+    def resolve_actors(self, names):
+        """Ids des acteurs par nom ; les inconnus sont créés en un seul bulk_create."""
+        missing = {name for name in names if name and name not in self.actor_ids}
+        if missing:
+            self._save_actors([self._build_actor({'full_name': name}) for name in sorted(missing)])
+        return {name: self.actor_ids[name] for name in names if name}
+
+    # --- films ---
+    def _build_movie(self, row):
+        return Movie(
+            title_fr=(row.get('title_fr') or '').strip(),
+            title_original=row.get('title_original') or '',
+            origin_country=row.get('origin_country') or '',
+            duration_minutes=_int_or_none(row.get('duration_minutes')),
+            director=row.get('director') or '',
+            description=row.get('description') or '',
+            release_date=_date_or_none(row.get('release_date')),
+        )
+
+    def import_movies(self, rows):
+        started, count = time.monotonic(), 0
+        for chunk in chunked(rows, self.batch_size):
+            movies, castings = {}, []
+            for row in chunk:
+                movie = self._build_movie(row)
+                if not movie.title_fr:
+                    self.stats['movies_skipped'] += 1
+                    continue
+                key = movie_key(movie.title_fr, movie.release_date)
+                movies[key] = movie
+                for i, item in enumerate(row.get('cast') or []):
+                    castings.append({**item, 'movie_key': key, 'order': item.get('order', i)})
+
+            with transaction.atomic():
+                now = timezone.now()
+                new, existing = [], []
+                for key, movie in movies.items():
+                    movie.updated_at = now
+                    movie.search_document = search.build_movie_document(movie)
+                    pk = self.movie_ids.get(key)
+                    if pk is None:
+                        new.append(movie)
+                    else:
+                        movie.pk = pk
+                        existing.append(movie)
+                Movie.objects.bulk_create(new)
+                Movie.objects.bulk_update(existing, MOVIE_FIELDS + ['search_document', 'updated_at'])
+                for movie in new:
+                    self.movie_ids[movie_key(movie.title_fr, movie.release_date)] = movie.pk
+                touched = self._save_castings(castings) if castings else set()
+                # le document d'un film existant doit garder les noms de son casting
+                search.refresh_movie_documents([m.pk for m in existing if m.pk not in touched])
+            cache.invalidate(*[f'movie:{m.pk}' for m in existing])
+            objcache.movies.evict(*[m.pk for m in existing])
+
+            self.stats['movies_created'] += len(new)
+            self.stats['movies_updated'] += len(existing)
+            count += len(chunk)
+            self._progress('films', count, started)
+        return count
+
+    # --- casting ---
+    def _save_castings(self, items):
+        actor_ids = self.resolve_actors({(item.get('actor') or '').strip() for item in items})
+        castings, touched = [], set()
+        for item in items:
+            movie_id = self.movie_ids.get(item['movie_key'])
+            actor_id = actor_ids.get((item.get('actor') or '').strip())
+            if movie_id is None or actor_id is None:
+                self.stats['castings_skipped'] += 1
+                continue
+            castings.append(Casting(movie_id=movie_id, actor_id=actor_id,
+                                    role_name=item.get('role_name') or '',
+                                    order=_int_or_none(item.get('order')) or 0))
+            touched.add(movie_id)
+            self.cast_actor_ids.add(actor_id)
+        self.cast_movie_ids |= touched
+        # (movie, actor, role_name) est unique : les doublons sont ignorés
+        Casting.objects.bulk_create(castings, ignore_conflicts=True)
+        search.refresh_movie_documents(touched)
+        self.stats['castings'] += len(castings)
+        return touched
+
+    def import_castings(self, rows):
+        started, count = time.monotonic(), 0
+        for chunk in chunked(rows, self.batch_size):
+            items = [
+                {**row, 'movie_key': movie_key(row.get('movie') or row.get('title_fr'),
+                                               _date_or_none(row.get('release_date')))}
+                for row in chunk
+            ]
+            with transaction.atomic():
+                touched = self._save_castings(items)
+            cache.invalidate(*[f'movie:{pk}' for pk in touched])
+            count += len(chunk)
+            self._progress('casting', count, started)
+        return count
+
+    def finish(self):
+        # écritures hors signaux : index de recherche, filmographies et cache à reconstruire
+        search.reset_index()
+        # films et acteurs sont identifiés par titre / date et nom : seuls de nouveaux
+        # castings peuvent changer les filmographies, et seulement celles des films et
+        # acteurs qu'ils touchent
+        filmography.refresh_batched(self.cast_movie_ids, self.cast_actor_ids, self.batch_size)
+        cache.invalidate('movies')
+        return self.stats
@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class PortableIndex(models.Index):
+    """
+    Index dont les expressions peuvent porter NULLS FIRST / LAST (PostgreSQL).
+    SQLite les refuse dans CREATE INDEX ; son DESC place déjà les NULL en dernier,
+    on y crée donc le même index sans ces modificateurs (y compris quand SQLite
+    reconstruit une table lors d'un AddField).
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'sqlite' and self.expressions:
+            expressions = [
+                models.OrderBy(e.expression, descending=e.descending) if isinstance(e, models.OrderBy) else e
+                for e in self.expressions
+            ]
+            index = models.Index(*expressions, name=self.name, condition=self.condition)
+            return index.create_sql(model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
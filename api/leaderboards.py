@@ -0,0 +1,121 @@
+"""
+Classements précalculés : tendances (trending) et mieux notés (top-rated).
+
+- trending_score : somme des engagements (likes, notes) pondérés par une décroissance
+  exponentielle (demi-vie API_TRENDING_HALF_LIFE_HOURS). Tous les films décroissent au
+  même rythme, donc on stocke la somme ramenée à une date de référence fixe, en log
+  (log-sum-exp) pour ne jamais déborder : le classement reste juste sans jamais
+  réécrire les films inactifs. Un vote = un UPDATE de la ligne du film.
+  Un engagement = la création d'une ligne Like ou Rating, datée de son created_at : un
+  utilisateur compte au plus un like et une note par film. Unlike, re-like et changement
+  de note n'ajoutent rien (et n'enlèvent rien), comme dans rebuild_trending().
+- top_score : moyenne bayésienne (C * m + somme des notes) / (C + nombre de notes),
+  recalculée dans le même UPDATE que avg_rating (voir counters.apply_rating_delta).
+Lecture : index partiels (score DESC, id DESC), pagination par curseur -> O(taille de page).
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Abs, Cast, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import Like, Movie, Rating
+
+# date de référence des scores de tendance (ne pas changer sans reconstruire)
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def half_life_seconds():
+    return getattr(settings, 'API_TRENDING_HALF_LIFE_HOURS', 48) * 3600
+
+
+def prior():
+    """(m, C) : note moyenne a priori et poids de cet a priori (en nombre de votes)."""
+    return (getattr(settings, 'API_TOP_RATED_PRIOR_MEAN', 5.0),
+            getattr(settings, 'API_TOP_RATED_PRIOR_VOTES', 10))
+
+
+# --- top-rated ---
+def bayesian_score(rating_sum, rating_count):
+    """Expression SQL de la moyenne bayésienne à partir d'expressions somme / nombre."""
+    mean, votes = prior()
+    return (Cast(rating_sum, FloatField()) + mean * votes) / (Cast(rating_count, FloatField()) + votes)
+
+
+# --- trending ---
+def trending_term(weight, at=None):
+    """Contribution d'un engagement, en log : ln(poids) + âge relatif à EPOCH en demi-vies * ln 2."""
+    at = at or timezone.now()
+    return math.log(weight) + (at - EPOCH).total_seconds() / half_life_seconds() * math.log(2)
+
+
+def trending_value(score, at=None):
+    """Valeur « lisible » d'un score à l'instant `at` (somme des poids décrus)."""
+    if score is None:
+        return 0.0
+    return math.exp(score - trending_term(1.0, at))
+
+
+def combine_terms(a, b):
+    """ln(exp(a) + exp(b)) sans débordement : plusieurs engagements cumulés en un seul terme."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+def bump_trending(movie_id, weight, at=None):
+    """trending_score = ln(exp(trending_score) + exp(terme)), en un UPDATE et sans débordement."""
+    return bump_trending_term(movie_id, trending_term(weight, at))
+
+
+def bump_trending_term(movie_id, term):
+    """bump_trending() pour un terme déjà calculé (éventuellement cumulé, voir combine_terms)."""
+    term = Value(term)
+    current = F('trending_score')
+    return Movie.objects.filter(pk=movie_id).update(trending_score=Case(
+        When(trending_score__isnull=True, then=term),
+        default=Greatest(current, term) + Ln(Value(1.0) + Exp(-Abs(current - term))),
+        output_field=FloatField(),
+    ))
+
+
+def like_weight():
+    return getattr(settings, 'API_TRENDING_LIKE_WEIGHT', 1.0)
+
+
+def rating_weight():
+    return getattr(settings, 'API_TRENDING_RATING_WEIGHT', 2.0)
+
+
+def rebuild_trending(movie_ids=None):
+    """
+    Recalcule trending_score depuis Like.created_at et Rating.created_at (une ligne = un
+    engagement, like retiré compris) : un passage en flux sur les deux tables puis un
+    bulk_update. Retourne le nombre de films notés.
+    """
+    terms = defaultdict(list)
+    likes = Like.objects.all()
+    ratings = Rating.objects.all()
+    movies = Movie.objects.all()
+    if movie_ids is not None:
+        likes, ratings = likes.filter(movie_id__in=movie_ids), ratings.filter(movie_id__in=movie_ids)
+        movies = movies.filter(pk__in=movie_ids)
+    for movie_id, created_at in likes.order_by().values_list('movie_id', 'created_at').iterator(chunk_size=5000):
+        terms[movie_id].append(trending_term(like_weight(), created_at))
+    for movie_id, created_at in ratings.order_by().values_list('movie_id', 'created_at').iterator(chunk_size=5000):
+        terms[movie_id].append(trending_term(rating_weight(), created_at))
+
+    scored = []
+    for movie_id, values in terms.items():
+        top = max(values)
+        scored.append(Movie(pk=movie_id, trending_score=top + math.log(sum(math.exp(v - top) for v in values))))
+    with transaction.atomic():
+        movies.update(trending_score=None)
+        Movie.objects.bulk_update(scored, ['trending_score'], batch_size=1000)
+    return len(scored)
@@ -0,0 +1,198 @@
+"""
+Compteurs en direct (Server-Sent Events) : GET /api/live/movies/?ids=1,2,3
+
+Remplace le polling du détail d'un film : une connexion ouverte reçoit, pour les films
+suivis, un instantané puis des deltas compacts :
+
+    event: snapshot
+    data: {"12":{"likes_count":40,"avg_rating":7.5,"rating_count":8,"comments_count":3}}
+
+    event: update
+    data: {"12":{"likes_count":41,"comments":[981]}}
+
+- pub/sub du processus (Hub) alimenté par les écritures de Like / Rating / Comment
+  (signals.py, like_toggled, vidage des notes regroupées) après validation de la
+  transaction ; rien n'est lu ni publié pour un film que personne ne suit.
+- regroupement par connexion : les événements d'une fenêtre API_LIVE_BATCH_WINDOW
+  partent en un seul message ; un compteur ne garde que sa dernière valeur.
+- contre-pression : ce qui attend une connexion lente se fond dans le même tampon
+  (une entrée par film suivi, au plus API_LIVE_MAX_COMMENT_IDS ids de commentaires,
+  puis "comments_truncated": true -> relire le fil avec son lien since). La mémoire
+  d'une connexion est bornée, un client lent ne retient jamais les écrivains.
+- commentaire SSE ': ping' toutes les API_LIVE_HEARTBEAT secondes (proxys, déconnexions).
+
+Servi sous ASGI seulement (uvicorn backend.asgi:application) : une connexion est une
+coroutine en attente, pas un thread. Le bus est propre au processus : les écritures
+servies par un autre processus (autre worker, run_workers) n'atteignent que les
+abonnés de ce processus-là ; l'instantané de reconnexion (retry) rattrape l'écart.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from . import renderers
+from .models import Movie
+
+COUNTERS = ('likes_count', 'avg_rating', 'rating_count', 'comments_count')
+
+
+class Subscription:
+    """Films suivis par une connexion et deltas en attente (écrits depuis n'importe quel thread)."""
+
+    def __init__(self, movie_ids, loop):
+        self.movie_ids = frozenset(movie_ids)
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.signalled = False
+
+    def push(self, movie_id, fields):
+        max_comments = getattr(settings, 'API_LIVE_MAX_COMMENT_IDS', 20)
+        with self.lock:
+            entry = self.pending.setdefault(movie_id, {})
+            for name, value in fields.items():
+                if name != 'comment':
+                    entry[name] = value  # compteur : la dernière valeur l'emporte
+                elif len(entry.setdefault('comments', [])) < max_comments:
+                    entry['comments'].append(value)
+                else:
+                    entry['comments_truncated'] = True
+            wake, self.signalled = not self.signalled, True
+        if wake:
+            try:
+                self.loop.call_soon_threadsafe(self.ready.set)
+            except RuntimeError:
+                pass  # boucle fermée : la connexion est déjà terminée
+
+    def take(self):
+        """Deltas accumulés depuis le dernier message (à appeler depuis la boucle de la connexion)."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.signalled = False
+            self.ready.clear()
+        return pending
+
+
+class Hub:
+    """film -> connexions abonnées, pour tout le processus."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_movie = {}
+        self.subscriptions = set()
+
+    def subscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.add(subscription)
+            for movie_id in subscription.movie_ids:
+                self.by_movie.setdefault(movie_id, set()).add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+            for movie_id in subscription.movie_ids:
+                subscribers = self.by_movie.get(movie_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.by_movie[movie_id]
+
+    def connections(self):
+        return len(self.subscriptions)
+
+    def watched(self, movie_ids):
+        with self.lock:
+            return [pk for pk in movie_ids if pk in self.by_movie]
+
+    def publish(self, movie_id, fields):
+        with self.lock:
+            subscribers = list(self.by_movie.get(movie_id, ()))
+        for subscription in subscribers:
+            subscription.push(movie_id, fields)
+
+
+hub = Hub()
+
+
+# --- publication (côté écritures) ---
+def publish(movie_id, **fields):
+    """Pousse des valeurs déjà connues aux abonnés du film, une fois la transaction validée."""
+    if hub.watched([movie_id]):
+        transaction.on_commit(lambda: hub.publish(movie_id, fields))
+
+
+def publish_counters(movie_ids, *names):
+    """Relit `names` pour les films suivis (une requête, après validation) et les publie."""
+    if not hub.watched(movie_ids):
+        return
+
+    def send():
+        watched = hub.watched(movie_ids)
+        if watched:
+            for row in Movie.objects.filter(pk__in=watched).values('pk', *names):
+                hub.publish(row.pop('pk'), row)
+    transaction.on_commit(send)
+
+
+# --- flux (côté connexions) ---
+def sse(event, data):
+    return b'event: ' + event.encode('ascii') + b'\ndata: ' + renderers.dumps(data) + b'\n\n'
+
+
+async def event_stream(subscription):
+    """Instantané puis deltas regroupés, jusqu'à la déconnexion du client."""
+    batch = getattr(settings, 'API_LIVE_BATCH_WINDOW', 0.25)
+    heartbeat = getattr(settings, 'API_LIVE_HEARTBEAT', 15)
+    # abonné avant l'instantané : aucune écriture validée entre les deux n'est perdue
+    hub.subscribe(subscription)
+    try:
+        rows = Movie.objects.filter(pk__in=subscription.movie_ids).values('pk', *COUNTERS)
+        snapshot = {str(row.pop('pk')): row async for row in rows}
+        yield b'retry: 3000\n' + sse('snapshot', snapshot)
+        while True:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b': ping\n\n'
+                continue
+            if batch:
+                await asyncio.sleep(batch)  # les écritures de la fenêtre partent ensemble
+            pending = subscription.take()
+            if pending:
+                yield sse('update', {str(pk): fields for pk, fields in pending.items()})
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def error(detail, status):
+    return HttpResponse(renderers.dumps({'detail': detail}), status=status, content_type='application/json')
+
+
+@require_GET
+async def movie_stream(request):
+    if not isinstance(request, ASGIRequest):
+        # sous WSGI, un flux sans fin occuperait un worker (et Django le lirait en entier)
+        return error("Flux disponible sous ASGI seulement (uvicorn backend.asgi:application).", 501)
+    raw = request.GET.get('ids', '')
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw.split(',') if i.strip()))
+    except ValueError:
+        return error("ids : liste d'entiers séparés par des virgules.", 400)
+    max_ids = getattr(settings, 'API_LIVE_MAX_IDS', 100)
+    if not ids or len(ids) > max_ids:
+        return error(f"ids : de 1 à {max_ids} films.", 400)
+    if hub.connections() >= getattr(settings, 'API_LIVE_MAX_CONNECTIONS', 5000):
+        return error("Trop de connexions ouvertes, réessayer plus tard.", 503)
+
+    response = StreamingHttpResponse(event_stream(Subscription(ids, asyncio.get_running_loop())),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # pas de mise en tampon par un proxy (nginx) : chaque message part tout de suite
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api import images
+from api.models import Actor, Movie
+
+
+class Command(BaseCommand):
+    help = "Génère les déclinaisons WebP / JPEG manquantes des affiches, illustrations et photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Régénère aussi les images qui ont déjà des déclinaisons.")
+
+    def handle(self, *args, **options):
+        for model in (Movie, Actor):
+            for field_name in images.image_fields(model):
+                queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                if not options['force']:
+                    queryset = queryset.filter(**{f'{field_name}_renditions': {}})
+                done = 0
+                for instance in queryset.only('pk', field_name, f'{field_name}_renditions').iterator(chunk_size=200):
+                    images.refresh(instance, field_name)
+                    done += 1
+                self.stdout.write(f"{model.__name__}.{field_name} : {done} image(s)")
+        self.stdout.write(self.style.SUCCESS("Déclinaisons à jour."))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import CatalogueImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe un catalogue depuis des fichiers JSONL ou CSV (acteurs, puis films, puis casting). "
+        "Une ligne de film JSONL peut porter son casting : "
+        "\"cast\": [{\"actor\": \"Nom\", \"role_name\": \"...\", \"order\": 0}]."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actors', help="Fichier d'acteurs (first_name, last_name, full_name, birth_date, biography).")
+        parser.add_argument('--movies', help="Fichier de films (title_fr, release_date, director, ...).")
+        parser.add_argument('--castings', help="Fichier de casting (movie, release_date, actor, role_name, order).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Lignes par lot / transaction (défaut : 1000).")
+
+    def handle(self, *args, **options):
+        if not any(options[kind] for kind in ('actors', 'movies', 'castings')):
+            raise CommandError("Indiquer au moins un fichier : --actors, --movies ou --castings.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être positif.")
+
+        importer = CatalogueImporter(batch_size=options['batch_size'], log=self.stdout.write)
+        started = time.monotonic()
+        total = 0
+        try:
+            if options['actors']:
+                total += importer.import_actors(read_rows(options['actors']))
+            if options['movies']:
+                total += importer.import_movies(read_rows(options['movies']))
+            if options['castings']:
+                total += importer.import_castings(read_rows(options['castings']))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            # les lots déjà validés restent en base : index et cache à rafraîchir dans tous les cas
+            stats = importer.finish()
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        summary = ', '.join(f"{key}={value}" for key, value in sorted(stats.items()))
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} lignes en {elapsed:.1f}s ({total / elapsed:.0f} lignes/s) — {summary}"
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api import filmography
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit les filmographies (Credit) et le graphe des partenaires (CoStar) depuis Casting "
+            "(après une écriture en masse qui contourne les signaux).")
+
+    def handle(self, *args, **options):
+        credits, edges = filmography.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{credits} rôle(s), {edges} arête(s) de partenaires."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api import tasks
+from api.counters import reconcile
+from api.leaderboards import rebuild_trending
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit likes_count / rating_sum / rating_count / avg_rating / top_score / comments_count "
+            "depuis Like, Rating et Comment "
+            "(et trending_score avec --trending).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('movie_ids', nargs='*', type=int,
+                            help="Films à recalculer (tous si omis).")
+        parser.add_argument('--trending', action='store_true',
+                            help="Recalcule aussi les scores de tendance (demi-vie ou poids modifiés).")
+        parser.add_argument('--enqueue', action='store_true',
+                            help="Confie le recalcul des compteurs aux workers (run_workers) au lieu de l'exécuter ici.")
+
+    def handle(self, *args, **options):
+        movie_ids = options['movie_ids'] or None
+        if options['enqueue']:
+            tasks.enqueue('counters.reconcile', idempotency_key=f'reconcile:{movie_ids or "all"}',
+                          movie_ids=movie_ids)
+            self.stdout.write(self.style.SUCCESS("Recalcul mis en file."))
+            return
+        updated = reconcile(movie_ids)
+        self.stdout.write(self.style.SUCCESS(f"{updated} film(s) recalculé(s)."))
+        if options['trending']:
+            scored = rebuild_trending(movie_ids)
+            self.stdout.write(self.style.SUCCESS(f"{scored} film(s) en tendance."))
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from api import tasks
+
+
+def _execute(task_row):
+    # chaque thread a sa propre connexion : on la rend propre avant et après
+    close_old_connections()
+    try:
+        return tasks.execute(task_row)
+    finally:
+        close_old_connections()
+
+
+def work(worker_id, threads, poll, burst, stop):
+    """Boucle d'un worker : réserve `threads` tâches, les exécute en parallèle, recommence."""
+    done = failed = 0
+    last_purge = time.monotonic()
+    # --threads 1 : exécution dans le thread courant (même connexion, pas de pool)
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=worker_id) if threads > 1 else None
+    run, execute = (pool.map, _execute) if pool else (map, tasks.execute)
+    try:
+        while not stop.is_set():
+            batch = tasks.claim(worker_id, limit=threads)
+            if not batch:
+                if burst:
+                    break
+                stop.wait(poll)
+                continue
+            for ok in run(execute, batch):
+                done += ok
+                failed += not ok
+            if time.monotonic() - last_purge > 3600:
+                tasks.purge()
+                last_purge = time.monotonic()
+    finally:
+        if pool:
+            pool.shutdown()
+    return done, failed
+
+
+def _child(worker_id, threads, poll, burst):
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    work(worker_id, threads, poll, burst, stop)
+
+
+class Command(BaseCommand):
+    help = ("Exécute les tâches de fond de la table api_task (voir api/tasks.py). "
+            "SIGTERM / Ctrl-C : les tâches en cours se terminent, puis le worker s'arrête.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help="Tâches exécutées en parallèle par processus (défaut : 4).")
+        parser.add_argument('--processes', type=int, default=1,
+                            help="Processus workers (défaut : 1, dans le processus courant).")
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help="Attente en secondes quand la file est vide (défaut : 1).")
+        parser.add_argument('--burst', action='store_true',
+                            help="Vide la file puis s'arrête (cron, tests, déploiement).")
+
+    def handle(self, *args, **options):
+        threads, processes = max(options['threads'], 1), max(options['processes'], 1)
+        poll, burst = options['poll'], options['burst']
+        name = f'{socket.gethostname()}:{os.getpid()}'
+
+        if processes == 1:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda *args: stop.set())
+            signal.signal(signal.SIGINT, lambda *args: stop.set())
+            self.stdout.write(f"worker {name} : {threads} thread(s)")
+            done, failed = work(name, threads, poll, burst, stop)
+            self.stdout.write(self.style.SUCCESS(f"{done} tâche(s) exécutée(s), {failed} en échec."))
+            return
+
+        # pas de connexion partagée entre processus
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [context.Process(target=_child, args=(f'{name}/{i}', threads, poll, burst))
+                    for i in range(processes)]
+        for child in children:
+            child.start()
+        self.stdout.write(f"worker {name} : {processes} processus x {threads} thread(s)")
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    os.kill(child.pid, signal.SIGTERM)
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS("Workers arrêtés."))
@@ -0,0 +1,241 @@
+"""
+Instrumentation des requêtes : latence, nombre et durée des requêtes SQL, temps de rendu.
+
+- MetricsMiddleware chronomètre chaque requête, rangée par route (motif d'URL, pas le
+  chemin : 'api/movies/<int:pk>/') ; histogramme de latence toujours tenu (deux appels
+  à perf_counter).
+- une fraction API_METRICS_SAMPLE_RATE des requêtes est profilée : un execute_wrapper
+  posé sur chaque connexion compte les requêtes SQL et leur durée, le renderer JSON
+  mesure le temps de rendu. Hors échantillon, le wrapper se réduit à un ContextVar.get().
+- une requête profilée qui dépasse son budget de requêtes SQL (API_METRICS_QUERY_BUDGET,
+  API_METRICS_ROUTE_BUDGETS par route) est signalée dans le log 'api.metrics'.
+- succès / défauts du cache d'objets (objcache.py), par modèle et par niveau.
+- GET /api/_metrics (views.MetricsView) : format texte Prometheus, réservé au staff ou
+  au jeton API_METRICS_TOKEN (Authorization: Bearer <jeton>).
+
+Les compteurs sont propres au processus : avec plusieurs workers gunicorn, chaque
+processus expose les siens (à agréger côté Prometheus).
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import renderers
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# statistiques de la requête profilée en cours (None hors échantillon)
+_current = ContextVar('api_metrics_request', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'sql_seconds', 'render_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+class Histogram:
+    """Histogramme cumulatif à la Prometheus (bornes supérieures fixes + somme + total)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_labels(labels, le=bound)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum:.6f}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    items = {**labels, **extra}
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items.items()) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}       # (route, method, status) -> nombre
+        self.latency = {}        # (route, method) -> Histogram
+        self.queries = {}        # (route, method) -> Histogram (requêtes profilées)
+        self.sql_seconds = {}    # (route, method) -> secondes
+        self.render_seconds = {}
+        self.over_budget = {}
+        self.object_cache = {}   # (modèle, niveau, hit / miss) -> nombre
+
+    def record(self, route, method, status, elapsed, stats=None, over_budget=False):
+        key = (route, method)
+        with self.lock:
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            if stats is not None:
+                self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+                self.sql_seconds[key] = self.sql_seconds.get(key, 0.0) + stats.sql_seconds
+                self.render_seconds[key] = self.render_seconds.get(key, 0.0) + stats.render_seconds
+            if over_budget:
+                self.over_budget[key] = self.over_budget.get(key, 0) + 1
+
+    def record_object_cache(self, model, tier, hits, misses):
+        with self.lock:
+            for result, count in (('hit', hits), ('miss', misses)):
+                if count:
+                    key = (model, tier, result)
+                    self.object_cache[key] = self.object_cache.get(key, 0) + count
+
+    def render(self):
+        """Exposition au format texte Prometheus 0.0.4."""
+        out = []
+
+        def counter(name, help_text, values, label_names):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} counter')
+            for key, value in sorted(values.items()):
+                out.append(f'{name}{_labels(dict(zip(label_names, key)))} {value:g}')
+
+        def histogram(name, help_text, values):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} histogram')
+            for (route, method), hist in sorted(values.items()):
+                out.extend(hist.lines(name, {'route': route, 'method': method}))
+
+        with self.lock:
+            counter('api_requests_total', "Requêtes traitées.", self.requests, ('route', 'method', 'status'))
+            histogram('api_request_duration_seconds', "Latence des requêtes.", self.latency)
+            histogram('api_request_queries', "Requêtes SQL par requête (requêtes profilées).", self.queries)
+            counter('api_request_sql_seconds_total', "Temps SQL cumulé (requêtes profilées).",
+                    self.sql_seconds, ('route', 'method'))
+            counter('api_request_render_seconds_total', "Temps de rendu JSON cumulé (requêtes profilées).",
+                    self.render_seconds, ('route', 'method'))
+            counter('api_query_budget_exceeded_total', "Requêtes au-delà du budget SQL de leur route.",
+                    self.over_budget, ('route', 'method'))
+            counter('api_object_cache_requests_total', "Lectures du cache d'objets par modèle, niveau et résultat.",
+                    self.object_cache, ('model', 'tier', 'result'))
+        return '\n'.join(out) + '\n'
+
+
+registry = Registry()
+
+
+# --- SQL ---
+def record_sql(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """connection_created : le wrapper reste sur la connexion (équivalent permanent de
+    connection.execute_wrapper), y compris dans les threads de sync_to_async."""
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+# --- rendu ---
+class JSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer (orjson, voir renderers.py), chronométré pour les requêtes profilées."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            stats.render_seconds += time.perf_counter() - started
+
+
+# --- middleware ---
+def query_budget(route):
+    budgets = getattr(settings, 'API_METRICS_ROUTE_BUDGETS', {})
+    return budgets.get(route, getattr(settings, 'API_METRICS_QUERY_BUDGET', 20))
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else '<unmatched>'
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        if not getattr(settings, 'API_METRICS_ENABLED', True):
+            return None, None
+        rate = getattr(settings, 'API_METRICS_SAMPLE_RATE', 0.0)
+        stats = RequestStats() if rate and random.random() < rate else None
+        return stats, _current.set(stats)
+
+    def _finish(self, request, response, started, stats, token):
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        route = route_of(request)
+        over_budget = False
+        if stats is not None:
+            budget = query_budget(route)
+            over_budget = stats.queries > budget
+            if over_budget:
+                logger.warning("%s %s : %d requêtes SQL (budget %d, %.1f ms SQL)", request.method, route,
+                               stats.queries, budget, stats.sql_seconds * 1000)
+        registry.record(route, request.method, response.status_code, elapsed, stats, over_budget)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = self._start()
+        if token is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._finish(request, response, started, stats, token)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = self._start()
+        if token is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._finish(request, response, started, stats, token)
+        return response
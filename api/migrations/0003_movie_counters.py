@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:28
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    # même calcul que api.counters.reconcile(), sur les modèles historiques
+    Movie = apps.get_model('api', 'Movie')
+    Like = apps.get_model('api', 'Like')
+    Rating = apps.get_model('api', 'Rating')
+    likes = (
+        Like.objects.filter(movie=OuterRef('pk'), liked=True)
+        .order_by().values('movie').annotate(n=Count('pk')).values('n')
+    )
+    ratings = Rating.objects.filter(movie=OuterRef('pk')).order_by().values('movie')
+    Movie.objects.update(
+        likes_count=Coalesce(Subquery(likes, output_field=IntegerField()), 0),
+        rating_sum=Coalesce(Subquery(ratings.annotate(s=Sum('score')).values('s'),
+                                     output_field=IntegerField()), 0),
+        rating_count=Coalesce(Subquery(ratings.annotate(n=Count('pk')).values('n'),
+                                       output_field=IntegerField()), 0),
+        avg_rating=Subquery(ratings.annotate(a=Avg('score')).values('a'), output_field=FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_casting_movie_related_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
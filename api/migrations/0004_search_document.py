@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:41
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_documents(apps, schema_editor):
+    from api.search import normalize_text
+
+    Actor = apps.get_model('api', 'Actor')
+    Movie = apps.get_model('api', 'Movie')
+    Casting = apps.get_model('api', 'Casting')
+
+    actors = list(Actor.objects.all())
+    for actor in actors:
+        actor.search_document = normalize_text(actor.full_name, actor.first_name, actor.last_name)
+    Actor.objects.bulk_update(actors, ['search_document'], batch_size=1000)
+
+    names = defaultdict(list)
+    for movie_id, full_name in Casting.objects.order_by('movie_id', 'order').values_list('movie_id', 'actor__full_name'):
+        names[movie_id].append(full_name)
+    movies = list(Movie.objects.all())
+    for movie in movies:
+        movie.search_document = normalize_text(movie.title_fr, movie.title_original, ' '.join(names[movie.pk]),
+                                               movie.director, movie.description)
+    Movie.objects.bulk_update(movies, ['search_document'], batch_size=1000)
+
+
+PG_INDEXES = [
+    ('api_movie_search_fts', "api_movie USING gin (to_tsvector('french'::regconfig, COALESCE(search_document, '')))"),
+    ('api_movie_search_trgm', "api_movie USING gin (search_document gin_trgm_ops)"),
+    ('api_actor_search_fts', "api_actor USING gin (to_tsvector('french'::regconfig, COALESCE(search_document, '')))"),
+    ('api_actor_search_trgm', "api_actor USING gin (search_document gin_trgm_ops)"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    # index GIN plein texte + trigrammes : PostgreSQL uniquement
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, definition in PG_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in PG_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_movie_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
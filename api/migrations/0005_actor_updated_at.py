@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
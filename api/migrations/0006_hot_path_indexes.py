@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+from api.indexes import PortableIndex
+
+# index des chemins chauds ; les mêmes définitions que Meta.indexes des modèles
+INDEXES = [
+    ('movie', PortableIndex(models.OrderBy(models.F('release_date'), descending=True, nulls_last=True), models.OrderBy(models.F('title_fr')), models.OrderBy(models.F('id')), name='movie_release_title_idx')),
+    ('casting', models.Index(fields=['movie', 'order', 'id'], name='casting_movie_order_idx')),
+    ('like', models.Index(condition=models.Q(('liked', True)), fields=['movie'], name='like_movie_liked_idx')),
+    ('comment', PortableIndex(models.F('movie'), models.OrderBy(models.F('created_at'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='comment_movie_created_idx')),
+    ('comment', models.Index(condition=models.Q(('rating__isnull', True)), fields=['movie', 'author', '-created_at'], name='comment_pending_rating_idx')),
+]
+
+
+def add_indexes(apps, schema_editor):
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    for model_name, index in INDEXES:
+        model = apps.get_model('api', model_name)
+        if postgres:
+            # CREATE INDEX CONCURRENTLY : pas de verrou d'écriture sur les tables en production
+            schema_editor.add_index(model, index, concurrently=True)
+        else:
+            schema_editor.add_index(model, index)
+
+
+def remove_indexes(apps, schema_editor):
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    for model_name, index in INDEXES:
+        model = apps.get_model('api', model_name)
+        if postgres:
+            schema_editor.remove_index(model, index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY ne peut pas tourner dans une transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0005_actor_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name=model_name, index=index)
+                for model_name, index in INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_indexes, remove_indexes),
+            ],
+        ),
+    ]
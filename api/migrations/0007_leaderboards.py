@@ -0,0 +1,92 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:20
+
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+from api.indexes import PortableIndex
+from django.db.models.functions import Cast
+
+# mêmes constantes que api/leaderboards.py au moment de la migration
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE = 48 * 3600
+LIKE_WEIGHT, RATING_WEIGHT = 1.0, 2.0
+PRIOR_MEAN, PRIOR_VOTES = 5.0, 10
+
+INDEXES = [
+    PortableIndex(models.OrderBy(models.F('trending_score'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('trending_score__isnull', False)), name='movie_trending_idx'),
+    PortableIndex(models.OrderBy(models.F('top_score'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('top_score__isnull', False)), name='movie_top_rated_idx'),
+]
+
+
+def term(weight, at):
+    return math.log(weight) + (at - EPOCH).total_seconds() / HALF_LIFE * math.log(2)
+
+
+def backfill(apps, schema_editor):
+    Movie = apps.get_model('api', 'Movie')
+    Like = apps.get_model('api', 'Like')
+    Rating = apps.get_model('api', 'Rating')
+
+    terms = defaultdict(list)
+    for movie_id, at in Like.objects.filter(liked=True).values_list('movie_id', 'created_at').iterator():
+        terms[movie_id].append(term(LIKE_WEIGHT, at))
+    for movie_id, at in Rating.objects.values_list('movie_id', 'updated_at').iterator():
+        terms[movie_id].append(term(RATING_WEIGHT, at))
+    movies = []
+    for movie_id, values in terms.items():
+        top = max(values)
+        movies.append(Movie(pk=movie_id, trending_score=top + math.log(sum(math.exp(v - top) for v in values))))
+    Movie.objects.bulk_update(movies, ['trending_score'], batch_size=1000)
+
+    Movie.objects.filter(rating_count__gt=0).update(top_score=(
+        (Cast('rating_sum', models.FloatField()) + PRIOR_MEAN * PRIOR_VOTES)
+        / (Cast('rating_count', models.FloatField()) + PRIOR_VOTES)
+    ))
+
+
+def add_indexes(apps, schema_editor):
+    Movie = apps.get_model('api', 'Movie')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.add_index(Movie, index, concurrently=True)
+        else:
+            schema_editor.add_index(Movie, index)
+
+
+def remove_indexes(apps, schema_editor):
+    Movie = apps.get_model('api', 'Movie')
+    for index in INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.remove_index(Movie, index, concurrently=True)
+        else:
+            schema_editor.remove_index(Movie, index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY ne peut pas tourner dans une transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='trending_score',
+            field=models.FloatField(blank=True, default=None, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='top_score',
+            field=models.FloatField(blank=True, default=None, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='movie', index=index) for index in INDEXES],
+            database_operations=[migrations.RunPython(add_indexes, remove_indexes)],
+        ),
+    ]
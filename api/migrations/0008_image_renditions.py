@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actor',
+            name='photo_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='illustration_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='poster_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
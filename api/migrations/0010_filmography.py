@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-17 16:04
+
+import api.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def backfill(apps, schema_editor):
+    # même calcul que api.filmography.rebuild(), sur les modèles historiques
+    Actor = apps.get_model('api', 'Actor')
+    Casting = apps.get_model('api', 'Casting')
+    Credit = apps.get_model('api', 'Credit')
+    CoStar = apps.get_model('api', 'CoStar')
+    Credit.objects.bulk_create(
+        [Credit(actor_id=a, movie_id=m, role_name=role, order=order, title_fr=title, release_date=released)
+         for a, m, role, order, title, released in Casting.objects.order_by().values_list(
+             'actor_id', 'movie_id', 'role_name', 'order', 'movie__title_fr', 'movie__release_date').iterator()],
+        batch_size=2000)
+    pairs = (Casting.objects.annotate(other=F('movie__movie_casts__actor_id'))
+             .exclude(other=F('actor_id'))
+             .values('actor_id', 'other').order_by()
+             .annotate(n=Count('movie_id', distinct=True)))
+    names = dict(Actor.objects.values_list('pk', 'full_name'))
+    CoStar.objects.bulk_create(
+        [CoStar(actor_id=row['actor_id'], costar_id=row['other'], name=names.get(row['other'], ''),
+                movies_count=row['n']) for row in pairs.iterator()],
+        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_task_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoStar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('movies_count', models.PositiveIntegerField(default=0)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='costars', to='api.actor')),
+                ('costar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.actor')),
+            ],
+            options={
+                'ordering': ['-movies_count', 'name'],
+                'indexes': [models.Index(fields=['actor', '-movies_count', 'name', 'id'], name='costar_actor_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('actor', 'costar'), name='costar_pair_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Credit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role_name', models.CharField(blank=True, max_length=200)),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('title_fr', models.CharField(max_length=255)),
+                ('release_date', models.DateField(blank=True, null=True)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='api.actor')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.movie')),
+            ],
+            options={
+                'ordering': ['-release_date', 'title_fr'],
+                'indexes': [api.indexes.PortableIndex(models.F('actor'), models.OrderBy(models.F('release_date'), descending=True, nulls_last=True), models.F('title_fr'), models.F('id'), name='credit_actor_release_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:10
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_comments_count(apps, schema_editor):
+    # même calcul que api.counters.reconcile(), sur les modèles historiques
+    Movie = apps.get_model('api', 'Movie')
+    Comment = apps.get_model('api', 'Comment')
+    comments = (
+        Comment.objects.filter(movie=OuterRef('pk'))
+        .order_by().values('movie').annotate(n=Count('pk')).values('n')
+    )
+    Movie.objects.update(comments_count=Coalesce(Subquery(comments, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_filmography'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_comments_count, migrations.RunPython.noop),
+    ]
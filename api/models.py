@@ -1,10 +1,27 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg, Q
+from django.db.models import Exists, F, OuterRef, Prefetch, Q, Subquery
 from django.utils import timezone
 from django.conf import settings
 
+from .indexes import PortableIndex
+
+
+
+class ActorQuerySet(models.QuerySet):
+    @staticmethod
+    def detail_prefetches():
+        """Dernières lignes de filmographie et principaux partenaires (projections, sans jointure)."""
+        return [
+            Prefetch('credits', queryset=Credit.objects.order_by('-release_date', 'title_fr', 'id')[:10],
+                     to_attr='recent_credits'),
+            Prefetch('costars', queryset=CoStar.objects.order_by('-movies_count', 'name', 'id')[:10],
+                     to_attr='top_costars'),
+        ]
+
+    def with_detail(self):
+        return self.prefetch_related(*self.detail_prefetches())
 
 
 class Actor(models.Model):
@@ -17,6 +34,13 @@ class Actor(models.Model):
     birth_date = models.DateField(null=True, blank=True)
     biography = models.TextField(blank=True)
     photo = models.ImageField(upload_to='actors/photos/', null=True, blank=True)
+    # déclinaisons WebP / JPEG de la photo (voir api/images.py)
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # texte normalisé pour la recherche (voir api/search.py)
+    search_document = models.TextField(blank=True, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ActorQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         # Remplir full_name si vide
@@ -31,6 +55,45 @@ class Actor(models.Model):
         return self.full_name
 
 
+class MovieQuerySet(models.QuerySet):
+    """
+    Requêtes préchargées pour éviter les N+1 dans les serializers.
+    """
+
+    @staticmethod
+    def detail_prefetches(join_actors=True):
+        """
+        Casting (+ acteurs) et première page des commentaires (+ auteur, note), dans l'ordre
+        du fil : nombre de requêtes et taille de réponse fixes quel que soit le film.
+        join_actors=False : acteurs laissés au cache d'objets (voir CastingListSerializer).
+        """
+        castings = Casting.objects.select_related('actor') if join_actors else Casting.objects.all()
+        recent = (Comment.objects.select_related('author', 'rating')
+                  .order_by(F('created_at').desc(nulls_last=True), '-id'))
+        return [
+            Prefetch('movie_casts', queryset=castings),
+            Prefetch('comments', queryset=recent[:getattr(settings, 'API_DETAIL_COMMENTS', 10)],
+                     to_attr='recent_comments'),
+        ]
+
+    def with_detail(self):
+        return self.prefetch_related(*self.detail_prefetches())
+
+    def with_user_state(self, user):
+        """
+        Annote user_liked_flag / user_rating_score pour l'utilisateur courant
+        (sous-requêtes dans le SELECT principal au lieu d'un get() par film).
+        """
+        if not user or not user.is_authenticated:
+            return self
+        return self.annotate(
+            user_liked_flag=Exists(Like.objects.filter(movie=OuterRef('pk'), user=user, liked=True)),
+            user_rating_score=Subquery(
+                Rating.objects.filter(movie=OuterRef('pk'), user=user).values('score')[:1]
+            ),
+        )
+
+
 class Movie(models.Model):
     """
     Modèle principal pour un film.
@@ -47,17 +110,42 @@ class Movie(models.Model):
     release_date = models.DateField("Date de sortie", null=True, blank=True)
     poster = models.ImageField("Affiche", upload_to='movies/posters/', null=True, blank=True)
     illustration = models.ImageField("Image d'illustration", upload_to='movies/illustrations/', null=True, blank=True)
+    # déclinaisons WebP / JPEG des images (voir api/images.py)
+    poster_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    illustration_renditions = models.JSONField(default=dict, blank=True, editable=False)
     cast = models.ManyToManyField(Actor, through='Casting', related_name='movies', blank=True)
 
-    # champs dénormalisés (optionnels) — seront tenus à jour par signaux
+    # champs dénormalisés — tenus à jour par signaux (voir api/counters.py)
     likes_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
     avg_rating = models.FloatField(null=True, blank=True, default=None)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    # titres + casting + réalisateur + descriptif normalisés (voir api/search.py)
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    # classements (voir api/leaderboards.py) ; NULL = pas encore classé
+    trending_score = models.FloatField(null=True, blank=True, default=None, editable=False)
+    top_score = models.FloatField(null=True, blank=True, default=None, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = MovieQuerySet.as_manager()
+
     class Meta:
         ordering = ['-release_date', 'title_fr']
+        indexes = [
+            # ordre de la pagination par curseur (NULL en dernier, pk pour départager)
+            PortableIndex(F('release_date').desc(nulls_last=True), F('title_fr').asc(), F('id').asc(),
+                          name='movie_release_title_idx'),
+            # /movies/trending/ et /movies/top-rated/ : lecture d'une page = parcours d'index borné
+            PortableIndex(F('trending_score').desc(nulls_last=True), F('id').desc(),
+                          condition=Q(trending_score__isnull=False), name='movie_trending_idx'),
+            PortableIndex(F('top_score').desc(nulls_last=True), F('id').desc(),
+                          condition=Q(top_score__isnull=False), name='movie_top_rated_idx'),
+        ]
 
     def __str__(self):
         return self.title_fr or self.title_original or f"Movie {self.pk}"
@@ -83,14 +171,11 @@ class Movie(models.Model):
         return f"{m}m"
 
     # --- statistiques basées sur les relations utilisateur ---
-    def likes_count(self):
-        """Nombre total de likes (True) pour ce film."""
-        return Like.objects.filter(movie=self, liked=True).count()
-
     def average_rating(self):
-        """Moyenne des notes (float) ou None si pas de notes."""
-        agg = Rating.objects.filter(movie=self).aggregate(avg=Avg('score'))
-        return agg['avg']  # None si pas de notes
+        """Moyenne des notes (float) ou None si pas de notes (lue sur les compteurs)."""
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
 
     def user_liked(self, user):
         """Retourne True/False selon si l'utilisateur a liké ce film (ou None si pas d'objet)."""
@@ -117,7 +202,7 @@ class Casting(models.Model):
     Table intermédiaire entre Movie et Actor pour gérer le rôle (ex: 'Jean Valjean'),
     l'ordre d'apparition, etc.
     """
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='movie_casts')
     actor = models.ForeignKey(Actor, on_delete=models.CASCADE)
     role_name = models.CharField("Rôle", max_length=200, blank=True)
     order = models.PositiveIntegerField("Ordre", default=0)
@@ -125,6 +210,9 @@ class Casting(models.Model):
     class Meta:
         unique_together = ('movie', 'actor', 'role_name')
         ordering = ['order']
+        indexes = [
+            models.Index(fields=['movie', 'order', 'id'], name='casting_movie_order_idx'),
+        ]
 
     def __str__(self):
         if self.role_name:
@@ -147,6 +235,10 @@ class Like(models.Model):
     # optionnel : pourquoi l'utilisateur a liké, etc.
     class Meta:
         unique_together = ('user', 'movie')
+        indexes = [
+            # comptage des likes actifs d'un film
+            models.Index(fields=['movie'], condition=Q(liked=True), name='like_movie_liked_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} {'likes' if self.liked else 'does not like'} {self.movie}"
@@ -179,4 +271,97 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # fil des commentaires d'un film, du plus récent au plus ancien
+            PortableIndex(F('movie'), F('created_at').desc(nulls_last=True), F('id').desc(),
+                          name='comment_movie_created_idx'),
+            # dernier commentaire sans note d'un auteur (liaison à la note, voir la vue rate)
+            models.Index(fields=['movie', 'author', '-created_at'], condition=Q(rating__isnull=True),
+                         name='comment_pending_rating_idx'),
+        ]
+
+
+class Task(models.Model):
+    """
+    Tâche de fond (voir api/tasks.py) : écrite dans la transaction de la requête,
+    exécutée ensuite par `manage.py run_workers`. Pas de broker externe.
+    """
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'En attente'), (RUNNING, 'En cours'), (DONE, 'Terminée'), (FAILED, 'Échec')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # au plus une tâche en attente par clé (les suivantes se fondent dedans) ; NULL = pas de dédoublonnage
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['idempotency_key'], condition=Q(status='queued'),
+                                    name='task_queued_key_uniq'),
+        ]
+        indexes = [
+            # prochaines tâches à prendre
+            models.Index(fields=['run_at', 'id'], condition=Q(status='queued'), name='task_ready_idx'),
+            # baux expirés (worker arrêté en pleine tâche)
+            models.Index(fields=['locked_until'], condition=Q(status='running'), name='task_lease_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class Credit(models.Model):
+    """
+    Filmographie matérialisée : une ligne par Casting, avec le titre et la date du film
+    recopiés pour lire la filmographie d'un acteur sans jointure (voir api/filmography.py).
+    """
+    actor = models.ForeignKey(Actor, on_delete=models.CASCADE, related_name='credits')
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    role_name = models.CharField(max_length=200, blank=True)
+    order = models.PositiveIntegerField(default=0)
+    title_fr = models.CharField(max_length=255)
+    release_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-release_date', 'title_fr']
+        indexes = [
+            # /actors/<id>/filmography/ : même ordre que la pagination par curseur
+            PortableIndex(F('actor'), F('release_date').desc(nulls_last=True), F('title_fr'), F('id'),
+                          name='credit_actor_release_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor_id} -> {self.title_fr}"
+
+
+class CoStar(models.Model):
+    """
+    Graphe des partenaires : une arête par couple d'acteurs ayant tourné ensemble,
+    dans les deux sens, avec le nombre de films en commun (voir api/filmography.py).
+    """
+    actor = models.ForeignKey(Actor, on_delete=models.CASCADE, related_name='costars')
+    costar = models.ForeignKey(Actor, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=200)  # full_name du partenaire, recopié
+    movies_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-movies_count', 'name']
+        constraints = [
+            models.UniqueConstraint(fields=['actor', 'costar'], name='costar_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['actor', '-movies_count', 'name', 'id'], name='costar_actor_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor_id} <-> {self.costar_id} ({self.movies_count})"
@@ -0,0 +1,166 @@
+"""
+Cache d'objets Movie / Actor en lecture traversante, sur deux niveaux.
+
+Le détail d'un film, la fiche d'un acteur, les acteurs imbriqués du casting
+(CastingSerializer) et le contrôle d'existence de /actors/<id>/movies/ relisent sans
+cesse les mêmes lignes. ObjectCache les sert, dans l'ordre :
+1. depuis le LRU du processus (API_OBJECT_CACHE_SIZE instances par modèle,
+   API_OBJECT_CACHE_TTL secondes) ;
+2. depuis l'alias API_OBJECT_CACHE_ALIAS de CACHES s'il est défini (Redis partagé
+   entre processus, même durée) ;
+3. sinon depuis la base : get_many() lit tous les manquants en une requête pk__in
+   et remplit les deux niveaux.
+Les instances rendues sont des copies : l'appelant peut y précharger des relations.
+
+Fraîcheur :
+- post_save / post_delete de Movie et Actor (signals.py) retirent l'instance des deux
+  niveaux ; les écritures sans signal sur les champs servis (import en masse,
+  déclinaisons d'images) appellent evict() ;
+- les compteurs (UPDATE ... F(), voir counters.py) n'émettent pas de signal mais
+  avancent updated_at : un appelant qui connaît updated_at (validateur ETag des vues de
+  détail) le passe à get() / get_many(), une instance plus ancienne compte comme absente ;
+- sinon, une instance retirée par un autre processus vit au plus API_OBJECT_CACHE_TTL
+  dans le LRU de celui-ci.
+
+Succès / défauts par modèle et par niveau : api_object_cache_requests_total dans
+/api/_metrics (voir metrics.py).
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .models import Actor, Movie
+
+KEY_PREFIX = 'api:obj'
+
+
+def shared_cache():
+    alias = getattr(settings, 'API_OBJECT_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def ttl():
+    return getattr(settings, 'API_OBJECT_CACHE_TTL', 60)
+
+
+def _fresh(instance, updated_at):
+    return updated_at is None or instance.updated_at == updated_at
+
+
+class ObjectCache:
+    """LRU (pk -> (instance, expiration)) d'un modèle, protégé par un verrou ; + niveau partagé."""
+
+    def __init__(self, model):
+        self.model = model
+        self.name = model._meta.model_name
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def key(self, pk):
+        return f'{KEY_PREFIX}:{self.name}:{pk}'
+
+    def get(self, pk, updated_at=None):
+        """Instance (copie), ou None si la ligne n'existe pas."""
+        return self.get_many([pk], None if updated_at is None else {pk: updated_at}).get(pk)
+
+    def get_many(self, pks, updated_at=None):
+        """
+        {pk: instance} pour les pks qui existent, au plus une requête pour tous les manquants.
+        `updated_at` : {pk: updated_at connu} ; une instance d'une autre version est relue.
+        """
+        pks = set(pks)
+        updated_at = updated_at or {}
+        found = {}
+        now = time.monotonic()
+        with self.lock:
+            for pk in pks:
+                entry = self.entries.get(pk)
+                if entry is None:
+                    continue
+                instance, expires = entry
+                if expires < now or not _fresh(instance, updated_at.get(pk)):
+                    del self.entries[pk]
+                    continue
+                self.entries.move_to_end(pk)
+                found[pk] = copy.copy(instance)
+        metrics.registry.record_object_cache(self.name, 'local', len(found), len(pks) - len(found))
+
+        missing = pks - found.keys()
+        shared = shared_cache()
+        if missing and shared is not None:
+            keys = {self.key(pk): pk for pk in missing}
+            hits = {keys[key]: instance for key, instance in shared.get_many(list(keys)).items()
+                    if _fresh(instance, updated_at.get(keys[key]))}
+            metrics.registry.record_object_cache(self.name, 'shared', len(hits), len(missing) - len(hits))
+            self._put_local(hits)
+            found.update(hits)
+            missing -= hits.keys()
+
+        if missing:
+            loaded = {obj.pk: obj for obj in self.model._default_manager.filter(pk__in=missing).order_by()}
+            self.put_many(loaded)
+            found.update(loaded)
+        return found
+
+    def put_many(self, instances):
+        """{pk: instance} lues en base (sans annotation ni relation préchargée propre à une requête)."""
+        if not instances:
+            return
+        self._put_local(instances)
+        shared = shared_cache()
+        if shared is not None:
+            shared.set_many({self.key(pk): instance for pk, instance in instances.items()}, timeout=ttl())
+
+    def _put_local(self, instances):
+        size = getattr(settings, 'API_OBJECT_CACHE_SIZE', 5000)
+        if size <= 0 or not instances:
+            return
+        expires = time.monotonic() + ttl()
+        with self.lock:
+            for pk, instance in instances.items():
+                self.entries[pk] = (copy.copy(instance), expires)
+                self.entries.move_to_end(pk)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def evict(self, *pks):
+        with self.lock:
+            for pk in pks:
+                self.entries.pop(pk, None)
+        shared = shared_cache()
+        if shared is not None and pks:
+            shared.delete_many([self.key(pk) for pk in pks])
+
+    def clear(self):
+        """Vide le niveau local (le niveau partagé expire seul, ou via evict())."""
+        with self.lock:
+            self.entries.clear()
+
+
+movies = ObjectCache(Movie)
+actors = ObjectCache(Actor)
+
+_by_model = {Movie: movies, Actor: actors}
+
+
+def evict(model, *pks):
+    """Retire des instances après une écriture qui n'émet pas de signal (update(), bulk_update())."""
+    object_cache = _by_model.get(model)
+    if object_cache is not None and pks:
+        object_cache.evict(*pks)
+
+
+def attach_actors(castings):
+    """casting.actor depuis le cache (une requête pk__in pour les manquants) au lieu d'une jointure."""
+    pending = [casting for casting in castings if not type(casting).actor.is_cached(casting)]
+    if not pending:
+        return
+    found = actors.get_many({casting.actor_id for casting in pending})
+    for casting in pending:
+        if casting.actor_id in found:
+            casting.actor = found[casting.actor_id]
@@ -0,0 +1,342 @@
+import base64
+import json
+from collections import OrderedDict, namedtuple
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# name: colonne SQL (attname ou annotation), concrete: champ du modèle
+Column = namedtuple('Column', 'name field descending nullable concrete')
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Pagination par curseur (keyset) multi-colonnes.
+
+    - l'ordre vient du order_by explicite du queryset, sinon de `view.cursor_ordering`,
+      sinon de Model.Meta.ordering ; on ajoute toujours 'pk' pour départager.
+      Une annotation du queryset (ex: search_rank) peut servir de colonne.
+    - les NULL sont toujours placés en fin de liste (quel que soit le SGBD),
+      ce qui rend l'ordre de Movie (-release_date, title_fr) stable.
+    - la page suivante est lue avec un WHERE (a, b, id) > (x, y, z) décomposé et
+      borné sur la première colonne : pas d'OFFSET ni de COUNT(*), parcours d'index
+      par plage, le coût ne dépend pas du numéro de page.
+    - le curseur est opaque (base64 d'un JSON des valeurs de la dernière ligne).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE or 20
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+    # --- configuration ---
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return min(self.page_size, self.max_page_size)
+
+    def get_ordering(self, queryset, view):
+        ordering = [o for o in queryset.query.order_by if isinstance(o, str)]
+        if not ordering:
+            ordering = getattr(view, 'cursor_ordering', None)
+        if not ordering:
+            ordering = list(queryset.model._meta.ordering)
+
+        model = queryset.model
+        pk_name = model._meta.pk.name
+        columns = []
+        for item in ordering:
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            if name == 'pk':
+                name = pk_name
+            if name in queryset.query.annotations:
+                # colonne calculée (ex: search_rank) : comparée telle quelle
+                field = queryset.query.annotations[name].output_field
+                columns.append(Column(name, field, descending, True, False))
+                continue
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(
+                    f"Ordre de pagination invalide sur {model.__name__}: '{item}'"
+                )
+            columns.append(Column(field.attname, field, descending, field.null, True))
+
+        if pk_name not in [column.field.name for column in columns if column.concrete]:
+            # sens du départage aligné sur la dernière colonne
+            descending = columns[-1].descending if columns else False
+            pk = model._meta.pk
+            columns.append(Column(pk.attname, pk, descending, False, True))
+        return columns
+
+    # --- curseur ---
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            raw = payload['p']
+            reverse = bool(payload.get('r', 0))
+            if len(raw) != len(self.columns):
+                raise ValueError
+            position = [
+                None if value is None else column.field.to_python(value)
+                for value, column in zip(raw, self.columns)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def position_from_instance(self, instance):
+        if isinstance(instance, dict):
+            # ligne .values() (sérialisation rapide, voir rows.py)
+            instance = SimpleNamespace(**instance)
+        position = []
+        for column in self.columns:
+            value = getattr(instance, column.name)
+            if value is not None and column.concrete:
+                value = column.field.value_to_string(instance)
+            position.append(value)
+        return position
+
+    # --- requêtes ---
+    def order_queryset(self, queryset, reverse):
+        expressions = []
+        for column in self.columns:
+            # NULL en fin de liste en lecture normale, en tête en lecture inverse ;
+            # pas de modificateur sur une colonne NOT NULL (l'index reste utilisable)
+            nulls = {}
+            if column.nullable:
+                nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+            expr = F(column.name)
+            if column.descending != reverse:
+                expressions.append(expr.desc(**nulls))
+            else:
+                expressions.append(expr.asc(**nulls))
+        return queryset.order_by(*expressions)
+
+    def _strictly_beyond(self, column, value, reverse):
+        """Q des lignes situées strictement après `value` sur une colonne (None = aucune)."""
+        name, descending = column.name, column.descending
+        if not reverse:
+            if value is None:
+                return None  # NULL est en dernier : rien après
+            q = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+            if column.nullable:
+                q |= Q(**{f'{name}__isnull': True})
+            return q
+        if value is None:
+            return Q(**{f'{name}__isnull': False})
+        return Q(**{f'{name}__gt' if descending else f'{name}__lt': value})
+
+    def keyset_filter(self, columns, position, reverse):
+        """(c1, c2, ...) strictement après `position`, décomposé en OR de préfixes égaux."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for column, value in zip(columns, position):
+            beyond = self._strictly_beyond(column, value, reverse)
+            if beyond is not None:
+                condition |= equal & beyond
+            if value is None:
+                equal &= Q(**{f'{column.name}__isnull': True})
+            else:
+                equal &= Q(**{column.name: value})
+        return condition
+
+    def keyset_segments(self, position, reverse):
+        """
+        Découpe la suite de la liste en segments lus l'un après l'autre, chacun borné
+        sur la première colonne (WHERE c1 <= x ...) pour que l'index serve un parcours
+        par plage au lieu d'un OR global ; les NULL de c1 forment leur propre segment.
+        """
+        lead, rest = self.columns[0], self.columns[1:]
+        value, rest_position = position[0], position[1:]
+        name = lead.name
+        rest_beyond = self.keyset_filter(rest, rest_position, reverse)
+
+        if value is None:
+            # préfixe NULL : le reste départage ; en lecture inverse, les non-NULL suivent
+            segments = [Q(**{f'{name}__isnull': True}) & rest_beyond]
+            if reverse:
+                segments.append(Q(**{f'{name}__isnull': False}))
+            return segments
+
+        towards_smaller = lead.descending != reverse
+        bound = Q(**{f'{name}__lte' if towards_smaller else f'{name}__gte': value})
+        strict = Q(**{f'{name}__lt' if towards_smaller else f'{name}__gt': value})
+        segments = [bound & (strict | (Q(**{name: value}) & rest_beyond))]
+        if lead.nullable and not reverse:
+            segments.append(Q(**{f'{name}__isnull': True}))
+        return segments
+
+    def page_queryset(self, queryset, request, view=None):
+        """
+        Queryset ordonné de la page demandée, segments keyset à lire dans l'ordre
+        (voir keyset_segments) et sens de lecture.
+        """
+        self.page_size = self.get_page_size(request)
+        self.columns = self.get_ordering(queryset, view)
+
+        decoded = self.decode_cursor(request)
+        self.has_cursor = decoded is not None
+        position, reverse = decoded if decoded else (None, False)
+
+        queryset = self.order_queryset(queryset, reverse)
+        segments = [Q()] if position is None else self.keyset_segments(position, reverse)
+        return queryset, segments, reverse
+
+    @staticmethod
+    def fetch(queryset, segments, limit):
+        rows = []
+        for segment in segments:
+            if len(rows) >= limit:
+                break
+            rows.extend(queryset.filter(segment)[:limit - len(rows)])
+        return rows
+
+    def page_values(self, queryset, request, view, *fields):
+        """
+        Valeurs de quelques colonnes pour les lignes de la page (sans instancier
+        les objets) : sert à calculer un ETag avant toute sérialisation.
+        """
+        queryset, segments, _ = self.page_queryset(queryset, request, view)
+        return self.fetch(queryset.values_list(*fields), segments, self.page_size)
+
+    @staticmethod
+    async def afetch(queryset, segments, limit):
+        rows = []
+        for segment in segments:
+            if len(rows) >= limit:
+                break
+            rows.extend([obj async for obj in queryset.filter(segment)[:limit - len(rows)]])
+        return rows
+
+    async def apage_values(self, queryset, request, view, *fields):
+        queryset, segments, _ = self.page_queryset(queryset, request, view)
+        return await self.afetch(queryset.values_list(*fields), segments, self.page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        queryset, segments, reverse = self.page_queryset(queryset, request, view)
+        # une ligne de plus pour savoir s'il existe une page suivante
+        return self._set_page(self.fetch(queryset, segments, self.page_size + 1), reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() pour les vues ASGI : lecture par l'ORM async."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        queryset, segments, reverse = self.page_queryset(queryset, request, view)
+        return self._set_page(await self.afetch(queryset, segments, self.page_size + 1), reverse)
+
+    def _set_page(self, rows, reverse):
+        self.reverse = reverse
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.has_cursor
+
+        self.page = rows
+        return rows
+
+    # --- liens ---
+    def link_after(self, queryset, url, instance, view=None):
+        """
+        Lien vers la suite de `queryset` après `instance`, hors pagination d'une requête
+        (ex: aperçu préchargé dans un détail, suivi dans la liste complète).
+        """
+        self.columns = self.get_ordering(queryset, view)
+        cursor = self.encode_cursor(self.position_from_instance(instance), reverse=False)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(self.position_from_instance(self.page[-1]), reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.position_from_instance(self.page[0]), reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CommentFeedPagination(KeysetCursorPagination):
+    """
+    Fil des commentaires d'un film, du plus récent au plus ancien
+    (index comment_movie_created_idx : movie, created_at DESC, id DESC).
+
+    + lien `since` (mode incrémental) : les commentaires arrivés après le plus récent
+    de la page, c.-à-d. une lecture inverse depuis la tête. Le client le rappelle
+    pour ne recevoir que les nouveaux (page vide, ou 304 avec If-None-Match, s'il
+    n'y en a pas) ; au-delà d'une page de nouveautés, le `since` suivant prend la suite.
+    Absent sur les pages plus anciennes (curseur `next`) : elles ne sont pas la tête du fil.
+    """
+
+    def get_since_link(self):
+        if self.has_cursor and not self.reverse:
+            return None
+        if not self.page:
+            # rien de plus récent pour l'instant : on repose la même question
+            return self.base_url if self.has_cursor else remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.position_from_instance(self.page[0]), reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_data(self, data):
+        paginated = super().get_paginated_data(data)
+        paginated['since'] = self.get_since_link()
+        return paginated
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['properties']['since'] = {'type': 'string', 'nullable': True, 'format': 'uri'}
+        return response
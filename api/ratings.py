@@ -0,0 +1,176 @@
+"""
+Ingestion des notes en rafale (POST /api/movies/<id>/rate/ pendant une avant-première).
+
+Mode immédiat (API_RATINGS_COALESCE_WINDOW = 0, défaut) : update_or_create puis les
+signaux appliquent deltas et tendance sur la ligne Movie, à chaque vote.
+
+Mode regroupé (fenêtre W > 0 secondes) :
+- la ligne Rating est écrite tout de suite, en un upsert (INSERT ... ON CONFLICT
+  DO UPDATE RETURNING) qui vérifie aussi l'existence du film ; pas de signal ;
+- une fois la transaction validée, le film est marqué dans un tampon du processus
+  avec le terme de tendance du vote (première note de l'utilisateur seulement),
+  cumulé (leaderboards.combine_terms) ;
+- un thread de fond vide le tampon toutes les W secondes : un UPDATE par film qui
+  recalcule rating_sum / rating_count / avg_rating / top_score depuis Rating
+  (counters.recount_ratings, idempotent) et ajoute la tendance cumulée, puis
+  invalide le cache. 1 000 votes sur un film pendant W = 1 UPDATE de la ligne Movie
+  au lieu de 2 000.
+
+Garantie : une note validée est comptée dans la moyenne au plus W secondes (+ durée du
+vidage) plus tard. Le tampon est propre au processus : si le processus meurt avant
+de vider, la tâche 'ratings.recount' mise en file au premier vote de chaque fenêtre
+(délai API_RATINGS_FALLBACK_DELAY, exécutée par run_workers) recalcule quand même les
+compteurs ; seuls les termes de tendance de la dernière fenêtre sont alors perdus
+(reconcile_counters --trending les reconstruit). Ce filet suppose un worker : en mode
+eager (API_TASKS_EAGER=1, défaut) il n'est pas mis en file, il s'exécuterait dans la
+requête du premier vote (agrégat complet des notes) ; reconcile_counters rattrape alors
+un processus mort avant son vidage.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache, counters, leaderboards, live, tasks
+from .models import Movie, Rating
+
+logger = logging.getLogger(__name__)
+
+_UPSERT = """
+INSERT INTO {rating} (user_id, movie_id, score, review, created_at, updated_at)
+SELECT %s, m.id, %s, '', %s, %s FROM {movie} m WHERE m.id = %s
+ON CONFLICT (user_id, movie_id) DO UPDATE SET score = excluded.score, updated_at = excluded.updated_at
+RETURNING id, created_at, created_at = updated_at
+"""
+
+
+def window():
+    return getattr(settings, 'API_RATINGS_COALESCE_WINDOW', 0)
+
+
+def coalescing():
+    return window() > 0
+
+
+# --- tampon du processus ---
+class Buffer:
+    """Films notés depuis le dernier vidage -> terme de tendance cumulé de leurs votes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def add(self, movie_id, term):
+        with self.lock:
+            first = movie_id not in self.pending
+            self.pending[movie_id] = leaderboards.combine_terms(self.pending.get(movie_id), term)
+        return first
+
+    def take(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def restore(self, pending):
+        """Vidage échoué : les films repartent dans le tampon (cumulés avec les votes arrivés entre-temps)."""
+        for movie_id, term in pending.items():
+            self.add(movie_id, term)
+
+
+buffer = Buffer()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def flush():
+    """Applique le tampon : recomptage des notes + tendance cumulée, film par film. -> nombre de films."""
+    pending = buffer.take()
+    if not pending:
+        return 0
+    try:
+        with transaction.atomic():
+            counters.recount_ratings(list(pending))
+            for movie_id, term in pending.items():
+                if term is not None:
+                    leaderboards.bump_trending_term(movie_id, term)
+    except Exception:
+        buffer.restore(pending)
+        raise
+    cache.invalidate(*[f'movie:{pk}' for pk in pending])  # listes : voir signals.vote_changed_cache
+    live.publish_counters(list(pending), 'avg_rating', 'rating_count')
+    return len(pending)
+
+
+def _run_flusher():
+    while True:
+        time.sleep(window() or 1.0)
+        started = time.monotonic()
+        try:
+            close_old_connections()
+            count = flush()
+        except Exception:
+            logger.exception("vidage des notes regroupées en échec (nouvel essai à la prochaine fenêtre)")
+            continue
+        elapsed = time.monotonic() - started
+        if count and elapsed > window():
+            logger.warning("vidage de %d film(s) en %.2f s, plus long que la fenêtre (%.2f s)",
+                           count, elapsed, window())
+
+
+def ensure_flusher():
+    """Démarre le thread de vidage du processus (au premier vote : après le fork des workers)."""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run_flusher, name='ratings-flusher', daemon=True)
+            _flusher.start()
+
+
+def _mark(movie_id, term):
+    if buffer.add(movie_id, term) and not tasks.eager():
+        # filet si le processus meurt avant de vider : recomptage durable, dédoublonné par film
+        delay = getattr(settings, 'API_RATINGS_FALLBACK_DELAY', 30)
+        tasks.enqueue('ratings.recount', idempotency_key=f'ratings-recount:{movie_id}',
+                      delay=timedelta(seconds=delay), movie_ids=[movie_id])
+    if getattr(settings, 'API_RATINGS_FLUSH_THREAD', True):
+        ensure_flusher()
+
+
+# --- écriture ---
+def _aware(value):
+    # SQLite rend le texte stocké (UTC naïf) ; PostgreSQL un datetime déjà converti
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def record(user_id, movie_id, score):
+    """
+    Mode regroupé : écrit la note et marque le film pour le prochain vidage.
+    -> (Rating, avg_rating actuel, en retard d'au plus une fenêtre), ou None si le film n'existe pas.
+    """
+    qn = connection.ops.quote_name
+    at = timezone.now()
+    now = connection.ops.adapt_datetimefield_value(at)
+    sql = _UPSERT.format(rating=qn(Rating._meta.db_table), movie=qn(Movie._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, score, now, now, movie_id])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    rating = Rating(pk=row[0], user_id=user_id, movie_id=movie_id, score=score,
+                    created_at=_aware(row[1]), updated_at=at)
+    # première note seulement (ligne insérée) : un changement de note n'ajoute pas à la tendance
+    term = leaderboards.trending_term(leaderboards.rating_weight(), at) if row[2] else None
+    transaction.on_commit(lambda: _mark(movie_id, term))
+    avg = Movie.objects.filter(pk=movie_id).values_list('avg_rating', flat=True).first()
+    return rating, avg
@@ -0,0 +1,49 @@
+"""
+Encodage JSON des réponses : orjson quand il est installé (et API_FAST_JSON actif),
+sinon json + JSONEncoder de DRF. Même sortie dans les deux cas : UTF-8 sans
+échappement, séparateurs compacts, U+2028 / U+2029 échappés comme le fait DRF.
+
+orjson encode nativement dict, list, str, int, float, bool, None, date et datetime ;
+le reste (Decimal, UUID, chaînes paresseuses, ...) passe par JSONEncoder.default.
+"""
+import json
+
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance facultative
+    orjson = None
+
+_default = JSONEncoder().default
+
+
+def fast_json_enabled():
+    return orjson is not None and getattr(settings, 'API_FAST_JSON', True)
+
+
+def _dumps_orjson(data):
+    # OPT_PASSTHROUGH_DATETIME : dates / heures au format de DRF (millisecondes, 'Z' pour UTC) ;
+    # OPT_NON_STR_KEYS : clés entières converties en chaînes, comme json
+    raw = orjson.dumps(data, default=_default,
+                       option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+    return raw.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def dumps(data):
+    """-> bytes, identique (au formatage des flottants près) à JSONRenderer de DRF."""
+    if fast_json_enabled():
+        return _dumps_orjson(data)
+    text = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+    return text.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer de DRF, encodé par orjson hors indentation demandée (API navigable, ; indent=)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not fast_json_enabled() or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return _dumps_orjson(data)
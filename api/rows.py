@@ -0,0 +1,191 @@
+"""
+Sérialisation rapide des listes (chemins chauds) : une page lue par .values(), chaque
+ligne convertie directement en dict, sans instance de modèle ni machinerie de champs DRF.
+
+- chaque classe reproduit la sortie d'un serializer de serializers.py (mêmes clés, mêmes
+  formats : URL absolues des images, dates ISO, datetimes au format DRF) ; les tests
+  comparent les deux sorties.
+- prepare() ajoute aux colonnes lues celles de l'ordre de pagination (curseur, y compris
+  une annotation comme search_rank) et les annotations facultatives présentes (user_state).
+- la lecture reste celle de KeysetCursorPagination (qui accepte des lignes dict) ;
+  le rendu passe par renderers.py (orjson).
+
+Utilisé par RowListMixin (views.py) et les listes ASGI (async_views.py) ; API_ROW_SERIALIZERS
+à False pour revenir aux serializers DRF.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from . import images, leaderboards
+from .models import Actor, Movie
+
+
+def rows_enabled():
+    return getattr(settings, 'API_ROW_SERIALIZERS', True)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def _current_timezone():
+    return timezone.get_current_timezone() if settings.USE_TZ else None
+
+
+def _datetime(value, tz):
+    """= DateTimeField de DRF (ISO 8601, fuseau courant, 'Z' pour UTC), fuseau lu une fois par page."""
+    if value is None:
+        return None
+    if tz is not None and timezone.is_aware(value):
+        value = value.astimezone(tz)
+    text = value.isoformat()
+    return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+
+class ImageColumn:
+    """Colonne ImageField lue par .values() : URL comme ImageField de DRF, déclinaison comme images.pick."""
+
+    def __init__(self, model, name):
+        self.field = model._meta.get_field(name)
+        self.width = images.list_width(model, name)
+
+    def file(self, name):
+        return self.field.attr_class(None, self.field, name)
+
+    def url(self, name, request):
+        if not name:
+            return None
+        url = self.field.storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def thumb(self, name, renditions, request):
+        return images.pick(self.file(name), renditions, self.width, request) if name else None
+
+
+class RowSerializer:
+    """
+    Remplace `Serializer(page, many=True).data` pour une liste : `columns` lues par
+    .values(), `to_representation(row)` pour une ligne dict.
+    """
+    columns = ()
+    optional = ()  # annotations ajoutées si le queryset les porte
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.request = self.context.get('request')
+
+    def prepare(self, queryset, paginator=None, view=None):
+        names = list(self.columns)
+        names += [name for name in self.optional if name in queryset.query.annotations]
+        if paginator is not None and hasattr(paginator, 'get_ordering'):
+            names += [column.name for column in paginator.get_ordering(queryset, view)]
+        return queryset.values(*dict.fromkeys(names))
+
+    def to_representation(self, row):
+        raise NotImplementedError
+
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class MovieListRows(RowSerializer):
+    """= MovieListSerializer"""
+    columns = ('id', 'title_fr', 'title_original', 'poster', 'poster_renditions', 'release_date',
+               'likes_count', 'avg_rating')
+    optional = ('user_liked_flag', 'user_rating_score')
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        self.poster = ImageColumn(Movie, 'poster')
+
+    def to_representation(self, row):
+        request = self.request
+        data = {
+            'id': row['id'],
+            'title_fr': row['title_fr'],
+            'title_original': row['title_original'],
+            'poster': self.poster.url(row['poster'], request),
+            'poster_thumb': self.poster.thumb(row['poster'], row['poster_renditions'], request),
+            'release_date': _iso(row['release_date']),
+            'likes_count': row['likes_count'],
+            'avg_rating': _float(row['avg_rating']),
+        }
+        if 'user_liked_flag' in row:
+            data['user_liked'] = row['user_liked_flag']
+            data['user_rating'] = row['user_rating_score']
+        return data
+
+
+class TrendingMovieRows(MovieListRows):
+    """= TrendingMovieSerializer"""
+    columns = MovieListRows.columns + ('trending_score',)
+    at = None
+
+    def many(self, rows):
+        # même instant pour toute la page
+        self.at = timezone.now()
+        return super().many(rows)
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        data['trending'] = round(leaderboards.trending_value(row['trending_score'], self.at), 3)
+        return data
+
+
+class TopRatedMovieRows(MovieListRows):
+    """= TopRatedMovieSerializer"""
+    columns = MovieListRows.columns + ('rating_count', 'top_score')
+
+    def to_representation(self, row):
+        data = super().to_representation(row)
+        data['rating_count'] = row['rating_count']
+        data['top_score'] = _float(row['top_score'])
+        return data
+
+
+class ActorRows(RowSerializer):
+    """= ActorSerializer"""
+    columns = ('id', 'first_name', 'last_name', 'full_name', 'biography', 'birth_date', 'photo',
+               'photo_renditions')
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        self.photo = ImageColumn(Actor, 'photo')
+
+    def to_representation(self, row):
+        request = self.request
+        return {
+            'id': row['id'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'full_name': row['full_name'],
+            'biography': row['biography'],
+            'birth_date': _iso(row['birth_date']),
+            'photo': self.photo.url(row['photo'], request),
+            'photo_thumb': self.photo.thumb(row['photo'], row['photo_renditions'], request),
+        }
+
+
+class CommentRows(RowSerializer):
+    """= CommentSerializer (auteur et note joints dans la même requête)"""
+    columns = ('id', 'movie_id', 'author_id', 'author__username', 'text', 'created_at', 'rating__score')
+    tz = None
+
+    def many(self, rows):
+        self.tz = _current_timezone()
+        return super().many(rows)
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'movie': row['movie_id'],
+            'author': row['author_id'],
+            'author_username': row['author__username'],
+            'text': row['text'],
+            'created_at': _datetime(row['created_at'], self.tz),
+            'rating_score': row['rating__score'],
+        }
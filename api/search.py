@@ -0,0 +1,248 @@
+"""
+Recherche plein texte sur les films et les acteurs.
+
+Chaque Movie / Actor porte un `search_document` : texte normalisé (minuscules,
+sans accents) des champs cherchables, tenu à jour par signaux (voir signals.py).
+- PostgreSQL : index GIN to_tsvector('french', search_document) + index GIN
+  trigrammes (pg_trgm) ; rang = ts_rank + word_similarity.
+- SQLite (dev / tests) : index inversé en mémoire, construit à la première
+  recherche puis maintenu par les signaux du process.
+Les deux backends renvoient un queryset annoté `search_rank`, trié par pertinence.
+"""
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.utils import timezone
+
+from .models import Casting, Movie
+
+# mots vides français (et quelques anglais fréquents dans les titres originaux)
+STOPWORDS = frozenset("""
+a au aux avec ce ces dans de des du elle en et il ils je la le les leur lui ma mais me
+meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta
+te tes toi ton tu un une vos votre vous c d j l m n s t y the of and
+""".split())
+
+TRIGRAM_THRESHOLD = 0.3
+MAX_RESULTS = getattr(settings, 'API_SEARCH_MAX_RESULTS', 500)
+
+_non_word = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_text(*parts):
+    """Minuscules, accents retirés, ponctuation -> espaces ('Éléphant' -> 'elephant')."""
+    text = ' '.join(p for p in parts if p)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return _non_word.sub(' ', text).strip()
+
+
+def tokenize(text):
+    return [t for t in normalize_text(text).split() if t not in STOPWORDS]
+
+
+def build_actor_document(actor):
+    return normalize_text(actor.full_name, actor.first_name, actor.last_name)
+
+
+def build_movie_document(movie, actor_names=()):
+    # titres en tête, puis casting, réalisateur et descriptif
+    return normalize_text(movie.title_fr, movie.title_original, ' '.join(actor_names),
+                          movie.director, movie.description)
+
+
+def refresh_movie_documents(movie_ids):
+    """
+    Recalcule search_document des films donnés (2 requêtes + un bulk_update).
+    updated_at suit : le casting fait partie de la représentation du film (ETag).
+    """
+    movie_ids = list(movie_ids)
+    if not movie_ids:
+        return
+    names = defaultdict(list)
+    castings = (Casting.objects.filter(movie_id__in=movie_ids)
+                .order_by('movie_id', 'order').values_list('movie_id', 'actor__full_name'))
+    for movie_id, full_name in castings:
+        names[movie_id].append(full_name)
+    movies = list(Movie.objects.filter(pk__in=movie_ids).only(
+        'pk', 'title_fr', 'title_original', 'director', 'description'))
+    now = timezone.now()
+    for movie in movies:
+        movie.search_document = build_movie_document(movie, names[movie.pk])
+        movie.updated_at = now
+    Movie.objects.bulk_update(movies, ['search_document', 'updated_at'])
+    for movie in movies:
+        index_document(Movie, movie.pk, movie.search_document)
+
+
+# ---------------------------------------------------------------------------
+# Backend PostgreSQL
+# ---------------------------------------------------------------------------
+class PostgresSearchBackend:
+    config = 'french'
+
+    def search(self, queryset, q):
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+        )
+
+        text = normalize_text(q)
+        vector = SearchVector('search_document', config=self.config)
+        query = SearchQuery(text, config=self.config, search_type='websearch')
+        return (
+            queryset.annotate(search_vector=vector)
+            .filter(Q(search_vector=query) | Q(search_document__trigram_word_similar=text))
+            .annotate(search_rank=SearchRank(vector, query) + TrigramWordSimilarity(text, 'search_document'))
+            .order_by('-search_rank', 'pk')
+        )
+
+
+# ---------------------------------------------------------------------------
+# Backend en mémoire (SQLite)
+# ---------------------------------------------------------------------------
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InMemoryIndex:
+    """Index inversé token -> documents, avec un index trigrammes sur le vocabulaire."""
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        self.built = False
+        self.docs = {}                       # id -> Counter(tokens)
+        self.postings = defaultdict(set)     # token -> ids
+        self.vocab_trigrams = defaultdict(set)  # trigramme -> tokens
+
+    def build(self):
+        with self.lock:
+            if self.built:
+                return
+            for pk, document in self.model.objects.values_list('pk', 'search_document').iterator():
+                self._add(pk, document)
+            self.built = True
+
+    def _add(self, pk, document):
+        tokens = Counter(tokenize(document))
+        self.docs[pk] = tokens
+        for token in tokens:
+            if not self.postings[token]:
+                for gram in trigrams(token):
+                    self.vocab_trigrams[gram].add(token)
+            self.postings[token].add(pk)
+
+    def _remove(self, pk):
+        for token in self.docs.pop(pk, ()):
+            self.postings[token].discard(pk)
+
+    def update(self, pk, document):
+        with self.lock:
+            if not self.built:
+                return  # sera lu en base à la construction
+            self._remove(pk)
+            if document is not None:
+                self._add(pk, document)
+
+    def reset(self):
+        with self.lock:
+            self.built = False
+            self.docs.clear()
+            self.postings.clear()
+            self.vocab_trigrams.clear()
+
+    def _expand(self, token):
+        """Tokens du vocabulaire proches de `token` -> similarité (1.0 = exact / préfixe)."""
+        matches = {}
+        if self.postings.get(token):
+            matches[token] = 1.0
+        grams = trigrams(token)
+        candidates = Counter()
+        for gram in grams:
+            for other in self.vocab_trigrams.get(gram, ()):
+                candidates[other] += 1
+        for other, shared in candidates.items():
+            if other in matches or not self.postings.get(other):
+                continue
+            if other.startswith(token) and len(token) >= 3:
+                matches[other] = 0.9
+                continue
+            similarity = shared / len(grams | trigrams(other))
+            if similarity >= TRIGRAM_THRESHOLD:
+                matches[other] = similarity
+        return matches
+
+    def search(self, q, limit):
+        self.build()
+        scores = defaultdict(float)
+        with self.lock:
+            total = max(len(self.docs), 1)
+            for token in tokenize(q):
+                for other, similarity in self._expand(token).items():
+                    ids = self.postings[other]
+                    idf = math.log(1 + total / len(ids))
+                    for pk in ids:
+                        tf = self.docs[pk][other]
+                        scores[pk] += similarity * idf * (1 + math.log(tf))
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+class InMemorySearchBackend:
+    def __init__(self):
+        self.indexes = {}
+
+    def index_for(self, model):
+        if model not in self.indexes:
+            self.indexes[model] = InMemoryIndex(model)
+        return self.indexes[model]
+
+    def search(self, queryset, q):
+        ranked = self.index_for(queryset.model).search(q, MAX_RESULTS)
+        if not ranked:
+            return queryset.none()
+        rank = Case(
+            *[When(pk=pk, then=Value(round(score, 6))) for pk, score in ranked],
+            default=Value(0.0), output_field=FloatField(),
+        )
+        return (
+            queryset.filter(pk__in=[pk for pk, _ in ranked])
+            .annotate(search_rank=rank)
+            .order_by('-search_rank', 'pk')
+        )
+
+
+_memory_backend = InMemorySearchBackend()
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return _memory_backend
+
+
+def index_document(model, pk, document):
+    """Répercute une écriture sur l'index en mémoire (sans effet sous PostgreSQL)."""
+    if model in _memory_backend.indexes:
+        _memory_backend.indexes[model].update(pk, document)
+
+
+def reset_index():
+    """À appeler après des écritures en masse qui contournent les signaux."""
+    for index in _memory_backend.indexes.values():
+        index.reset()
+
+
+def search_movies(queryset, q):
+    return get_backend().search(queryset, q)
+
+
+def search_actors(queryset, q):
+    return get_backend().search(queryset, q)
@@ -1,6 +1,10 @@
 from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+from django.urls import reverse
 from rest_framework import serializers
 from .models import *
+from .pagination import CommentFeedPagination
+from . import cache, filmography, images, leaderboards, objcache, search
 
 
 # -----------------------
@@ -27,21 +31,57 @@ class CurrentUserSerializer(serializers.ModelSerializer):
 # Actor
 # -----------------------
 class ActorSerializer(serializers.ModelSerializer):
-    full_name = serializers.SerializerMethodField(read_only=True)
+    # nom complet stocké par Actor.save / l'import (celui de la recherche et du tri)
+    full_name = serializers.CharField(read_only=True)
+    photo_thumb = serializers.SerializerMethodField()
 
     class Meta:
         model = Actor
-        fields = ['id', 'first_name', 'last_name', 'full_name', 'biography', 'birth_date', 'photo']
+        fields = ['id', 'first_name', 'last_name', 'full_name', 'biography', 'birth_date', 'photo', 'photo_thumb']
 
-    def get_full_name(self, obj):
-        if obj.last_name:
-            return f"{obj.first_name} {obj.last_name}"
-        return obj.first_name
+    def get_photo_thumb(self, obj):
+        # déclinaison légère (voir api/images.py) ; None tant qu'elle n'existe pas
+        return images.pick(obj.photo, obj.photo_renditions, images.list_width(Actor, 'photo'),
+                           self.context.get('request'))
+
+
+class CreditSerializer(serializers.ModelSerializer):
+    """Ligne de filmographie (projection Credit : aucune jointure à la lecture)"""
+    class Meta:
+        model = Credit
+        fields = ['movie_id', 'title_fr', 'release_date', 'role_name', 'order']
+
+
+class CoStarSerializer(serializers.ModelSerializer):
+    actor_id = serializers.IntegerField(source='costar_id', read_only=True)
+    full_name = serializers.CharField(source='name', read_only=True)
+
+    class Meta:
+        model = CoStar
+        fields = ['actor_id', 'full_name', 'movies_count']
+
+
+class ActorDetailSerializer(ActorSerializer):
+    """Fiche acteur : + 10 derniers rôles et 10 principaux partenaires (Actor.objects.with_detail())"""
+    filmography = CreditSerializer(source='recent_credits', many=True, read_only=True)
+    costars = CoStarSerializer(source='top_costars', many=True, read_only=True)
+
+    class Meta(ActorSerializer.Meta):
+        fields = ActorSerializer.Meta.fields + ['filmography', 'costars']
 
 
 # -----------------------
 # Casting (relation Movie <-> Actor)
 # -----------------------
+class CastingListSerializer(serializers.ListSerializer):
+    """Acteurs imbriqués lus dans le cache d'objets (objcache.py) s'ils n'ont pas été joints."""
+
+    def to_representation(self, data):
+        castings = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        objcache.attach_actors(castings)
+        return super().to_representation(castings)
+
+
 class CastingSerializer(serializers.ModelSerializer):
     actor = ActorSerializer(read_only=True)
     actor_id = serializers.PrimaryKeyRelatedField(
@@ -51,6 +91,7 @@ class CastingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Casting
         fields = ['id', 'actor', 'actor_id', 'role_name', 'order']
+        list_serializer_class = CastingListSerializer
 
 
 # -----------------------
@@ -139,21 +180,62 @@ class MovieListSerializer(serializers.ModelSerializer):
     avg_rating = serializers.FloatField(read_only=True)
     likes_count = serializers.IntegerField(read_only=True)
     poster = serializers.ImageField(read_only=True)
+    poster_thumb = serializers.SerializerMethodField()
     release_date = serializers.DateField(read_only=True)
 
     class Meta:
         model = Movie
-        fields = ['id', 'title_fr', 'title_original', 'poster', 'release_date', 'likes_count', 'avg_rating']
+        fields = ['id', 'title_fr', 'title_original', 'poster', 'poster_thumb', 'release_date',
+                  'likes_count', 'avg_rating']
+
+    def get_poster_thumb(self, obj):
+        # affiche à la taille des listes (WebP + JPEG) au lieu de l'original
+        return images.pick(obj.poster, obj.poster_renditions, images.list_width(Movie, 'poster'),
+                           self.context.get('request'))
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # ?user_state=1 : annotations de Movie.objects.with_user_state(), pas de requête par film
+        if hasattr(instance, 'user_liked_flag'):
+            data['user_liked'] = instance.user_liked_flag
+            data['user_rating'] = instance.user_rating_score
+        return data
+
+
+class TrendingMovieSerializer(MovieListSerializer):
+    """Liste + poids d'engagement décru à l'instant de la requête"""
+    trending = serializers.SerializerMethodField()
+
+    class Meta(MovieListSerializer.Meta):
+        fields = MovieListSerializer.Meta.fields + ['trending']
+
+    def get_trending(self, obj):
+        return round(leaderboards.trending_value(obj.trending_score), 3)
+
+
+class TopRatedMovieSerializer(MovieListSerializer):
+    """Liste + moyenne bayésienne qui sert au classement"""
+    rating_count = serializers.IntegerField(read_only=True)
+    top_score = serializers.FloatField(read_only=True)
+
+    class Meta(MovieListSerializer.Meta):
+        fields = MovieListSerializer.Meta.fields + ['rating_count', 'top_score']
 
 
 class MovieDetailSerializer(serializers.ModelSerializer):
-    """Serializer détaillé pour affichage d'un film"""
+    """
+    Serializer détaillé pour affichage d'un film (Movie.objects.with_detail()).
+    Commentaires : le nombre total et la première page seulement ; la suite se lit
+    dans le fil paginé /movies/<id>/comments/ (lien comments_next).
+    """
     actors = CastingSerializer(source='movie_casts', many=True, read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = CommentSerializer(source='recent_comments', many=True, read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
+    comments_next = serializers.SerializerMethodField()
     likes_count = serializers.IntegerField(read_only=True)
     avg_rating = serializers.FloatField(read_only=True)
     poster = serializers.ImageField(read_only=True)
-    cover_image = serializers.ImageField(read_only=True)
+    cover_image = serializers.ImageField(source='illustration', read_only=True)
     duration = serializers.SerializerMethodField()
     user_liked = serializers.SerializerMethodField()
     user_rating = serializers.SerializerMethodField()
@@ -166,7 +248,7 @@ class MovieDetailSerializer(serializers.ModelSerializer):
             'director', 'description', 'release_date',
             'poster', 'cover_image',
             'likes_count', 'avg_rating',
-            'actors', 'comments',
+            'actors', 'comments', 'comments_count', 'comments_next',
             'user_liked', 'user_rating',
             'created_at', 'updated_at'
         ]
@@ -175,32 +257,110 @@ class MovieDetailSerializer(serializers.ModelSerializer):
         # renvoie chaîne lisible "1h 32m"
         return obj.duration_display()
 
+    def get_comments_next(self, obj):
+        comments = obj.recent_comments
+        if not comments or obj.comments_count <= len(comments):
+            return None
+        request = self.context.get('request')
+        url = reverse('movie-comments', args=[obj.pk])
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return CommentFeedPagination().link_after(Comment.objects.all(), url, comments[-1])
+
     def get_user_liked(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
+        # valeur annotée par Movie.objects.with_user_state() si disponible
+        if hasattr(obj, 'user_liked_flag'):
+            return obj.user_liked_flag
         return obj.user_liked(request.user)
 
     def get_user_rating(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return None
+        if hasattr(obj, 'user_rating_score'):
+            return obj.user_rating_score
         return obj.user_rating(request.user)
 
 
 # -----------------------
 # Movie - création / modification (write)
 # -----------------------
+class CastItemSerializer(serializers.Serializer):
+    """
+    Ligne de casting en écriture. actor_id est un simple entier : l'existence des acteurs
+    est vérifiée en une requête pour toute la liste (voir validate_cast), pas une par ligne.
+    """
+    actor_id = serializers.IntegerField(min_value=1)
+    role_name = serializers.CharField(max_length=200, allow_blank=True, required=False, default='')
+    order = serializers.IntegerField(min_value=0, required=False, default=0)
+
+
+def sync_cast(movie, cast_data):
+    """
+    Aligne le casting du film sur `cast_data` par différence sur (actor, role_name) :
+    au plus un bulk_create, un bulk_update (ordre) et un DELETE, dans une transaction.
+    Les écritures en masse ne passent pas par les signaux de Casting : document de
+    recherche, filmographies (filmography.py) et cache sont mis à jour une seule fois à la fin.
+    """
+    wanted = {}
+    for item in cast_data:
+        # une même (actor, role_name) en double : la dernière ligne l'emporte
+        wanted[(item['actor_id'], item.get('role_name', ''))] = item.get('order', 0)
+
+    with transaction.atomic():
+        existing = {
+            (actor_id, role_name): (pk, order)
+            for pk, actor_id, role_name, order in
+            Casting.objects.filter(movie=movie).order_by().values_list('pk', 'actor_id', 'role_name', 'order')
+        }
+        to_create = [
+            Casting(movie=movie, actor_id=actor_id, role_name=role_name, order=order)
+            for (actor_id, role_name), order in wanted.items() if (actor_id, role_name) not in existing
+        ]
+        reordered = {key: order for key, order in wanted.items()
+                     if key in existing and existing[key][1] != order}
+        to_update = [Casting(pk=existing[key][0], order=order) for key, order in reordered.items()]
+        to_delete = [pk for key, (pk, _) in existing.items() if key not in wanted]
+
+        if to_create:
+            Casting.objects.bulk_create(to_create)
+        if to_update:
+            Casting.objects.bulk_update(to_update, ['order'])
+        if to_delete:
+            # DELETE explicite plutôt que QuerySet.delete() : celui-ci chargerait les lignes
+            # et enverrait post_delete par ligne (document, filmographie, cache), refaits
+            # ci-dessous une seule fois. Casting n'a pas de dépendants (aucune cascade).
+            qn = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {qn(Casting._meta.db_table)} WHERE {qn(Casting._meta.pk.column)} "
+                    f"IN ({', '.join(['%s'] * len(to_delete))})",
+                    to_delete,
+                )
+
+        # acteurs dont la ligne a été créée, supprimée ou réordonnée
+        changed = {actor_id for actor_id, _ in (wanted.keys() ^ existing.keys()) | reordered.keys()}
+        if changed:
+            search.refresh_movie_documents([movie.pk])
+            # filmographies et partenaires : seuls les acteurs entrés / sortis changent de graphe
+            filmography.refresh([movie.pk], {actor_id for actor_id, _ in wanted.keys() ^ existing.keys()})
+    if changed:
+        cache.invalidate(f'movie:{movie.pk}', 'movies', *[f'actor:{pk}' for pk in changed])
+
+
 class MovieCreateUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer pour créer / mettre à jour un film.
-    - actors can be set by providing a list of dicts: [{"actor_id": pk, "character_name":"X", "order":0}, ...]
+    - le casting se fournit en liste : [{"actor_id": pk, "role_name": "X", "order": 0}, ...]
+      et remplace le casting existant (synchronisé par différence, voir sync_cast)
     - poster / cover_image are writable ImageFields
     """
-    # accepts nested cast for creation/update (write-only)
-    cast = CastingSerializer(source='movie_casts', many=True, required=False, write_only=True)
+    cast = CastItemSerializer(many=True, required=False, write_only=True)
     poster = serializers.ImageField(required=False, allow_null=True)
-    cover_image = serializers.ImageField(required=False, allow_null=True)
+    cover_image = serializers.ImageField(source='illustration', required=False, allow_null=True)
 
     class Meta:
         model = Movie
@@ -211,30 +371,30 @@ class MovieCreateUpdateSerializer(serializers.ModelSerializer):
             'cast',
         ]
 
+    def validate_cast(self, value):
+        ids = {item['actor_id'] for item in value}
+        found = set(Actor.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        missing = sorted(ids - found)
+        if missing:
+            raise serializers.ValidationError(f"Acteur(s) inconnu(s) : {', '.join(map(str, missing))}.")
+        return value
+
     def create(self, validated_data):
-        cast_data = validated_data.pop('movie_casts', [])
-        movie = Movie.objects.create(**validated_data)
-        # create Casting entries if provided
-        for item in cast_data:
-            actor = item.get('actor')
-            character_name = item.get('character_name', '')
-            order = item.get('order', 0)
-            Casting.objects.create(movie=movie, actor=actor, character_name=character_name, order=order)
+        cast_data = validated_data.pop('cast', [])
+        with transaction.atomic():
+            movie = Movie.objects.create(**validated_data)
+            if cast_data:
+                sync_cast(movie, cast_data)
         return movie
 
     def update(self, instance, validated_data):
-        cast_data = validated_data.pop('movie_casts', None)
-        # update simple fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if cast_data is not None:
-            # remplacer le casting actuel par le nouveau
-            instance.movie_casts.all().delete()
-            for item in cast_data:
-                actor = item.get('actor')
-                character_name = item.get('character_name', '')
-                order = item.get('order', 0)
-                Casting.objects.create(movie=instance, actor=actor, character_name=character_name, order=order)
-        return instance
\ No newline at end of file
+        cast_data = validated_data.pop('cast', None)
+        with transaction.atomic():
+            # update simple fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+
+            if cast_data is not None:
+                sync_cast(instance, cast_data)
+        return instance
@@ -0,0 +1,261 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import auth, cache, counters, filmography, images, leaderboards, live, objcache, search, tasks
+from .models import Actor, Casting, Comment, Like, Movie, Rating
+
+
+# --- instantané des valeurs chargées, pour calculer les deltas au save ---
+@receiver(post_init, sender=Like)
+def like_snapshot(sender, instance, **kwargs):
+    instance._counter_state = (instance.__dict__.get('movie_id'), instance.__dict__.get('liked'))
+
+
+@receiver(post_init, sender=Rating)
+def rating_snapshot(sender, instance, **kwargs):
+    instance._counter_state = (instance.__dict__.get('movie_id'), instance.__dict__.get('score'))
+
+
+# --- Like -> Movie.likes_count ---
+@receiver(post_save, sender=Like)
+def like_saved(sender, instance, created, **kwargs):
+    old_movie_id, old_liked = (None, False) if created else instance._counter_state
+    moved = old_movie_id is not None and old_movie_id != instance.movie_id
+    if moved:
+        counters.apply_like_delta(old_movie_id, -int(bool(old_liked)))
+        old_liked = False
+    counters.apply_like_delta(instance.movie_id, int(instance.liked) - int(bool(old_liked)))
+    if created or moved:
+        # une ligne Like = un engagement daté de created_at ; unlike / re-like n'y changent rien
+        leaderboards.bump_trending(instance.movie_id, leaderboards.like_weight(), instance.created_at)
+    like_snapshot(sender, instance)
+
+
+@receiver(post_delete, sender=Like)
+def like_deleted(sender, instance, **kwargs):
+    if instance.liked:
+        counters.apply_like_delta(instance.movie_id, -1)
+
+
+# --- Rating -> Movie.rating_sum / rating_count / avg_rating ---
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, **kwargs):
+    old_movie_id, old_score = (None, None) if created else instance._counter_state
+    if old_movie_id is not None and old_movie_id != instance.movie_id:
+        counters.apply_rating_delta(old_movie_id, -old_score, -1)
+        old_movie_id = None
+    if old_movie_id is None:
+        counters.apply_rating_delta(instance.movie_id, instance.score, 1)
+        # noter est un engagement daté de created_at ; changer sa note n'en est pas un nouveau
+        leaderboards.bump_trending(instance.movie_id, leaderboards.rating_weight(), instance.created_at)
+    else:
+        counters.apply_rating_delta(instance.movie_id, instance.score - old_score, 0)
+    rating_snapshot(sender, instance)
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    counters.apply_rating_delta(instance.movie_id, -instance.score, -1)
+
+
+# --- documents de recherche ---
+@receiver(pre_save, sender=Actor)
+def actor_search_document(sender, instance, **kwargs):
+    instance.search_document = search.build_actor_document(instance)
+
+
+@receiver(pre_save, sender=Movie)
+def movie_search_document(sender, instance, **kwargs):
+    names = []
+    if instance.pk:
+        names = (Casting.objects.filter(movie_id=instance.pk)
+                 .order_by('order').values_list('actor__full_name', flat=True))
+    instance.search_document = search.build_movie_document(instance, names)
+
+
+@receiver(post_save, sender=Actor)
+@receiver(post_save, sender=Movie)
+def search_indexed(sender, instance, created, **kwargs):
+    search.index_document(sender, instance.pk, instance.search_document)
+    if sender is Actor and not created:
+        # le nom de l'acteur figure dans le document de ses films
+        movie_ids = Casting.objects.filter(actor_id=instance.pk).values_list('movie_id', flat=True)
+        search.refresh_movie_documents(set(movie_ids))
+
+
+@receiver(post_delete, sender=Actor)
+@receiver(post_delete, sender=Movie)
+def search_unindexed(sender, instance, **kwargs):
+    search.index_document(sender, instance.pk, None)
+
+
+@receiver(post_save, sender=Casting)
+@receiver(post_delete, sender=Casting)
+def casting_changed(sender, instance, **kwargs):
+    search.refresh_movie_documents([instance.movie_id])
+
+
+# --- Casting -> filmographies et partenaires (voir filmography.py) ---
+@receiver(post_init, sender=Casting)
+def casting_snapshot(sender, instance, **kwargs):
+    instance._filmography_state = (instance.__dict__.get('movie_id'), instance.__dict__.get('actor_id'))
+
+
+@receiver(post_save, sender=Casting)
+def casting_saved_filmography(sender, instance, created, **kwargs):
+    old_movie, old_actor = instance._filmography_state
+    moved = created or (old_movie, old_actor) != (instance.movie_id, instance.actor_id)
+    movie_ids = {instance.movie_id, old_movie} - {None}
+    # rôle / ordre modifiés : seule la filmographie change, pas le graphe
+    actor_ids = {instance.actor_id, old_actor} - {None} if moved else set()
+    filmography.refresh(movie_ids, actor_ids)
+    casting_snapshot(sender, instance)
+
+
+@receiver(post_delete, sender=Casting)
+def casting_deleted_filmography(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, (Movie, Actor)):
+        # suppression en cascade : le film ou l'acteur n'est pas encore supprimé,
+        # on recalcule une fois la transaction validée
+        transaction.on_commit(lambda: filmography.refresh([instance.movie_id], [instance.actor_id]))
+    else:
+        filmography.refresh([instance.movie_id], [instance.actor_id])
+
+
+@receiver(post_save, sender=Movie)
+def movie_saved_filmography(sender, instance, created, **kwargs):
+    if not created:
+        filmography.movie_changed(instance)
+
+
+@receiver(post_save, sender=Actor)
+def actor_saved_filmography(sender, instance, created, **kwargs):
+    if not created:
+        filmography.actor_renamed(instance)
+
+
+# --- images -> déclinaisons WebP / JPEG (voir images.py) ---
+@receiver(post_init, sender=Actor)
+@receiver(post_init, sender=Movie)
+def image_snapshot(sender, instance, **kwargs):
+    # __dict__ : ne pas forcer le chargement d'un champ différé (.only())
+    instance._image_state = {name: getattr(instance.__dict__.get(name), 'name', instance.__dict__.get(name))
+                             for name in images.image_fields(sender)}
+
+
+@receiver(post_save, sender=Actor)
+@receiver(post_save, sender=Movie)
+def image_renditions(sender, instance, **kwargs):
+    for name in images.image_fields(sender):
+        if name not in instance.__dict__:
+            continue
+        current = getattr(instance, name).name or None
+        if current != (instance._image_state.get(name) or None):
+            # traitement d'image hors requête (voir tasks.py)
+            tasks.enqueue('images.renditions', idempotency_key=f'images:{sender.__name__}:{instance.pk}:{name}',
+                          model=sender.__name__, pk=instance.pk, field=name)
+    image_snapshot(sender, instance)
+
+
+# --- Comment -> Movie.comments_count et updated_at (validateur ETag du détail et du fil) ---
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.apply_comment_delta(instance.movie_id, 1)
+    else:
+        Movie.objects.filter(pk=instance.movie_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.apply_comment_delta(instance.movie_id, -1)
+
+
+# --- User -> cache d'authentification JWT (voir auth.py) ---
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed_auth(sender, instance, created=False, **kwargs):
+    # un nouvel utilisateur n'a encore ni jeton ni entrée de cache
+    if not created:
+        auth.user_changed(instance)
+
+
+# --- compteurs en direct (SSE, voir live.py) : rien n'est fait pour un film non suivi ---
+@receiver(counters.like_toggled)
+def like_toggled_live(sender, movie_id, likes_count, **kwargs):
+    live.publish(movie_id, likes_count=likes_count)
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def like_changed_live(sender, instance, **kwargs):
+    live.publish_counters([instance.movie_id], 'likes_count')
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def rating_changed_live(sender, instance, **kwargs):
+    live.publish_counters([instance.movie_id], 'avg_rating', 'rating_count')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed_live(sender, instance, created=False, **kwargs):
+    if created:
+        live.publish(instance.movie_id, comment=instance.pk)
+    live.publish_counters([instance.movie_id], 'comments_count')
+
+
+# --- cache d'objets (api/objcache.py) ---
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+def record_changed_objcache(sender, instance, **kwargs):
+    objcache.evict(sender, instance.pk)
+
+
+# --- invalidation du cache de réponses (api/cache.py) ---
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def movie_changed_cache(sender, instance, **kwargs):
+    cache.invalidate(f'movie:{instance.pk}', 'movies')
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def vote_changed_cache(sender, instance, **kwargs):
+    # compteurs seulement : le détail est invalidé, les listes (tag 'movies') les
+    # rattrapent à l'expiration de leur entrée (API_CACHE_TIMEOUT) ; un vote ne doit
+    # pas vider toutes les pages du catalogue
+    cache.invalidate(f'movie:{instance.movie_id}')
+
+
+@receiver(counters.like_toggled)
+def like_toggled_cache(sender, movie_id, **kwargs):
+    cache.invalidate(f'movie:{movie_id}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed_cache(sender, instance, **kwargs):
+    cache.invalidate(f'movie:{instance.movie_id}')
+
+
+@receiver(post_save, sender=Casting)
+@receiver(post_delete, sender=Casting)
+def casting_changed_cache(sender, instance, **kwargs):
+    cache.invalidate(f'movie:{instance.movie_id}', f'actor:{instance.actor_id}', 'movies')
+
+
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+def actor_changed_cache(sender, instance, **kwargs):
+    # l'acteur est imbriqué dans le détail de ses films
+    movie_ids = Casting.objects.filter(actor_id=instance.pk).values_list('movie_id', flat=True)
+    cache.invalidate(f'actor:{instance.pk}', *[f'movie:{pk}' for pk in set(movie_ids)])
@@ -0,0 +1,217 @@
+"""
+File de tâches de fond adossée à la base (table api_task), sans broker externe.
+
+- `@task('nom')` enregistre une fonction ; `enqueue('nom', **kwargs)` écrit une ligne dans
+  la transaction courante : la tâche n'existe que si la requête est validée (outbox).
+- idempotency_key : au plus une tâche en attente par clé (contrainte unique partielle) ;
+  un enqueue avec la clé d'une tâche pas encore prise est ignoré. Une tâche déjà en
+  cours n'absorbe pas les suivantes : le travail demandé après son démarrage sera refait.
+- `manage.py run_workers` prend les tâches par lots (SELECT ... FOR UPDATE SKIP LOCKED
+  sous PostgreSQL), les exécute dans un pool de threads, réessaie avec un délai
+  exponentiel (+ gigue) et marque 'failed' après max_attempts.
+- un worker arrêté en pleine tâche la rend au bout de son bail (locked_until).
+- API_TASKS_EAGER=1 (défaut) : exécution immédiate après commit, dans le processus web,
+  sans worker ni reprise. Le déploiement ne lance pas de run_workers : ne passer à 0
+  qu'avec un processus worker, sinon les tâches restent en file.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name, max_attempts=5):
+    """Décorateur : enregistre `func` sous `name` (arguments = payload JSON)."""
+    def register(func):
+        _registry[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def registered():
+    return dict(_registry)
+
+
+def backoff(attempts):
+    """Délai avant la tentative suivante : base * 2^(n-1), plafonné, +/- 20 % de gigue."""
+    base = getattr(settings, 'API_TASKS_BACKOFF_BASE', 5)
+    cap = getattr(settings, 'API_TASKS_BACKOFF_MAX', 3600)
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def eager():
+    """Vrai si les tâches s'exécutent dans le processus web, sans worker (API_TASKS_EAGER)."""
+    return getattr(settings, 'API_TASKS_EAGER', False)
+
+
+def enqueue(name, idempotency_key=None, delay=None, **payload):
+    """
+    Met la tâche `name` en file. Retourne la Task créée, ou None si une tâche de même
+    clé est déjà en attente / en cours (ou si elle a été exécutée sur-le-champ en mode eager).
+    """
+    func, max_attempts = _registry[name]
+    if eager():
+        transaction.on_commit(lambda: _run_eager(name, func, payload))
+        return None
+    run_at = timezone.now() + (delay or timedelta(0))
+    try:
+        # savepoint : un doublon ne doit pas casser la transaction de la requête
+        with transaction.atomic():
+            return Task.objects.create(name=name, payload=payload, idempotency_key=idempotency_key,
+                                       max_attempts=max_attempts, run_at=run_at)
+    except IntegrityError:
+        return None
+
+
+def _run_eager(name, func, payload):
+    try:
+        func(**payload)
+    except Exception:
+        logger.exception("tâche %s en échec (mode eager)", name)
+
+
+# --- côté worker ---
+def lease():
+    return timedelta(seconds=getattr(settings, 'API_TASKS_LEASE', 300))
+
+
+def claim(worker_id, limit=10):
+    """
+    Réserve jusqu'à `limit` tâches prêtes pour ce worker et les retourne.
+    PostgreSQL : FOR UPDATE SKIP LOCKED, les workers ne s'attendent pas entre eux.
+    SQLite : le filtre sur le statut dans l'UPDATE départage deux workers concurrents.
+    """
+    now = timezone.now()
+    token = f'{worker_id}:{uuid.uuid4().hex[:8]}'
+    ready = Q(status=Task.QUEUED, run_at__lte=now) | Q(status=Task.RUNNING, locked_until__lt=now)
+    with transaction.atomic():
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True).filter(ready)
+            .order_by('run_at', 'id').values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Task.objects.filter(ready, id__in=ids).update(
+            status=Task.RUNNING, locked_by=token, locked_until=now + lease(),
+            attempts=F('attempts') + 1, updated_at=now,
+        )
+    return list(Task.objects.filter(id__in=ids, locked_by=token).order_by('run_at', 'id'))
+
+
+def execute(task_row):
+    """Exécute une tâche réservée et enregistre son issue. Retourne True si elle a réussi."""
+    entry = _registry.get(task_row.name)
+    try:
+        if entry is None:
+            raise LookupError(f"tâche inconnue : {task_row.name}")
+        entry[0](**task_row.payload)
+    except Exception as exc:
+        error = ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+        final = entry is None or task_row.attempts >= task_row.max_attempts
+        outcome = dict(locked_by='', locked_until=None, last_error=error[:2000], updated_at=timezone.now())
+        mine = Task.objects.filter(pk=task_row.pk, locked_by=task_row.locked_by)
+        try:
+            with transaction.atomic():
+                mine.update(status=Task.FAILED if final else Task.QUEUED,
+                            run_at=timezone.now() + backoff(task_row.attempts), **outcome)
+        except IntegrityError:
+            # une tâche de même clé a été remise en file entre-temps : elle refera le travail
+            mine.update(status=Task.FAILED, **outcome)
+        log = logger.error if final else logger.warning
+        log("tâche %s #%s en échec (essai %s/%s) : %s", task_row.name, task_row.pk,
+            task_row.attempts, task_row.max_attempts, error)
+        return False
+    Task.objects.filter(pk=task_row.pk, locked_by=task_row.locked_by).update(
+        status=Task.DONE, locked_by='', locked_until=None, updated_at=timezone.now(),
+    )
+    return True
+
+
+def work_off(worker_id='inline', limit=100):
+    """Exécute toutes les tâches prêtes dans le thread courant (tests, --burst)."""
+    done = failed = 0
+    while True:
+        batch = claim(worker_id, limit)
+        if not batch:
+            return done, failed
+        for task_row in batch:
+            if execute(task_row):
+                done += 1
+            else:
+                failed += 1
+
+
+def purge(older_than=None):
+    """Supprime les tâches terminées depuis plus de `older_than` (API_TASKS_KEEP_DONE)."""
+    older_than = older_than or timedelta(seconds=getattr(settings, 'API_TASKS_KEEP_DONE', 86400))
+    deleted, _ = Task.objects.filter(status=Task.DONE, updated_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+# ---------------------------------------------------------------------------
+# Tâches du projet
+# ---------------------------------------------------------------------------
+@task('images.renditions')
+def build_renditions(model, pk, field):
+    """Déclinaisons de l'image *actuelle* : plusieurs envois rapprochés = un seul traitement."""
+    from django.apps import apps
+
+    from . import cache, images, objcache
+    from .models import Casting
+
+    model_class = apps.get_model('api', model)
+    instance = model_class.objects.filter(pk=pk).only('pk', field, f'{field}_renditions').first()
+    if instance is None:
+        return
+    images.refresh(instance, field)
+    objcache.evict(model_class, pk)
+    # les vignettes apparaissent dans les réponses en cache (listes, détails, casting)
+    if model == 'Movie':
+        cache.invalidate(f'movie:{pk}', 'movies')
+    else:
+        movie_ids = set(Casting.objects.filter(actor_id=pk).values_list('movie_id', flat=True))
+        cache.invalidate(f'actor:{pk}', *[f'movie:{movie_id}' for movie_id in movie_ids])
+
+
+@task('ratings.link_comment')
+def link_pending_comment(user_id, movie_id):
+    """Rattache la note de l'utilisateur à son dernier commentaire sans note sur ce film."""
+    from .models import Comment, Rating
+
+    rating = Rating.objects.filter(user_id=user_id, movie_id=movie_id).only('pk').first()
+    if rating is None or Comment.objects.filter(rating=rating).exists():
+        return
+    comment = (Comment.objects.filter(movie_id=movie_id, author_id=user_id, rating__isnull=True)
+               .order_by('-created_at').first())
+    if comment is not None:
+        comment.rating = rating
+        comment.save(update_fields=['rating'])
+
+
+@task('ratings.recount', max_attempts=3)
+def recount_ratings(movie_ids):
+    """Filet du mode regroupé (voir ratings.py) : compteurs de notes recalculés depuis Rating."""
+    from . import cache, counters
+
+    counters.recount_ratings(movie_ids)
+    cache.invalidate(*[f'movie:{pk}' for pk in movie_ids])  # listes : voir signals.vote_changed_cache
+
+
+@task('counters.reconcile', max_attempts=3)
+def reconcile_counters(movie_ids=None):
+    from . import counters
+
+    counters.reconcile(movie_ids)
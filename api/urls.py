@@ -1,13 +1,23 @@
 from django.urls import path
-from . import views
+from . import async_views, live, views
 
 
 urlpatterns = [
     path("user/me/", views.CurrentUserView.as_view(), name="current-user"),
+
+    # État like / note de l'utilisateur pour une liste de films (?ids=1,2,3)
+    path("user/me/movie-states/", views.MovieStatesView.as_view(), name="movie-states"),
     
     # Liste des films
     path('movies/', views.MovieListView.as_view(), name='movie-list'),
 
+    # Classements (tendances / mieux notés)
+    path('movies/trending/', views.TrendingMovieListView.as_view(), name='movie-trending'),
+    path('movies/top-rated/', views.TopRatedMovieListView.as_view(), name='movie-top-rated'),
+
+    # Export NDJSON du catalogue complet (intégrations partenaires)
+    path('movies/export/', views.export_movies, name='movie-export'),
+
     # Détail d'un film
     path('movies/<int:pk>/', views.MovieDetailView.as_view(), name='movie-detail'),
 
@@ -30,4 +40,21 @@ urlpatterns = [
 
     path('actors/<int:actor_id>/movies/', views.ActorMovieListView.as_view(), name='actor-movies'),
 
+    # Filmographie (rôles) et partenaires d'un acteur, lus dans les projections matérialisées
+    path('actors/<int:actor_id>/filmography/', views.ActorFilmographyView.as_view(), name='actor-filmography'),
+    path('actors/<int:actor_id>/costars/', views.ActorCoStarListView.as_view(), name='actor-costars'),
+
+    # Lectures async (ASGI / uvicorn), mêmes réponses que les vues ci-dessus
+    path('async/movies/', async_views.movie_list, name='async-movie-list'),
+    path('async/movies/<int:pk>/', async_views.movie_detail, name='async-movie-detail'),
+    path('async/movies/<int:movie_id>/comments/', async_views.movie_comments, name='async-movie-comments'),
+    path('async/actors/', async_views.actor_list, name='async-actor-list'),
+    path('async/actors/<int:pk>/', async_views.actor_detail, name='async-actor-detail'),
+
+    # Compteurs en direct des films suivis (Server-Sent Events, ASGI), voir live.py
+    path('live/movies/', live.movie_stream, name='live-movies'),
+
+    # Métriques Prometheus (staff ou jeton API_METRICS_TOKEN), voir views.MetricsView
+    path('_metrics', views.MetricsView.as_view(), name='metrics'),
+
 ]
\ No newline at end of file
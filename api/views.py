@@ -1,7 +1,10 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import prefetch_related_objects
 from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
 
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
@@ -10,10 +13,12 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 
 from rest_framework.views import APIView
-from django.db.models import Avg
 
 from .models import *
 from .serializers import *
+from . import counters, export, metrics, objcache, ratings, rows, search, tasks
+from .cache import CachedResponseMixin, ConditionalGetMixin, updated_at_of
+from .pagination import CommentFeedPagination
 
 class CreateUserView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -28,47 +33,193 @@ class CurrentUserView(generics.CreateAPIView):
         serializer = CurrentUserSerializer(request.user)
         return Response(serializer.data)
 
-class MovieListView(generics.ListAPIView):
+class RowListMixin:
+    """
+    list() par row_serializer_class (voir rows.py) : page lue par .values(), rendue sans
+    instance ni champ DRF ; même sortie que serializer_class, qui reste utilisé si
+    API_ROW_SERIALIZERS est à False (et pour les écritures).
+    """
+    row_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.row_serializer_class is None or not rows.rows_enabled():
+            return super().list(request, *args, **kwargs)
+        serializer = self.row_serializer_class(context=self.get_serializer_context())
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(serializer.prepare(queryset, self.paginator, self))
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page))
+        return Response(serializer.many(serializer.prepare(queryset)))
+
+
+class UserStateListMixin:
+    """
+    ?user_state=1 sur une liste de films : ajoute user_liked / user_rating à chaque ligne,
+    annotés dans la requête de la page (deux sous-requêtes, aucune requête par film).
+    La réponse devient propre à l'utilisateur : hors cache partagé, ETag par utilisateur.
+    """
+
+    def wants_user_state(self):
+        return (self.request.user.is_authenticated
+                and self.request.query_params.get('user_state') in ('1', 'true'))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.wants_user_state():
+            queryset = queryset.with_user_state(self.request.user)
+        return queryset
+
+    def is_cacheable(self, request):
+        return not self.wants_user_state() and super().is_cacheable(request)
+
+    def page_validators(self, queryset):
+        parts, last_modified = super().page_validators(queryset)
+        if self.wants_user_state():
+            parts.append(self.request.user.pk)
+        return parts, last_modified
+
+
+class MovieListView(RowListMixin, UserStateListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieListSerializer
+    row_serializer_class = rows.MovieListRows
     permission_classes = [permissions.AllowAny]
+    # pas d'état utilisateur dans la liste : partageable entre anonymes et connectés
+    cache_authenticated = True
+
+    def get_cache_tags(self):
+        return ['movies']
+
+    def get_validators(self):
+        return self.page_validators(self.filter_queryset(self.get_queryset()))
 
     def get_queryset(self):
         queryset = super().get_queryset()
         q = self.request.query_params.get("q")
 
-        if q:
-            q = q.strip()
-            queryset = queryset.filter(
-                Q(title_fr__icontains=q) |
-                Q(title_original__icontains=q)
-            ).distinct()
+        if q and q.strip():
+            # recherche indexée, triée par pertinence (voir api/search.py)
+            queryset = search.search_movies(queryset, q.strip())
 
         return queryset
 
-class ActorListView(generics.ListAPIView):
+class TrendingMovieListView(RowListMixin, UserStateListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
+    """
+    GET /api/movies/trending/ -> films par engagement récent (likes, notes) décroissant.
+    Score précalculé à chaque vote (voir api/leaderboards.py) : lecture d'index seulement.
+    """
+    queryset = Movie.objects.filter(trending_score__isnull=False).order_by('-trending_score')
+    serializer_class = TrendingMovieSerializer
+    row_serializer_class = rows.TrendingMovieRows
+    permission_classes = [permissions.AllowAny]
+    cache_authenticated = True
+
+    def get_cache_tags(self):
+        return ['movies']
+
+    def get_validators(self):
+        return self.page_validators(self.filter_queryset(self.get_queryset()))
+
+
+class TopRatedMovieListView(TrendingMovieListView):
+    """
+    GET /api/movies/top-rated/ -> films par moyenne bayésienne décroissante
+    (un film noté 10 par une seule personne ne passe pas devant un classique).
+    """
+    serializer_class = TopRatedMovieSerializer
+    row_serializer_class = rows.TopRatedMovieRows
+
+    def get_queryset(self):
+        min_votes = getattr(settings, 'API_TOP_RATED_MIN_VOTES', 1)
+        return (Movie.objects.filter(top_score__isnull=False, rating_count__gte=min_votes)
+                .order_by('-top_score'))
+
+
+class ActorListView(RowListMixin, ConditionalGetMixin, generics.ListAPIView):
     queryset = Actor.objects.all()
     serializer_class = ActorSerializer
+    row_serializer_class = rows.ActorRows
     permission_classes = [permissions.AllowAny]
+    # Actor n'a pas de Meta.ordering : ordre de pagination explicite
+    cursor_ordering = ['full_name']
+
+    def get_validators(self):
+        return self.page_validators(self.filter_queryset(self.get_queryset()))
 
     def get_queryset(self):
         queryset = super().get_queryset()
         q = self.request.query_params.get("q")
 
-        if q:
-            q = q.strip()
-            queryset = queryset.filter(
-                Q(full_name__icontains=q)
-            ).distinct()
+        if q and q.strip():
+            queryset = search.search_actors(queryset, q.strip())
 
         return queryset
 
 
-class MovieDetailView(generics.RetrieveAPIView):
+class MovieStatesView(APIView):
+    """
+    GET /api/user/me/movie-states/?ids=1,2,3
+    -> {"1": {"liked": true, "rating": 8}, ...} pour chaque id demandé :
+    l'état like / note de l'utilisateur sur toute une page de films, une requête par table.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        raw = request.query_params.get('ids', '')
+        try:
+            ids = list(dict.fromkeys(int(i) for i in raw.split(',') if i.strip()))
+        except ValueError:
+            return Response({"detail": "ids : liste d'entiers séparés par des virgules."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_ids = getattr(settings, 'API_MOVIE_STATES_MAX_IDS', 200)
+        if len(ids) > max_ids:
+            return Response({"detail": f"{max_ids} ids au plus."}, status=status.HTTP_400_BAD_REQUEST)
+
+        liked = set(Like.objects.filter(user=request.user, movie_id__in=ids, liked=True)
+                    .values_list('movie_id', flat=True))
+        ratings = dict(Rating.objects.filter(user=request.user, movie_id__in=ids)
+                       .values_list('movie_id', 'score'))
+        return Response({
+            str(pk): {'liked': pk in liked, 'rating': ratings.get(pk)} for pk in ids
+        })
+
+
+class MovieDetailView(ConditionalGetMixin, CachedResponseMixin, generics.RetrieveAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieDetailSerializer
     permission_classes = [permissions.AllowAny]
-    
+    updated_at = None
+
+    def get_cache_tags(self):
+        return [f"movie:{self.kwargs['pk']}"]
+
+    def get_validators(self):
+        # likes, notes, commentaires et casting avancent tous Movie.updated_at
+        self.updated_at = updated_at_of(Movie.objects.filter(pk=self.kwargs['pk']))
+        if self.updated_at is None:
+            return None, None
+        user = self.request.user
+        # user_liked / user_rating : la représentation dépend de l'utilisateur
+        return [self.updated_at, user.pk if user.is_authenticated else None], self.updated_at
+
+    def get_queryset(self):
+        # état utilisateur annoté dans la requête du film (aucune requête par champ)
+        return Movie.objects.with_user_state(self.request.user)
+
+    def get_object(self):
+        """
+        Anonyme : film lu dans le cache d'objets, à la version (updated_at) lue pour l'ETag.
+        Casting (acteurs du cache d'objets) et commentaires préchargés ensuite sur l'instance.
+        """
+        if self.request.user.is_authenticated or self.updated_at is None:
+            movie = super().get_object()
+        else:
+            movie = objcache.movies.get(self.kwargs['pk'], updated_at=self.updated_at)
+            if movie is None:
+                raise Http404("Aucun film ne correspond.")
+            self.check_object_permissions(self.request, movie)
+        prefetch_related_objects([movie], *Movie.objects.detail_prefetches(join_actors=False))
+        return movie
 
 
 
@@ -78,16 +229,30 @@ class MovieActorListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         movie_id = self.kwargs['movie_id']
-        return Casting.objects.filter(movie_id=movie_id).select_related('actor')
+        # acteurs lus dans le cache d'objets par CastingListSerializer, pas joints
+        return Casting.objects.filter(movie_id=movie_id)
 
-class MovieCommentListCreateView(generics.ListCreateAPIView):
+class MovieCommentListCreateView(RowListMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    """
+    GET /api/movies/<movie_id>/comments/ -> fil des commentaires, du plus récent au plus ancien,
+    paginé par curseur ; le lien `since` ne renvoie que les commentaires arrivés depuis
+    (voir CommentFeedPagination).
+    """
     serializer_class = CommentSerializer
+    row_serializer_class = rows.CommentRows
+    pagination_class = CommentFeedPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_validators(self):
+        # toute écriture de commentaire (ou de note liée) avance Movie.updated_at ;
+        # sert aussi de contrôle d'existence du film (pas de get_object_or_404 en plus)
+        updated_at = updated_at_of(Movie.objects.filter(pk=self.kwargs['movie_id']))
+        if updated_at is None:
+            raise Http404("Aucun film ne correspond.")
+        return [updated_at], None
+
     def get_queryset(self):
-        movie_id = self.kwargs['movie_id']
-        movie = get_object_or_404(Movie, pk=movie_id)
-        return movie.comments.all()
+        return Comment.objects.filter(movie_id=self.kwargs['movie_id']).select_related('author', 'rating')
 
     def perform_create(self, serializer):
         movie_id = self.kwargs['movie_id']
@@ -102,17 +267,36 @@ class MovieCommentListCreateView(generics.ListCreateAPIView):
 
 
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def export_movies(request):
+    """
+    GET /api/movies/export/ -> tout le catalogue en NDJSON (un film par ligne, avec casting),
+    envoyé au fil de la lecture (voir api/export.py) ; itérateur async sous ASGI, sans quoi
+    Django lirait tout le catalogue en mémoire avant le premier octet.
+    """
+    if isinstance(request._request, ASGIRequest):
+        content = export.aiter_catalogue()
+    else:
+        content = export.iter_catalogue()
+    response = StreamingHttpResponse(content, content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="movies.ndjson"'
+    # pas de mise en tampon par un proxy (nginx) : le client reçoit les lots au fil de l'eau
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_like(request, movie_id):
-    movie = get_object_or_404(Movie, pk=movie_id)
-    user = request.user
-    like, created = Like.objects.get_or_create(movie=movie, user=user)
-    like.liked = not like.liked if not created else True
-    like.save()
+    # upsert conditionnel + compteur en une requête (voir counters.toggle_like)
+    result = counters.toggle_like(request.user.pk, movie_id)
+    if result is None:
+        raise Http404("Aucun film ne correspond.")
+    liked, likes_count = result
     return Response({
-        "liked": like.liked,
-        "likes_count": movie.likes_count
+        "liked": liked,
+        "likes_count": likes_count
     })
 
 
@@ -120,75 +304,162 @@ class MovieRatingCreateUpdateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, movie_id):
-        movie = get_object_or_404(Movie, pk=movie_id)
         serializer = RatingSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         score = serializer.validated_data['score']
         if score is None:
             return Response({"detail": "score required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Crée ou met à jour la note
-        rating, created = Rating.objects.update_or_create(
-            user=request.user,
-            movie=movie,
-            defaults={'score': score}
-        )
-
-        try:
-            comment_to_update = Comment.objects.filter(
+        if ratings.coalescing():
+            # note écrite tout de suite, moyenne recalculée au prochain vidage (voir ratings.py)
+            recorded = ratings.record(request.user.pk, movie_id, score)
+            if recorded is None:
+                raise Http404("Aucun film ne correspond.")
+            rating, avg = recorded
+        else:
+            movie = get_object_or_404(Movie, pk=movie_id)
+            # Crée ou met à jour la note
+            rating, created = Rating.objects.update_or_create(
+                user=request.user,
                 movie=movie,
-                author=request.user,
-                rating__isnull=True
-            ).order_by('-created_at').first()
-            if comment_to_update:
-                comment_to_update.rating = rating
-                comment_to_update.save(update_fields=['rating'])
-        except Exception:
-            # ne doit pas bloquer la réponse si la liaison échoue
-            pass
+                defaults={'score': score}
+            )
+            # La moyenne est tenue à jour par signal (rating_sum / rating_count)
+            movie.refresh_from_db(fields=['avg_rating'])
+            avg = movie.avg_rating
 
-        # Recalcul de la moyenne
-        avg = Rating.objects.filter(movie=movie).aggregate(avg=Avg('score'))['avg'] or 0.0
-        movie.avg_rating = avg
-        movie.save(update_fields=['avg_rating'])
+        # liaison au dernier commentaire sans note : hors requête (voir tasks.py), et
+        # seulement s'il y en a un (index partiel comment_pending_rating_idx)
+        if Comment.objects.filter(movie_id=movie_id, author=request.user, rating__isnull=True).exists():
+            tasks.enqueue('ratings.link_comment', idempotency_key=f'link-comment:{request.user.pk}:{movie_id}',
+                          user_id=request.user.pk, movie_id=movie_id)
 
-        return Response({'rating': RatingSerializer(rating).data, 'avg_rating': avg})
+        return Response({'rating': RatingSerializer(rating).data, 'avg_rating': avg or 0.0})
 
 
-class ActorMovieListView(generics.ListAPIView):
+class ActorMovieListView(RowListMixin, UserStateListMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
     """
     GET /api/actors/<actor_id>/movies/
     Retourne la liste des films où l'acteur apparaît.
     """
     serializer_class = MovieListSerializer
+    row_serializer_class = rows.MovieListRows
     permission_classes = [permissions.AllowAny]  # ou IsAuthenticatedOrReadOnly si tu veux restreindre
+    cache_authenticated = True
+
+    def get_cache_tags(self):
+        return [f"actor:{self.kwargs['actor_id']}", 'movies']
+
+    def get_validators(self):
+        return self.page_validators(self.filter_queryset(self.get_queryset()))
 
     def get_queryset(self):
         actor_id = self.kwargs.get('actor_id')
-        # vérifier que l'acteur existe (404 si non)
-        get_object_or_404(Actor, pk=actor_id)
+        # vérifier que l'acteur existe (404 si non) : cache d'objets, pas de requête le plus souvent
+        if objcache.actors.get(actor_id) is None:
+            raise Http404("Aucun acteur ne correspond.")
+
+        # films de la filmographie matérialisée : semi-jointure (IN), sans DISTINCT
+        return Movie.objects.filter(pk__in=Credit.objects.filter(actor_id=actor_id).values('movie_id'))
 
-        # Requête : tous les films liés via la table de liaison (Casting)
-        qs = Movie.objects.filter(cast__id=actor_id).distinct()
 
-        # optimisation optionnelle
-        qs = qs.select_related()  # si tu as des FK directes
+class ActorProjectionMixin(ConditionalGetMixin, CachedResponseMixin):
+    """Listes lues dans les projections de filmography.py ; ETag = updated_at de l'acteur."""
+    permission_classes = [permissions.AllowAny]
+    cache_authenticated = True
+
+    def get_cache_tags(self):
+        return [f"actor:{self.kwargs['actor_id']}"]
+
+    def get_validators(self):
+        updated_at = updated_at_of(Actor.objects.filter(pk=self.kwargs['actor_id']))
+        if updated_at is None:
+            raise Http404("Aucun acteur ne correspond.")
+        return [updated_at], updated_at
 
-        return qs
 
-class ActorView(generics.RetrieveAPIView):
+class ActorFilmographyView(ActorProjectionMixin, generics.ListAPIView):
+    """
+    GET /api/actors/<actor_id>/filmography/
+    Rôles de l'acteur (film, titre, date, rôle, ordre), du plus récent au plus ancien.
+    """
+    serializer_class = CreditSerializer
+
+    def get_queryset(self):
+        return Credit.objects.filter(actor_id=self.kwargs['actor_id'])
+
+
+class ActorCoStarListView(ActorProjectionMixin, generics.ListAPIView):
+    """
+    GET /api/actors/<actor_id>/costars/
+    Partenaires de l'acteur, par nombre de films en commun décroissant.
+    """
+    serializer_class = CoStarSerializer
+
+    def get_queryset(self):
+        return CoStar.objects.filter(actor_id=self.kwargs['actor_id'])
+
+
+class ActorView(ConditionalGetMixin, CachedResponseMixin, generics.RetrieveAPIView):
     """
     GET /api/actors/<pk>/  -> renvoie la fiche détaillée d'un acteur.
     Permission: lecture publique, modification réservée (ici on n'expose que GET).
     """
     queryset = Actor.objects.all()
-    serializer_class = ActorSerializer
+    serializer_class = ActorDetailSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     lookup_field = "pk"
+    cache_authenticated = True
+    updated_at = None
 
-  
-    def get_queryset(self):
-        # si tu as des relations à précharger (ex: photo stockée ailleurs), adapte ici
-        return super().get_queryset()
-    
-    
+    def get_cache_tags(self):
+        return [f"actor:{self.kwargs['pk']}"]
+
+    def get_validators(self):
+        # la filmographie et les partenaires avancent aussi Actor.updated_at (filmography.py)
+        self.updated_at = updated_at_of(Actor.objects.filter(pk=self.kwargs['pk']))
+        if self.updated_at is None:
+            return None, None
+        return [self.updated_at], self.updated_at
+
+    def get_object(self):
+        # ligne de l'acteur depuis le cache d'objets, à la version lue pour l'ETag
+        actor = None
+        if self.updated_at is not None:
+            actor = objcache.actors.get(self.kwargs['pk'], updated_at=self.updated_at)
+        if actor is None:
+            raise Http404("Aucun acteur ne correspond.")
+        self.check_object_permissions(self.request, actor)
+        prefetch_related_objects([actor], *Actor.objects.detail_prefetches())
+        return actor
+
+
+
+def metrics_token_matches(request):
+    token = getattr(settings, 'API_METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and header.startswith('Bearer ') and constant_time_compare(header[7:], token)
+
+
+class CanReadMetrics(permissions.BasePermission):
+    """Staff, ou jeton API_METRICS_TOKEN en Bearer (scraper Prometheus)."""
+
+    def has_permission(self, request, view):
+        return metrics_token_matches(request) or bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    """
+    GET /api/_metrics
+    Latence, requêtes SQL et temps de rendu par route, au format texte Prometheus (voir metrics.py).
+    """
+    permission_classes = [CanReadMetrics]
+
+    def get_authenticators(self):
+        # le jeton du scraper n'est pas un JWT : simplejwt le refuserait avec une 401
+        if metrics_token_matches(self.request):
+            return []
+        return super().get_authenticators()
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -9,8 +9,13 @@ CSRF_TRUSTED_ORIGINS = ["https://" + os.environ.get('RENDER_EXTERNAL_HOSTNAME')]
  
 SECRET_KEY = os.environ.get('SECRET_KEY')
 DEBUG = False
+# profilage SQL d'une requête sur 20 en production (voir api/metrics.py)
+API_METRICS_SAMPLE_RATE = float(os.getenv('API_METRICS_SAMPLE_RATE', 0.05))
+# notes regroupées : moyenne d'un film en retard d'au plus 1 s (voir api/ratings.py)
+API_RATINGS_COALESCE_WINDOW = float(os.getenv('API_RATINGS_COALESCE_WINDOW', 1.0))
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # 'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -35,18 +35,45 @@ ALLOWED_HOSTS = ["*"]
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication sans requête auth_user par appel (claims du jeton, cache ; api/auth.py)
+        'api.auth.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
-    )
+    ),
+    # pagination par curseur (keyset) : pas d'OFFSET ni de COUNT(*)
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 20,
+    # JSONRenderer chronométré (api/metrics.py)
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.metrics.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# taille de page maximale acceptée via ?page_size=
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 100))
+# nombre d'ids accepté par /api/user/me/movie-states/
+API_MOVIE_STATES_MAX_IDS = 200
+# commentaires embarqués dans le détail d'un film (la suite : /movies/<id>/comments/)
+API_DETAIL_COMMENTS = 10
+# listes sérialisées depuis .values() (api/rows.py) et JSON encodé par orjson (api/renderers.py)
+API_ROW_SERIALIZERS = os.getenv('API_ROW_SERIALIZERS', '1') == '1'
+API_FAST_JSON = os.getenv('API_FAST_JSON', '1') == '1'
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    # username / is_staff / is_superuser dans les jetons (api/auth.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'api.auth.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.auth.ClaimsTokenRefreshSerializer',
 }
 
+# Utilisateur JWT (api/auth.py) : lu dans les claims du jeton, sinon dans un cache LRU du processus
+API_AUTH_TRUST_CLAIMS = os.getenv('API_AUTH_TRUST_CLAIMS', '1') == '1'
+API_AUTH_USER_CACHE_SIZE = 10000   # 0 : pas de cache
+API_AUTH_USER_CACHE_TTL = 300      # secondes (borne de fraîcheur entre processus)
+
 
 # Application definition
 
@@ -62,11 +89,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'storages',
 ]
 
 MIDDLEWARE = [
+    # en premier : la latence mesurée couvre tous les autres middlewares
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     # 'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -110,6 +140,68 @@ DATABASES = {
     )
 }
 
+# Cache : mémoire locale par défaut, Redis si REDIS_URL est défini
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'cinemax',
+    }
+}
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+# cache des réponses publiques (api/cache.py), durées en secondes
+API_CACHE_ENABLED = os.getenv('API_CACHE_ENABLED', '1') == '1'
+API_CACHE_ALIAS = 'default'
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 30))
+API_CACHE_STALE_TIMEOUT = int(os.getenv('API_CACHE_STALE_TIMEOUT', 300))
+
+# cache d'objets Movie / Actor (api/objcache.py) : LRU du processus + niveau partagé optionnel
+API_OBJECT_CACHE_SIZE = int(os.getenv('API_OBJECT_CACHE_SIZE', 5000))  # instances par modèle ; 0 : pas de LRU
+API_OBJECT_CACHE_TTL = int(os.getenv('API_OBJECT_CACHE_TTL', 60))
+API_OBJECT_CACHE_ALIAS = os.getenv('API_OBJECT_CACHE_ALIAS') or None  # alias de CACHES, ex. 'default' avec REDIS_URL
+
+# Classements (api/leaderboards.py) ; après un changement : manage.py reconcile_counters --trending
+API_TRENDING_HALF_LIFE_HOURS = float(os.getenv('API_TRENDING_HALF_LIFE_HOURS', 48))
+API_TRENDING_LIKE_WEIGHT = 1.0
+API_TRENDING_RATING_WEIGHT = 2.0
+API_TOP_RATED_PRIOR_MEAN = 5.0   # note a priori (échelle 0..10)
+API_TOP_RATED_PRIOR_VOTES = 10   # poids de l'a priori, en nombre de votes
+API_TOP_RATED_MIN_VOTES = int(os.getenv('API_TOP_RATED_MIN_VOTES', 1))
+
+# Tâches de fond (api/tasks.py) ; EAGER=1 (défaut) : exécutées après commit dans le processus web.
+# Passer API_TASKS_EAGER=0 seulement si un processus `manage.py run_workers` tourne à côté.
+API_TASKS_EAGER = os.getenv('API_TASKS_EAGER', '1') == '1'
+API_TASKS_BACKOFF_BASE = 5       # secondes, doublé à chaque échec
+API_TASKS_BACKOFF_MAX = 3600
+API_TASKS_LEASE = 300            # une tâche réservée plus longtemps est reprise par un autre worker
+API_TASKS_KEEP_DONE = 86400      # tâches terminées conservées (purge par les workers)
+
+# Notes en rafale (api/ratings.py) : > 0 = moyenne recalculée au plus toutes les N secondes
+API_RATINGS_COALESCE_WINDOW = float(os.getenv('API_RATINGS_COALESCE_WINDOW', 0))
+API_RATINGS_FLUSH_THREAD = True     # False : vidage par ratings.flush() seulement (tests)
+API_RATINGS_FALLBACK_DELAY = 30     # secondes avant le recomptage de secours (processus mort)
+
+# Compteurs en direct (api/live.py, /api/live/movies/ sous ASGI)
+API_LIVE_BATCH_WINDOW = 0.25     # secondes : deltas d'une fenêtre regroupés en un message
+API_LIVE_HEARTBEAT = 15          # secondes entre deux ': ping'
+API_LIVE_MAX_IDS = 100           # films suivis par connexion
+API_LIVE_MAX_COMMENT_IDS = 20    # ids de commentaires en attente par film, au-delà : comments_truncated
+API_LIVE_MAX_CONNECTIONS = int(os.getenv('API_LIVE_MAX_CONNECTIONS', 5000))  # par processus
+
+# Instrumentation (api/metrics.py) ; /api/_metrics : staff ou Authorization: Bearer API_METRICS_TOKEN
+API_METRICS_ENABLED = os.getenv('API_METRICS_ENABLED', '1') == '1'
+API_METRICS_SAMPLE_RATE = float(os.getenv('API_METRICS_SAMPLE_RATE', 1.0))  # part des requêtes profilées
+API_METRICS_QUERY_BUDGET = 20     # requêtes SQL par requête HTTP au-delà desquelles on avertit
+API_METRICS_ROUTE_BUDGETS = {     # budgets plus serrés pour les routes chaudes
+    'api/movies/': 6,
+    'api/movies/<int:pk>/': 8,
+}
+API_METRICS_TOKEN = os.getenv('API_METRICS_TOKEN', '')
+
 # AWS configuration for static files
 
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
@@ -0,0 +1,142 @@
+"""
+Compare gunicorn + WSGI (vues DRF) et uvicorn + ASGI (vues async, api/async_views.py).
+
+    python bench/asgi_vs_wsgi.py --movies 2000 --concurrency 256 --duration 15
+
+Crée une base SQLite jetable, la remplit via import_catalogue, lance chaque serveur
+sur un port libre puis mesure req/s et p50/p95/p99 sur la liste et le détail des films.
+Le cache de réponses est coupé (API_CACHE_ENABLED=0) : on mesure le chemin base de données.
+
+Attention : avec SQLite, l'ORM async passe par un unique thread par worker
+(sync_to_async thread_sensitive) et la base est locale, donc il n'y a pas d'attente
+réseau à recouvrir : ASGI y est plus lent. Le gain se mesure contre PostgreSQL :
+    DATABASE_URL=postgres://... python bench/asgi_vs_wsgi.py --use-database-url
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.loadgen import run_load  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'gunicorn+wsgi': lambda port, args: [
+        sys.executable, '-m', 'gunicorn', 'backend.wsgi:application', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers), '--threads', str(args.threads), '--log-level', 'warning',
+    ],
+    'uvicorn+asgi': lambda port, args: [
+        sys.executable, '-m', 'uvicorn', 'backend.asgi:application', '--host', '127.0.0.1',
+        '--port', str(port), '--workers', str(args.workers), '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+# (serveur, préfixe d'URL) : les vues sync sous ASGI servent de point de comparaison
+RUNS = [
+    ('gunicorn+wsgi', '/api/'),
+    ('uvicorn+asgi', '/api/async/'),
+    ('uvicorn+asgi', '/api/'),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def manage(env, *args):
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+
+def seed(env, workdir, movies, actors):
+    rng = random.Random(42)
+    names = [f"Acteur{i} Nom{i}" for i in range(actors)]
+    path = os.path.join(workdir, 'movies.jsonl')
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(movies):
+            cast = [{'actor': name, 'role_name': f"Rôle {j}"} for j, name in enumerate(rng.sample(names, 8))]
+            f.write(json.dumps({
+                'title_fr': f"Film {i}", 'release_date': f"{1950 + i % 70}-01-{1 + i % 28:02d}",
+                'director': f"Réalisateur {i % 300}", 'description': "Lorem ipsum " * 20, 'cast': cast,
+            }) + '\n')
+    manage(env, 'import_catalogue', '--movies', path)
+
+
+def wait_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"le serveur s'est arrêté (code {process.returncode})")
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} ne répond pas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--actors', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help="threads par worker gunicorn")
+    parser.add_argument('--use-database-url', action='store_true',
+                        help="utiliser DATABASE_URL (base vide, migrée et remplie) au lieu d'une SQLite jetable")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cinemax-bench-')
+    try:
+        run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args, workdir):
+    env = {**os.environ, 'API_CACHE_ENABLED': '0', 'PYTHONPATH': str(ROOT)}
+    if not args.use_database_url:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+    manage(env, 'migrate', '--noinput')
+    seed(env, workdir, args.movies, args.actors)
+
+    ids = random.Random(1).sample(range(1, args.movies + 1), min(200, args.movies))
+    scenarios = {
+        'list': ['movies/?page_size=20'],
+        'detail': [f'movies/{pk}/' for pk in ids],
+    }
+
+    print(f"{'serveur':<16}{'endpoint':<14}{'scénario':<10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erreurs':>9}")
+    for server, prefix in RUNS:
+        port = free_port()
+        process = subprocess.Popen(SERVERS[server](port, args), cwd=ROOT, env=env)
+        try:
+            base = f'http://127.0.0.1:{port}'
+            wait_ready(f'{base}{prefix}movies/', process)
+            for name, paths in scenarios.items():
+                result = asyncio.run(run_load(base, [prefix + p for p in paths],
+                                              concurrency=args.concurrency, duration=args.duration))
+                print(f"{server:<16}{prefix:<14}{name:<10}{result['rps']:>9.0f}{result['p50']:>9.1f}"
+                      f"{result['p95']:>9.1f}{result['p99']:>9.1f}{result['errors']:>9}")
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Coût de l'authentification JWT par requête : lecture de auth_user à chaque appel
+(simplejwt) contre le cache d'utilisateurs et les claims du jeton (api/auth.py).
+
+    python bench/auth.py
+    python bench/auth.py --requests 5000 --repeat 5
+    DATABASE_URL=postgres://... python bench/auth.py --use-database-url
+
+Modes (même classe d'authentification, réglages différents) :
+- db     : API_AUTH_TRUST_CLAIMS=0, cache désactivé -> une requête auth_user par appel, comme simplejwt ;
+- cache  : jeton sans claims, cache LRU du processus -> auth_user lu une fois par utilisateur ;
+- claims : jeton émis par /api/token/ (claims) -> aucune lecture de auth_user.
+Pour chaque endpoint authentifié chaud : requêtes SQL par appel (dont auth_user) et
+latence moyenne (client de test Django, meilleur des --repeat passages). L'écart db /
+claims est l'aller-retour économisé ; il grandit avec la latence réseau de la base
+(--use-database-url sur un PostgreSQL distant).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MODES = {
+    'db': {'API_AUTH_TRUST_CLAIMS': False, 'API_AUTH_USER_CACHE_SIZE': 0},
+    'cache': {'API_AUTH_TRUST_CLAIMS': False},
+    'claims': {},
+}
+
+
+def setup(users, movies):
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    from api.models import Movie
+
+    call_command('migrate', verbosity=0)
+    User.objects.bulk_create([User(username=f"fan{i}", password='!') for i in range(users)])
+    Movie.objects.bulk_create([Movie(title_fr=f"Film {i}") for i in range(movies)])
+    return (list(User.objects.filter(username__startswith='fan').order_by('pk')),
+            list(Movie.objects.order_by('pk').values_list('pk', flat=True)))
+
+
+def endpoints(movie_ids):
+    ids = ','.join(map(str, movie_ids[:20]))
+    return {
+        'user/me': ('get', '/api/user/me/'),
+        'movie-states': ('get', f'/api/user/me/movie-states/?ids={ids}'),
+        'like': ('post', f'/api/movies/{movie_ids[0]}/like/'),
+    }
+
+
+def measure(client, method, path, tokens, count, repeat):
+    """-> (requêtes SQL par appel, dont auth_user, latence moyenne en ms)"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as ctx:
+        for token in tokens:
+            getattr(client, method)(path, HTTP_AUTHORIZATION=token)
+    queries = len(ctx.captured_queries) / len(tokens)
+    user_queries = sum('auth_user' in q['sql'] for q in ctx.captured_queries) / len(tokens)
+
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for i in range(count):
+            response = getattr(client, method)(path, HTTP_AUTHORIZATION=tokens[i % len(tokens)])
+            if response.status_code >= 400:
+                raise SystemExit(f"{path} : HTTP {response.status_code}")
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return queries, user_queries, best / count * 1000
+
+
+def run(args):
+    from django.test import Client, override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from api import auth
+
+    users, movie_ids = setup(args.users, 20)
+    tokens = {
+        'plain': [f'Bearer {AccessToken.for_user(user)}' for user in users],
+        'claims': [f'Bearer {auth.access_token_for(user)}' for user in users],
+    }
+    client = Client()
+    report = {}
+    print(f"{args.users} utilisateurs, {args.requests} appels par endpoint et par mode")
+    print(f"{'endpoint':<14}{'mode':<8}{'SQL/appel':>11}{'auth_user':>11}{'ms/appel':>10}{'gain':>8}")
+    for name, (method, path) in endpoints(movie_ids).items():
+        for mode, overrides in MODES.items():
+            auth.user_cache.clear()
+            with override_settings(**overrides):
+                queries, user_queries, latency = measure(
+                    client, method, path, tokens['claims' if mode == 'claims' else 'plain'],
+                    args.requests, args.repeat)
+            report.setdefault(name, {})[mode] = {'queries': queries, 'auth_user_queries': user_queries,
+                                                 'ms': round(latency, 4)}
+            gain = report[name]['db']['ms'] / latency
+            print(f"{name:<14}{mode:<8}{queries:>11.2f}{user_queries:>11.2f}{latency:>10.3f}{gain:>7.2f}x")
+    print("(requêtes mesurées au premier passage, cache vide ; gain = latence du mode db / latence du mode)")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000, help="appels par endpoint et par mode")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--use-database-url', action='store_true',
+                        help="utiliser DATABASE_URL (base vide) au lieu d'une SQLite jetable")
+    parser.add_argument('--output', help="écrit les résultats en JSON dans ce fichier")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cinemax-auth-')
+    try:
+        env = {'API_CACHE_ENABLED': '0', 'API_METRICS_SAMPLE_RATE': '0', 'API_TASKS_EAGER': '0'}
+        if not args.use_database_url:
+            env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+        os.environ.update(env)
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        import django
+        django.setup()
+        run(args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Jeu de données synthétique pour les benchmarks (Django doit être configuré).
+
+Popularité en loi de Zipf : quelques films et acteurs concentrent l'essentiel des
+castings, likes, notes et commentaires, comme sur le vrai catalogue. Tout est
+déterministe pour une graine donnée.
+
+Films, acteurs et castings passent par CatalogueImporter (même chemin que
+import_catalogue) ; likes, notes et commentaires par bulk_create, puis les compteurs
+et les classements sont recalculés (les écritures en masse ne passent pas par les signaux).
+"""
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from api import counters, leaderboards, search
+from api.importer import CatalogueImporter
+from api.models import Comment, Like, Movie, Rating
+
+WORDS = ("nuit soleil dernier voyage secret ombre mer rouge hiver été ville rivière silence "
+         "retour amour guerre jardin étoile train lettre fille garçon maison frontière ciel "
+         "promesse printemps mémoire lumière chemin île vent feu pluie miroir").split()
+FIRST_NAMES = ("Audrey Jean Marion Vincent Isabelle Gérard Catherine Omar Léa Romain Juliette "
+               "Louis Adèle Mathieu Emmanuelle Tahar Sophie Daniel Virginie Benoît").split()
+LAST_NAMES = ("Martin Bernard Dubois Thomas Robert Richard Petit Durand Leroy Moreau Simon "
+              "Laurent Lefebvre Michel Garcia David Bertrand Roux Vincent Fournier Morel "
+              "Girard André Mercier Dupont Lambert Bonnet François Martinez Legrand").split()
+COUNTRIES = ["France", "Belgique", "Italie", "Espagne", "États-Unis", "Japon", "Corée du Sud"]
+
+
+@dataclass
+class Volumes:
+    movies: int = 2000
+    actors: int = 1500
+    users: int = 300
+    cast_size: int = 8
+    likes: int = 20000
+    ratings: int = 15000
+    comments: int = 5000
+    skew: float = 1.1  # exposant de Zipf (0 = uniforme)
+
+
+class Zipf:
+    """Tirage d'indices 0..n-1, l'indice i ayant un poids 1 / (i + 1) ** s."""
+
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        self.population = range(n)
+        self.cum_weights = list(accumulate(1 / (i + 1) ** s for i in range(n)))
+
+    def draw(self, k=1):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+    def sample(self, k):
+        """k indices distincts (les plus populaires ressortent le plus souvent)."""
+        chosen = set()
+        while len(chosen) < k:
+            chosen.update(self.draw(k - len(chosen)))
+        return list(chosen)
+
+
+def title(rng):
+    words = rng.sample(WORDS, rng.choice((1, 2, 2, 3)))
+    return ' '.join(words).capitalize()
+
+
+def actor_names(count, rng):
+    names = set()
+    while len(names) < count:
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        names.add(name if name not in names else f"{name} {len(names)}")
+    return sorted(names)
+
+
+def movie_rows(volumes, rng):
+    names = actor_names(volumes.actors, rng)
+    # l'ordre des noms fixe leur popularité : les premiers tournent beaucoup
+    popular = Zipf(len(names), volumes.skew, rng)
+    for _ in range(volumes.movies):
+        yield {
+            'title_fr': title(rng),
+            'title_original': '',
+            'origin_country': rng.choice(COUNTRIES),
+            'duration_minutes': rng.randint(75, 170),
+            'director': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            'description': ' '.join(rng.choices(WORDS, k=40)),
+            'release_date': (date(1950, 1, 1) + timedelta(days=rng.randrange(75 * 365))).isoformat(),
+            'cast': [{'actor': names[a], 'role_name': title(rng)}
+                     for a in popular.sample(min(volumes.cast_size, len(names)))],
+        }
+
+
+def unique_pairs(count, users, movies, skew, rng):
+    """Couples (user_id, movie_id) distincts, films tirés selon leur popularité."""
+    popular = Zipf(len(movies), skew, rng)
+    pairs, attempts = set(), 0
+    count = min(count, len(users) * len(movies))
+    while len(pairs) < count and attempts < count * 20:
+        attempts += 1
+        pairs.add((rng.choice(users), movies[popular.draw()[0]]))
+    return list(pairs)
+
+
+def generate(volumes=None, seed=42, batch_size=2000, log=print):
+    """Remplit la base (vide de préférence) et retourne les ids créés par type."""
+    volumes = volumes or Volumes()
+    rng = random.Random(seed)
+
+    importer = CatalogueImporter(batch_size=batch_size, log=lambda message: None)
+    importer.import_movies(movie_rows(volumes, rng))
+    importer.finish()
+    # (titre, date) identifie un film : les rares homonymes du même jour sont fusionnés
+    log(f"{Movie.objects.count()} films, {importer.stats['actors_created']} acteurs, "
+        f"{importer.stats['castings']} castings")
+
+    with transaction.atomic():
+        User.objects.bulk_create([User(username=f"bench{i}", password='!') for i in range(volumes.users)],
+                                 ignore_conflicts=True)
+    user_ids = list(User.objects.filter(username__startswith='bench').order_by('pk').values_list('pk', flat=True))
+    # films triés par date : les plus récents sont aussi les plus populaires
+    movie_ids = list(Movie.objects.order_by('-release_date', 'pk').values_list('pk', flat=True))
+
+    with transaction.atomic():
+        Like.objects.bulk_create(
+            [Like(user_id=u, movie_id=m, liked=rng.random() > 0.1)
+             for u, m in unique_pairs(volumes.likes, user_ids, movie_ids, volumes.skew, rng)],
+            batch_size=batch_size, ignore_conflicts=True)
+        Rating.objects.bulk_create(
+            # notes centrées sur 6-7, avec une queue vers les extrêmes
+            [Rating(user_id=u, movie_id=m, score=max(0, min(10, round(rng.gauss(6.5, 2)))))
+             for u, m in unique_pairs(volumes.ratings, user_ids, movie_ids, volumes.skew, rng)],
+            batch_size=batch_size, ignore_conflicts=True)
+        popular = Zipf(len(movie_ids), volumes.skew, rng)
+        Comment.objects.bulk_create(
+            [Comment(movie_id=movie_ids[m], author_id=rng.choice(user_ids),
+                     text=' '.join(rng.choices(WORDS, k=rng.randint(5, 40))))
+             for m in popular.draw(volumes.comments)],
+            batch_size=batch_size)
+    log(f"{Like.objects.count()} likes, {Rating.objects.count()} notes, {Comment.objects.count()} commentaires")
+
+    # écritures hors signaux : compteurs, classements et index de recherche à reconstruire
+    counters.reconcile()
+    leaderboards.rebuild_trending()
+    search.reset_index()
+    return {'users': user_ids, 'movies': movie_ids}
@@ -0,0 +1,114 @@
+"""
+Générateur de charge HTTP/1.1 minimal (asyncio, bibliothèque standard uniquement).
+
+N connexions keep-alive en parallèle enchaînent des requêtes pendant une durée fixe ;
+on mesure la latence de chaque requête côté client. Une requête est un chemin (GET)
+ou un tuple (méthode, chemin, en-têtes, corps) pour les écritures authentifiées.
+"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connexion fermée par le serveur")
+    status = int(status_line.split()[1])
+    length, chunked, close = 0, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+        elif name == 'connection' and value == 'close':
+            close = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, close
+
+
+def _encode(request, host, headers):
+    if isinstance(request, str):
+        request = ('GET', request, None, None)
+    method, path, own_headers, body = request
+    body = body.encode('utf-8') if isinstance(body, str) else (body or b'')
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {host}']
+    lines += [f'{k}: {v}' for k, v in {**(headers or {}), **(own_headers or {})}.items()]
+    if body or method != 'GET':
+        lines.append(f'Content-Length: {len(body)}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+async def _worker(host, port, requests, offset, step, deadline, headers, latencies, errors):
+    reader = writer = None
+    i = offset
+    while time.perf_counter() < deadline:
+        raw = _encode(requests[i % len(requests)], host, headers)
+        i += step
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(raw)
+            await writer.drain()
+            status, close = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors.append('io')
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(base_url, paths, concurrency=64, duration=10.0, headers=None, step=1):
+    """
+    `paths` : chemins (GET) ou tuples (méthode, chemin, en-têtes, corps), parcourus en boucle.
+    `step` : avance entre deux requêtes d'une connexion ; step=concurrency avec autant de
+    requêtes que de connexions : chaque connexion rejoue la sienne (un utilisateur par connexion).
+    -> dict(requests, errors, rps, p50, p95, p99) ; latences en millisecondes.
+    """
+    url = urlsplit(base_url)
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*[
+        _worker(url.hostname, url.port or 80, paths, n, step, deadline, headers, latencies, errors)
+        for n in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(ordered, 50) * 1000,
+        'p95': percentile(ordered, 95) * 1000,
+        'p99': percentile(ordered, 99) * 1000,
+    }
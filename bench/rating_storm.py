@@ -0,0 +1,142 @@
+"""
+Contention sur un seul film : N votants simultanés (1 000 par défaut) notent la même
+avant-première, en mode immédiat puis en mode regroupé (api/ratings.py).
+
+    python bench/rating_storm.py
+    python bench/rating_storm.py --raters 1000 --window 0.5 --duration 20
+    DATABASE_URL=postgres://... python bench/rating_storm.py --use-database-url
+
+Chaque connexion est un utilisateur distinct (jeton JWT) qui revote en boucle
+POST /api/movies/<id>/rate/. Pour chaque mode : débit, latences, erreurs, puis le
+temps mis par rating_count / avg_rating pour rejoindre la table Rating après la
+charge (0 en mode immédiat ; au plus la fenêtre + un vidage en mode regroupé).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.asgi_vs_wsgi import free_port, wait_ready  # noqa: E402
+from bench.loadgen import run_load  # noqa: E402
+
+
+def setup(raters):
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    from api import auth
+    from api.models import Movie
+
+    call_command('migrate', verbosity=0)
+    movie = Movie.objects.create(title_fr="Avant-première")
+    User.objects.bulk_create([User(username=f"rater{i}", password='!') for i in range(raters)])
+    users = User.objects.filter(username__startswith='rater').order_by('pk')
+    return movie.pk, [f'Bearer {auth.access_token_for(user)}' for user in users]
+
+
+def reset(movie_id):
+    from api import counters
+    from api.models import Rating, Task
+
+    Rating.objects.all().delete()
+    Task.objects.all().delete()
+    counters.reconcile([movie_id])
+
+
+def settled(movie_id):
+    """Compteurs du film égaux à ceux de la table Rating ?"""
+    from django.db.models import Avg, Count
+
+    from api.models import Movie, Rating
+
+    truth = Rating.objects.filter(movie_id=movie_id).aggregate(n=Count('pk'), avg=Avg('score'))
+    movie = Movie.objects.values('rating_count', 'avg_rating').get(pk=movie_id)
+    same_avg = truth['avg'] is None or abs((movie['avg_rating'] or 0) - truth['avg']) < 1e-9
+    return movie['rating_count'] == truth['n'] and same_avg, truth['n']
+
+
+def run_mode(args, env, movie_id, tokens, window):
+    rng = random.Random(1)
+    requests = [('POST', f'/api/movies/{movie_id}/rate/',
+                 {'Authorization': token, 'Content-Type': 'application/json'},
+                 json.dumps({'score': rng.randint(0, 10)})) for token in tokens]
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', 'backend.wsgi:application', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(args.workers), '--threads', str(args.threads),
+               '--worker-connections', str(max(1000, len(tokens))), '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT, stderr=None if args.server_logs else subprocess.DEVNULL,
+                              env={**os.environ, **env, 'API_RATINGS_COALESCE_WINDOW': str(window)})
+    try:
+        base = f'http://127.0.0.1:{port}'
+        wait_ready(f'{base}/api/movies/', server)
+        result = asyncio.run(run_load(base, requests, concurrency=len(requests), duration=args.duration,
+                                      step=len(requests)))
+        # rattrapage : délai entre la fin de la charge et des compteurs justes
+        ended = time.monotonic()
+        deadline = ended + max(window * 5, 5)
+        ok, votes = settled(movie_id)
+        while not ok and time.monotonic() < deadline:
+            time.sleep(0.05)
+            ok, votes = settled(movie_id)
+        result['lag'] = time.monotonic() - ended if ok else float('inf')
+        result['votes'] = votes
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--raters', type=int, default=1000, help="votants simultanés (une connexion chacun)")
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--window', type=float, default=1.0, help="fenêtre du mode regroupé (secondes)")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16, help="threads par worker gunicorn")
+    parser.add_argument('--use-database-url', action='store_true',
+                        help="utiliser DATABASE_URL (base vide) au lieu d'une SQLite jetable")
+    parser.add_argument('--output', help="écrit les résultats en JSON dans ce fichier")
+    parser.add_argument('--server-logs', action='store_true',
+                        help="affiche les journaux de gunicorn (erreurs de verrou SQLite, ...)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cinemax-ratings-')
+    try:
+        env = {'API_CACHE_ENABLED': '0', 'API_METRICS_SAMPLE_RATE': '0', 'API_TASKS_EAGER': '0',
+               'PYTHONPATH': str(ROOT)}
+        if not args.use_database_url:
+            env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+        os.environ.update(env)
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        import django
+        django.setup()
+
+        movie_id, tokens = setup(args.raters)
+        report = {}
+        print(f"{args.raters} votants sur un film, {args.duration:g} s par mode")
+        print(f"{'mode':<22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erreurs':>9}{'votes':>8}"
+              f"{'rattrapage':>12}")
+        for name, window in (('immédiat', 0), (f'regroupé ({args.window:g} s)', args.window)):
+            reset(movie_id)
+            result = run_mode(args, env, movie_id, tokens, window)
+            report[name] = result
+            print(f"{name:<22}{result['rps']:>9.0f}{result['p50']:>9.1f}{result['p95']:>9.1f}{result['p99']:>9.1f}"
+                  f"{result['errors']:>9}{result['votes']:>8}{result['lag']:>11.2f}s")
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmark de l'API : scénarios scriptés sur un jeu de données synthétique.
+
+    python bench/run.py                       # SQLite jetable, affiche le tableau
+    python bench/run.py --check               # compare à bench/baselines.json (code 1 si régression)
+    python bench/run.py --update-baseline     # enregistre les résultats comme nouvelle référence
+
+Déroulé : base SQLite jetable (ou DATABASE_URL avec --use-database-url), migrée puis
+remplie par bench/datagen.py ; gunicorn est lancé dessus et chaque scénario est joué
+par bench/loadgen.py. Les requêtes SQL par requête HTTP sont comptées en parallèle,
+dans ce processus, sur un échantillon des mêmes requêtes (client de test Django).
+
+Scénarios :
+- browse        : pages successives de /movies/, /movies/trending/, /movies/top-rated/
+- detail        : fiches de films, tirées selon leur popularité
+- search        : /movies/?q= et /actors/?q=
+- like_storm    : POST /movies/<id>/like/ concentrés sur les films populaires
+- rating_storm  : POST /movies/<id>/rate/ idem
+
+Référence : le nombre de requêtes SQL est comparé strictement (il ne dépend pas de la
+machine) ; req/s et p95 avec une tolérance (--tolerance, 30 % par défaut). Sur une
+autre machine que celle de la référence, --check=queries ne vérifie que les requêtes SQL.
+Le cache de réponses est coupé sauf avec --cache.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.asgi_vs_wsgi import free_port, wait_ready  # noqa: E402
+from bench.loadgen import run_load  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / 'baselines.json'
+SCENARIOS = ('browse', 'detail', 'search', 'like_storm', 'rating_storm')
+# écritures : SQLite sérialise les transactions, moins de connexions simultanées
+CONCURRENCY = {'like_storm': 16, 'rating_storm': 16}
+
+
+def setup_django(env):
+    os.environ.update(env)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+def build_scenarios(ids, seed=7, size=500):
+    """-> {nom: [requêtes loadgen]} ; requête = chemin ou (méthode, chemin, en-têtes, corps)."""
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from api import auth
+    from bench.datagen import LAST_NAMES, WORDS, Zipf
+
+    rng = random.Random(seed)
+    client = Client()
+
+    def pages(path, count):
+        chain = []
+        while path and len(chain) < count:
+            chain.append(path)
+            following = client.get(path).json().get('next')
+            path = following and following.split('testserver', 1)[-1]
+        return chain
+
+    browse = (pages('/api/movies/?page_size=20', 25) + pages('/api/movies/trending/?page_size=20', 10)
+              + pages('/api/movies/top-rated/?page_size=20', 10))
+    popular = Zipf(len(ids['movies']), 1.1, rng)
+    hot = [ids['movies'][i] for i in popular.draw(size)]
+    terms = WORDS + LAST_NAMES
+    users = list(User.objects.filter(pk__in=ids['users']))
+    tokens = {user.pk: f'Bearer {auth.access_token_for(user)}' for user in users}
+
+    def authenticated(method, path, body=None):
+        headers = {'Authorization': tokens[rng.choice(users).pk]}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        return (method, path, headers, body)
+
+    return {
+        'browse': browse,
+        'detail': [f'/api/movies/{pk}/' for pk in hot],
+        'search': [f"/api/{rng.choice(('movies', 'movies', 'actors'))}/?q={rng.choice(terms)[:rng.randint(3, 6)]}"
+                   for _ in range(size)],
+        'like_storm': [authenticated('POST', f'/api/movies/{pk}/like/') for pk in hot],
+        'rating_storm': [authenticated('POST', f'/api/movies/{pk}/rate/', json.dumps({'score': rng.randint(0, 10)}))
+                         for pk in hot],
+    }
+
+
+def queries_per_request(requests, sample):
+    """Moyenne des requêtes SQL sur les `sample` premières requêtes du scénario."""
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client()
+    total = 0
+    chosen = requests[:sample]
+    for request in chosen:
+        method, path, headers, body = ('GET', request, None, None) if isinstance(request, str) else request
+        extra = {f"HTTP_{k.upper().replace('-', '_')}": v for k, v in (headers or {}).items()
+                 if k != 'Content-Type'}
+        with CaptureQueriesContext(connection) as ctx:
+            client.generic(method, path, body or '', content_type='application/json', **extra)
+        total += len(ctx.captured_queries)
+    return total / len(chosen)
+
+
+def compare(results, baseline, tolerance, mode):
+    """-> liste des régressions (chaînes) par rapport à la référence."""
+    problems = []
+    for name, current in results.items():
+        ref = baseline.get('scenarios', {}).get(name)
+        if ref is None:
+            continue
+        if current['queries'] > ref['queries'] + 0.5:
+            problems.append(f"{name} : {current['queries']:.1f} requêtes SQL / requête (référence {ref['queries']:.1f})")
+        if mode == 'queries':
+            continue
+        if current['rps'] < ref['rps'] * (1 - tolerance):
+            problems.append(f"{name} : {current['rps']:.0f} req/s (référence {ref['rps']:.0f})")
+        if current['p95'] > ref['p95'] * (1 + tolerance):
+            problems.append(f"{name} : p95 {current['p95']:.1f} ms (référence {ref['p95']:.1f} ms)")
+        if current['error_rate'] > ref.get('error_rate', 0) + 0.01:
+            problems.append(f"{name} : {current['error_rate']:.1%} d'erreurs")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--actors', type=int, default=1500)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--likes', type=int, default=20000)
+    parser.add_argument('--ratings', type=int, default=15000)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--skew', type=float, default=1.1, help="exposant de Zipf de la popularité")
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help="scénario à jouer (répétable ; tous par défaut)")
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help="threads par worker gunicorn")
+    parser.add_argument('--query-sample', type=int, default=20,
+                        help="requêtes par scénario rejouées pour compter les requêtes SQL")
+    parser.add_argument('--cache', action='store_true', help="garder le cache de réponses")
+    parser.add_argument('--use-database-url', action='store_true',
+                        help="utiliser DATABASE_URL (base vide) au lieu d'une SQLite jetable")
+    parser.add_argument('--output', help="écrit les résultats en JSON dans ce fichier")
+    parser.add_argument('--check', nargs='?', const='all', choices=('all', 'queries'),
+                        help="compare à la référence ; 'queries' : requêtes SQL seulement")
+    parser.add_argument('--tolerance', type=float, default=0.3)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cinemax-bench-')
+    try:
+        sys.exit(run(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args, workdir):
+    env = {'API_CACHE_ENABLED': '1' if args.cache else '0', 'API_METRICS_SAMPLE_RATE': '0',
+           'API_TASKS_EAGER': '0', 'PYTHONPATH': str(ROOT)}
+    if not args.use_database_url:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+    setup_django(env)
+
+    from django.core.management import call_command
+
+    from bench.datagen import Volumes, generate
+
+    call_command('migrate', verbosity=0)
+    volumes = Volumes(movies=args.movies, actors=args.actors, users=args.users, likes=args.likes,
+                      ratings=args.ratings, comments=args.comments, skew=args.skew)
+    ids = generate(volumes, log=lambda message: print(f"données : {message}"))
+    scenarios = build_scenarios(ids)
+    names = args.scenario or list(SCENARIOS)
+
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', 'backend.wsgi:application', '--bind', f'127.0.0.1:{port}',
+               '--workers', str(args.workers), '--threads', str(args.threads), '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env})
+    results = {}
+    try:
+        base = f'http://127.0.0.1:{port}'
+        wait_ready(f'{base}/api/movies/', server)
+        print(f"{'scénario':<14}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL/req':>9}{'erreurs':>9}")
+        for name in names:
+            requests = scenarios[name]
+            result = asyncio.run(run_load(base, requests, concurrency=CONCURRENCY.get(name, args.concurrency),
+                                          duration=args.duration))
+            result['error_rate'] = result['errors'] / max(result['requests'], 1)
+            result['queries'] = queries_per_request(requests, args.query_sample)
+            results[name] = result
+            print(f"{name:<14}{result['rps']:>9.0f}{result['p50']:>9.1f}{result['p95']:>9.1f}"
+                  f"{result['p99']:>9.1f}{result['queries']:>9.1f}{result['errors']:>9}")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    report = {
+        'config': {key: getattr(args, key) for key in ('movies', 'actors', 'users', 'likes', 'ratings',
+                                                       'comments', 'skew', 'concurrency', 'duration',
+                                                       'workers', 'threads', 'cache')},
+        'scenarios': {name: {key: round(value, 3) for key, value in result.items()}
+                      for name, result in results.items()},
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+    if args.update_baseline:
+        BASELINE.write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+        print(f"référence enregistrée : {BASELINE}")
+    if args.check:
+        if not BASELINE.exists():
+            print("pas de référence : lancer d'abord --update-baseline")
+            return 1
+        baseline = json.loads(BASELINE.read_text())
+        if baseline.get('config') != report['config']:
+            print("attention : paramètres différents de ceux de la référence")
+        problems = compare(results, baseline, args.tolerance, args.check)
+        for problem in problems:
+            print(f"RÉGRESSION {problem}")
+        if problems:
+            return 1
+        print("pas de régression")
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Micro-benchmark de la sérialisation des listes : serializers DRF contre api/rows.py.
+
+    python bench/serializers.py                # 10 000 lignes par liste
+    python bench/serializers.py --rows 50000 --repeat 5
+
+Pour chaque liste (films, acteurs, commentaires), mesure en lignes/s :
+- drf  : instances du queryset, Serializer(many=True).data, JSONRenderer de DRF (json) ;
+- rows : .values() (RowSerializer.prepare), dicts construits à la main, renderers.dumps (orjson).
+Trois étapes chronométrées séparément (lecture, sérialisation, rendu JSON), meilleur des
+--repeat passages. Base SQLite jetable remplie par bench/datagen.py ; les deux sorties
+sont comparées avant de mesurer.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+STEPS = ('fetch', 'serialize', 'render')
+
+
+def lists():
+    """-> [(nom, queryset, serializer DRF, classe rows.py)]"""
+    from api import rows, serializers
+    from api.models import Actor, Comment, Movie
+    return [
+        ('movies', Movie.objects.all(), serializers.MovieListSerializer, rows.MovieListRows),
+        ('actors', Actor.objects.order_by('full_name'), serializers.ActorSerializer, rows.ActorRows),
+        # même jointure que la vue async : le chemin DRF ne fait pas de requête par ligne
+        ('comments', Comment.objects.select_related('author', 'rating'), serializers.CommentSerializer,
+         rows.CommentRows),
+    ]
+
+
+def timed(steps):
+    """steps : fonctions enchaînées (la sortie de l'une est l'entrée de la suivante)."""
+    value, times = None, []
+    for step in steps:
+        started = time.perf_counter()
+        value = step(value)
+        times.append(time.perf_counter() - started)
+    return value, times
+
+
+def measure(queryset, serializer_class, rows_class, request, limit, repeat):
+    from rest_framework.renderers import JSONRenderer
+
+    from api import renderers
+
+    context = {'request': request}
+    fast = rows_class(context=context)
+    paths = {
+        'drf': [
+            lambda _: list(queryset[:limit]),
+            lambda page: serializer_class(page, many=True, context=context).data,
+            lambda data: JSONRenderer().render(data),
+        ],
+        'rows': [
+            lambda _: list(fast.prepare(queryset)[:limit]),
+            fast.many,
+            renderers.dumps,
+        ],
+    }
+    outputs = {name: timed(steps)[0] for name, steps in paths.items()}
+    if json.loads(outputs['drf']) != json.loads(outputs['rows']):
+        raise SystemExit(f"sorties différentes pour {queryset.model.__name__}")
+
+    results = {}
+    for name, steps in paths.items():
+        best = None
+        for _ in range(repeat):
+            _, times = timed(steps)
+            best = times if best is None else [min(a, b) for a, b in zip(best, times)]
+        results[name] = dict(zip(STEPS, best), total=sum(best))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=10000, help="lignes par liste")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="écrit les résultats en JSON dans ce fichier")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cinemax-serializers-')
+    try:
+        os.environ.update({'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+                           'API_METRICS_SAMPLE_RATE': '0', 'API_TASKS_EAGER': '0'})
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+        import django
+        django.setup()
+        run(args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args):
+    from django.core.management import call_command
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from api import renderers
+    from bench.datagen import Volumes, generate
+
+    call_command('migrate', verbosity=0)
+    n = args.rows
+    generate(Volumes(movies=n, actors=n, users=200, cast_size=2, likes=n, ratings=n, comments=n),
+             log=lambda message: print(f"données : {message}"))
+    print(f"encodeur JSON rapide : {'orjson' if renderers.fast_json_enabled() else 'json (orjson absent)'}")
+    request = Request(APIRequestFactory().get('/api/movies/'))
+
+    report = {}
+    print(f"{'liste':<10}{'chemin':<7}" + ''.join(f'{step:>13}' for step in STEPS + ('total',)) + f"{'gain':>8}")
+    for name, queryset, serializer_class, rows_class in lists():
+        results = measure(queryset, serializer_class, rows_class, request, n, args.repeat)
+        count = min(n, queryset.count())
+        for path, times in results.items():
+            rates = {step: count / seconds for step, seconds in times.items()}
+            gain = results['drf']['total'] / times['total']
+            print(f"{name:<10}{path:<7}" + ''.join(f'{rates[step]:>13,.0f}' for step in STEPS + ('total',))
+                  + f"{gain:>7.1f}x")
+            report.setdefault(name, {})[path] = {'rows': count, 'rows_per_second': round(rates['total']),
+                                                 **{step: round(times[step], 4) for step in times}}
+    print("(lignes/s par étape ; gain = temps total DRF / temps total du chemin)")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+
+
+if __name__ == '__main__':
+    main()